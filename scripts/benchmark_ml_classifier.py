@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Benchmark: MLClassifier inferens
+
+Måler:
+1. predict() per sample via sklearn (gammel sti)
+2. predict_batch() via sklearn
+3. predict_batch() via kompilert NumPy-skog
+4. Paritet - samme label og confidence som sklearn
+
+Kjør: python scripts/benchmark_ml_classifier.py
+"""
+
+import sys
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent / "src" / "proxy"))
+
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+
+from engines.app_classifier import FeatureVector, MLClassifier
+
+N_TRAIN = 2000
+N_QUERY = 1000
+LABELS = ['tiktok', 'instagram', 'youtube', 'snapchat', 'netflix', 'spotify']
+
+
+def make_features(n: int, rng: np.random.Generator) -> tuple[list[FeatureVector], list[str]]:
+    """Syntetiske features med label-avhengig fordeling"""
+    n_features = len(FeatureVector().to_numpy())
+    features, labels = [], []
+    for _ in range(n):
+        label_idx = int(rng.integers(len(LABELS)))
+        values = rng.normal(label_idx / len(LABELS), 0.25, n_features)
+        fv = FeatureVector()
+        for name, value in zip(fv.__dataclass_fields__, values):
+            setattr(fv, name, float(value))
+        features.append(fv)
+        labels.append(LABELS[label_idx])
+    return features, labels
+
+
+def timed(fn, repeats: int = 3) -> float:
+    """Beste tid i ms over repeats kjøringer"""
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        best = min(best, (time.perf_counter() - start) * 1000)
+    return best
+
+
+def run_benchmark():
+    print("=" * 60)
+    print("AIKI ML CLASSIFIER BENCHMARK")
+    print(f"Tid: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    print("=" * 60)
+    print()
+
+    rng = np.random.default_rng(42)
+    train_x, train_y = make_features(N_TRAIN, rng)
+    query_x, _ = make_features(N_QUERY, rng)
+    X = np.vstack([fv.to_numpy() for fv in query_x])
+
+    with tempfile.TemporaryDirectory() as tmp:
+        compiled = MLClassifier(Path(tmp) / "model.pkl")
+        compiled.train(train_x, train_y)
+        sklearn_only = MLClassifier(Path(tmp) / "model.pkl", use_compiled=False)
+
+    if compiled._compiled is None:
+        print("❌ Kompilert skog ble ikke bygget (mangler scikit-learn?)")
+        return
+
+    print(f"Trent på {N_TRAIN} samples, {compiled._compiled.n_trees} trær, "
+          f"dybde {compiled._compiled.depth}")
+    print(f"Kjører {N_QUERY} queries...\n")
+
+    per_sample = timed(lambda: [sklearn_only.predict(fv) for fv in query_x], repeats=1)
+    batch_sklearn = timed(lambda: sklearn_only.predict_batch(X))
+    batch_compiled = timed(lambda: compiled.predict_batch(X))
+    single_compiled = timed(lambda: [compiled.predict(fv) for fv in query_x[:200]], repeats=1) * N_QUERY / 200
+
+    print(f"⏱️  TID ({N_QUERY} samples):")
+    print(f"   predict() per sample, sklearn:   {per_sample:8.1f}ms  ({per_sample / N_QUERY * 1000:.0f}µs/sample)")
+    print(f"   predict() per sample, kompilert: {single_compiled:8.1f}ms  ({single_compiled / N_QUERY * 1000:.0f}µs/sample)")
+    print(f"   predict_batch(), sklearn:        {batch_sklearn:8.1f}ms")
+    print(f"   predict_batch(), kompilert:      {batch_compiled:8.1f}ms")
+    print(f"   Speedup batch vs per sample:     {per_sample / batch_compiled:8.1f}x")
+
+    # Paritet
+    expected = sklearn_only.predict_batch(X)
+    actual = compiled.predict_batch(X)
+    same_label = sum(a[0] == e[0] for a, e in zip(actual, expected))
+    max_diff = max(abs(a[1] - e[1]) for a, e in zip(actual, expected))
+
+    print("\n🎯 PARITET:")
+    print(f"   Samme label:        {same_label}/{N_QUERY}")
+    print(f"   Maks confidence-avvik: {max_diff:.2e}")
+
+    print("\n" + "=" * 60)
+    if same_label == N_QUERY and max_diff < 1e-9:
+        print("✅ Kompilert skog gir IDENTISKE prediksjoner")
+    else:
+        print("⚠️  Kompilert skog AVVIKER fra sklearn")
+
+
+if __name__ == "__main__":
+    run_benchmark()
@@ -0,0 +1,549 @@
+#!/usr/bin/env python3
+"""
+Benchmark: Offline flow-replay gjennom AIKIUltimateAddon
+
+Kjører syntetiske (eller innspilte) flows gjennom proxyens hot path
+in-process, uten nettverk:
+
+    tls_clienthello -> tls_established_client -> request -> responseheaders -> response
+
+Måler:
+1. p50/p99/mean latency per hook
+2. p50/p99/mean latency per engine-kall (fingerprint, throttler, ...)
+3. Allokeringer per kall (tracemalloc, egen pass så timingen ikke påvirkes)
+
+Resultatet skrives som JSON og kan sammenlignes mellom commits:
+
+Kjør: python scripts/benchmark_proxy_replay.py
+      python scripts/benchmark_proxy_replay.py --flows opptak.mitm
+      python scripts/benchmark_proxy_replay.py --compare proxy_replay_abc1234.json
+
+Krever mitmproxy (samme som addonen).
+"""
+
+import sys
+from pathlib import Path
+PROXY_DIR = Path(__file__).parent.parent / "src" / "proxy"
+sys.path.insert(0, str(PROXY_DIR))
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import random
+import struct
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+# Engine-kall som måles separat: (navn, sti fra addon til objekt, metode)
+ENGINE_PROBES = [
+    ('pinning.is_pinned', 'pinning_bypass', 'is_pinned'),
+    ('fingerprint.process_client_hello', 'fingerprint', 'process_client_hello'),
+    ('fingerprint.get_routing_decision', 'fingerprint.database', 'get_routing_decision'),
+    ('fingerprint.record_success', 'fingerprint', 'record_success'),
+    ('domain_matcher.lookup', 'domain_matcher', 'lookup'),
+    ('throttler.process_request', 'throttler', 'process_request'),
+    ('tiktok_throttler.process_tiktok_request', 'tiktok_throttler', 'process_tiktok_request'),
+    ('intervention.process_request', 'intervention', 'process_request'),
+    ('intervention.process_response', 'intervention', 'process_response'),
+    ('addon.inject_tiktok_css', '', '_inject_tiktok_css'),
+    ('buffer_policy.decide', 'buffer_policy', 'decide'),
+    ('analysis_pipeline.submit', 'analysis_pipeline', 'submit'),
+]
+
+HOOKS = ['tls_clienthello', 'tls_established_client', 'request', 'responseheaders', 'response']
+
+# Chunk-størrelse når en strømmet body mates gjennom response.stream
+STREAM_CHUNK = 16 * 1024
+
+CLIENT_IPS = ['192.168.1.20', '192.168.1.21', '192.168.1.35']
+
+
+# === SYNTETISKE FLOWS ===
+
+def build_client_hello(sni: str, profile: str = 'chrome') -> bytes:
+    """
+    Bygg en TLS 1.3 ClientHello (record-wrappet, som raw_bytes())
+
+    Random, session-ID og key_share er tilfeldige per kall - slik som
+    ekte klienter - så memoiseringen testes realistisk.
+    """
+    if profile == 'chrome':
+        ciphers = [0x0a0a, 0x1301, 0x1302, 0x1303, 0xc02b, 0xc02f, 0xc02c,
+                   0xc030, 0xcca9, 0xcca8, 0xc013, 0xc014, 0x009c, 0x009d]
+        groups = [0x0a0a, 0x001d, 0x0017, 0x0018]
+    else:  # ios
+        ciphers = [0x1301, 0x1302, 0x1303, 0xc02c, 0xc02b, 0xcca9, 0xc030,
+                   0xc02f, 0xcca8, 0xc00a, 0xc009]
+        groups = [0x001d, 0x0017, 0x0018, 0x0019]
+
+    def ext(ext_type: int, data: bytes) -> bytes:
+        return struct.pack('>HH', ext_type, len(data)) + data
+
+    def vec16(data: bytes) -> bytes:
+        return struct.pack('>H', len(data)) + data
+
+    name = sni.encode()
+    extensions = b''.join([
+        ext(0x0000, vec16(b'\x00' + vec16(name))),
+        ext(0x0017, b''),
+        ext(0x000a, vec16(b''.join(struct.pack('>H', g) for g in groups))),
+        ext(0x000b, b'\x01\x00'),
+        ext(0x000d, vec16(struct.pack('>6H', 0x0403, 0x0804, 0x0401, 0x0503, 0x0805, 0x0501))),
+        ext(0x0010, vec16(b'\x02h2\x08http/1.1')),
+        ext(0x002b, b'\x04\x03\x04\x03\x03'),
+        ext(0x002d, b'\x01\x01'),
+        ext(0x0033, vec16(struct.pack('>HH', 0x001d, 32) + os.urandom(32))),
+    ])
+
+    body = (
+        b'\x03\x03' + os.urandom(32)
+        + b'\x20' + os.urandom(32)
+        + vec16(b''.join(struct.pack('>H', c) for c in ciphers))
+        + b'\x01\x00'
+        + vec16(extensions)
+    )
+    handshake = b'\x01' + len(body).to_bytes(3, 'big') + body
+    return b'\x16\x03\x01' + struct.pack('>H', len(handshake)) + handshake
+
+
+def tiktok_feed_body(n_items: int = 12) -> bytes:
+    items = [{
+        'id': str(7300000000000000000 + random.randrange(10**12)),
+        'desc': f"Video {i} #fyp #viral #foryou",
+        'createTime': int(time.time()) - random.randrange(86400),
+        'author': {'uniqueId': f"creator_{random.randrange(10**6)}", 'nickname': 'Creator'},
+        'music': {'title': 'original sound', 'authorName': 'Creator'},
+        'stats': {'diggCount': random.randrange(10**6), 'shareCount': random.randrange(10**4),
+                  'commentCount': random.randrange(10**4), 'playCount': random.randrange(10**7)},
+        'video': {'duration': random.randrange(8, 60), 'ratio': '720p',
+                  'playAddr': f"https://v16-webapp.tiktok.com/{i}/video.mp4"},
+        'challenges': [{'title': 'fyp'}, {'title': 'viral'}],
+    } for i in range(n_items)]
+    return json.dumps({'statusCode': 0, 'itemList': items, 'hasMore': True}).encode()
+
+
+def instagram_feed_body(n_items: int = 10) -> bytes:
+    items = [{
+        'media_or_ad': {
+            'id': f"{random.randrange(10**18)}_{random.randrange(10**9)}",
+            'caption': {'text': 'Se hva jeg fant! #reels #explore'},
+            'like_count': random.randrange(10**5),
+            'comment_count': random.randrange(10**3),
+            'user': {'username': f"user{random.randrange(10**6)}"},
+            'media_type': random.choice([1, 2, 8]),
+        }
+    } for _ in range(n_items)]
+    return json.dumps({'feed_items': items, 'more_available': True, 'status': 'ok'}).encode()
+
+
+def html_page(title: str, size_kb: int) -> bytes:
+    filler = '<div class="DivItemContainer"><p>Lorem ipsum dolor sit amet</p></div>\n'
+    body = filler * (size_kb * 1024 // len(filler))
+    return (f"<!DOCTYPE html><html><head><title>{title}</title></head>"
+            f"<body>{body}</body></html>").encode()
+
+
+# (vekt, navn, metode, url, innholdstype, gzip, body-fabrikk, tls-profil)
+SCENARIOS = [
+    (30, 'tiktok_feed', 'GET',
+     'https://www.tiktok.com/api/recommend/item_list/?aid=1988&count=12',
+     'application/json', True, tiktok_feed_body, 'chrome'),
+    (10, 'tiktok_html', 'GET', 'https://www.tiktok.com/@creator/video/7300000000000000000',
+     'text/html; charset=utf-8', True, lambda: html_page('TikTok', 120), 'chrome'),
+    (20, 'instagram_api', 'GET', 'https://i.instagram.com/api/v1/feed/timeline/',
+     'application/json', True, instagram_feed_body, 'ios'),
+    (15, 'youtube_page', 'GET', 'https://www.youtube.com/watch?v=dQw4w9WgXcQ',
+     'text/html; charset=utf-8', True, lambda: html_page('YouTube', 250), 'chrome'),
+    (15, 'youtube_video', 'GET',
+     'https://rr3---sn-uxaxjvhxbt2u-j5pe.googlevideo.com/videoplayback?itag=22&range=0-65535',
+     'video/mp4', False, lambda: os.urandom(64 * 1024), 'chrome'),
+    (10, 'unknown', 'GET', 'https://www.example.com/index.html',
+     'text/html', False, lambda: html_page('Example', 8), 'ios'),
+]
+
+
+class ReplayFlow:
+    """Én flow klar for replay: ClientHello + request + response"""
+
+    def __init__(self, name: str, client_ip: str, client_hello: bytes,
+                 method: str, url: str, status: int, headers: dict, body: bytes):
+        self.name = name
+        self.client_ip = client_ip
+        self.client_hello = client_hello
+        self.method = method
+        self.url = url
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+
+def synthesize_flows(n: int, seed: int) -> list[ReplayFlow]:
+    """Lag n flows trukket fra SCENARIOS etter vekt"""
+    random.seed(seed)
+    weights = [s[0] for s in SCENARIOS]
+    flows = []
+    for _ in range(n):
+        _, name, method, url, content_type, gzipped, body_factory, profile = \
+            random.choices(SCENARIOS, weights)[0]
+        headers = {'content-type': content_type}
+        if gzipped:
+            headers['content-encoding'] = 'gzip'
+        host = url.split('/')[2]
+        flows.append(ReplayFlow(
+            name, random.choice(CLIENT_IPS), build_client_hello(host, profile),
+            method, url, 200, headers, body_factory()
+        ))
+    return flows
+
+
+def load_recorded_flows(path: Path) -> list[ReplayFlow]:
+    """
+    Last innspilte flows (mitmdump -w fil.mitm)
+
+    Innspilte flows har ikke rå ClientHello; den syntetiseres fra SNI.
+    """
+    from mitmproxy import http, io
+
+    flows = []
+    with open(path, 'rb') as f:
+        for flow in io.FlowReader(f).stream():
+            if not isinstance(flow, http.HTTPFlow) or flow.response is None:
+                continue
+            headers = {k: v for k, v in flow.response.headers.items()}
+            flows.append(ReplayFlow(
+                'recorded', flow.client_conn.peername[0] if flow.client_conn.peername else CLIENT_IPS[0],
+                build_client_hello(flow.request.host),
+                flow.request.method, flow.request.pretty_url,
+                flow.response.status_code, headers,
+                flow.response.get_content() or b''
+            ))
+    return flows
+
+
+# === MÅLING ===
+
+class Recorder:
+    """Samler latency og allokeringer per probe"""
+
+    def __init__(self, trace_alloc: bool):
+        self.trace_alloc = trace_alloc
+        self.latency: dict[str, list[float]] = {}
+        self.alloc_peak: dict[str, list[int]] = {}
+        self.alloc_net: dict[str, list[int]] = {}
+        # Nøstede målinger: [start_current, peak_fra_barn]
+        self._stack: list[list[int]] = []
+
+    def enter(self):
+        if self.trace_alloc:
+            current, peak = tracemalloc.get_traced_memory()
+            if self._stack:
+                # Foreldrens peak så langt må ikke gå tapt ved reset
+                self._stack[-1][1] = max(self._stack[-1][1], peak)
+            tracemalloc.reset_peak()
+            self._stack.append([current, 0])
+        return time.perf_counter()
+
+    def exit(self, name: str, start: float):
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        self.latency.setdefault(name, []).append(elapsed_ms)
+        if self.trace_alloc:
+            current, peak = tracemalloc.get_traced_memory()
+            start_current, child_peak = self._stack.pop()
+            peak = max(peak, child_peak)
+            self.alloc_peak.setdefault(name, []).append(peak - start_current)
+            self.alloc_net.setdefault(name, []).append(current - start_current)
+            if self._stack:
+                self._stack[-1][1] = max(self._stack[-1][1], peak)
+
+    def wrap(self, name: str, fn):
+        def probe(*args, **kwargs):
+            start = self.enter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self.exit(name, start)
+        return probe
+
+
+def percentile(sorted_values: list[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, round(q * (len(sorted_values) - 1)))]
+
+
+def summarize(timing: Recorder, alloc: Recorder | None, names: list[str]) -> dict:
+    result = {}
+    for name in names:
+        values = sorted(timing.latency.get(name, []))
+        if not values:
+            continue
+        entry = {
+            'count': len(values),
+            'p50_ms': round(percentile(values, 0.50), 4),
+            'p99_ms': round(percentile(values, 0.99), 4),
+            'mean_ms': round(sum(values) / len(values), 4),
+            'max_ms': round(values[-1], 4),
+        }
+        if alloc and alloc.alloc_peak.get(name):
+            peaks = alloc.alloc_peak[name]
+            nets = alloc.alloc_net[name]
+            entry['alloc_peak_kib_mean'] = round(sum(peaks) / len(peaks) / 1024, 2)
+            entry['alloc_peak_kib_max'] = round(max(peaks) / 1024, 2)
+            entry['alloc_net_b_mean'] = round(sum(nets) / len(nets), 1)
+        result[name] = entry
+    return result
+
+
+# === REPLAY ===
+
+def load_addon(data_dir: Path):
+    """Importer addonen med isolert data-katalog"""
+    # Engines skriver under ~/aiki og AIKI_PROXY_DATA_DIR - hold dem unna prod-data
+    os.environ['HOME'] = str(data_dir)
+    os.environ['AIKI_PROXY_DATA_DIR'] = str(data_dir / 'proxy')
+    logging.disable(logging.WARNING)
+
+    import aiki_ultimate_addon
+    addon = aiki_ultimate_addon.addons[0]
+    if not aiki_ultimate_addon.ENGINES_AVAILABLE:
+        print("⚠️  Engines ikke tilgjengelige - måler kun basic mode")
+    return aiki_ultimate_addon, addon
+
+
+def install_probes(addon, recorder: Recorder, real_delays: bool) -> dict:
+    """Pakk engine-metoder inn i probes; returnerer originaler for restore"""
+    originals = {}
+    for name, path, method in ENGINE_PROBES:
+        target = addon
+        for attr in filter(None, path.split('.')):
+            target = getattr(target, attr, None)
+        if target is None or not hasattr(target, method):
+            continue
+        original = getattr(target, method)
+        originals[(id(target), method)] = (target, method, original)
+        setattr(target, method, recorder.wrap(name, original))
+
+    if not real_delays:
+        # Forsinkelser er policy, ikke CPU-kost - registreres, men ventes ikke på
+        scheduler = addon.delay_scheduler
+        original = scheduler.park
+        originals[(id(scheduler), 'park')] = (scheduler, 'park', original)
+
+        async def park(delay_ms: int):
+            if delay_ms > 0:
+                scheduler.stats['parked_total'] += 1
+                scheduler.stats['delay_ms_total'] += delay_ms
+        scheduler.park = park
+
+    return originals
+
+
+def remove_probes(originals: dict):
+    for target, method, original in originals.values():
+        setattr(target, method, original)
+
+
+async def replay(addon, flows: list[ReplayFlow], recorder: Recorder):
+    """Kjør alle flows gjennom hookene sekvensielt"""
+    from mitmproxy import http, tls
+    from mitmproxy.options import Options
+    from mitmproxy.proxy import context
+    from mitmproxy.test import tflow
+
+    options = Options()
+
+    for f in flows:
+        client = tflow.tclient_conn()
+        client.peername = (f.client_ip, 50000 + random.randrange(10000))
+        ctx = context.Context(client, options)
+
+        # === TLS ===
+        hello = tls.ClientHello(f.client_hello[9:])
+        data = tls.ClientHelloData(ctx, hello)
+        start = recorder.enter()
+        addon.tls_clienthello(data)
+        recorder.exit('tls_clienthello', start)
+
+        if data.ignore_connection:
+            continue
+
+        start = recorder.enter()
+        addon.tls_established_client(tls.TlsData(client, ctx))
+        recorder.exit('tls_established_client', start)
+
+        # === HTTP ===
+        flow = http.HTTPFlow(client, tflow.tserver_conn())
+        flow.request = http.Request.make(f.method, f.url, b'', {'user-agent': 'aiki-replay'})
+
+        start = recorder.enter()
+        await addon.request(flow)
+        recorder.exit('request', start)
+
+        if flow.response is None:
+            # Response.make koder body etter content-encoding (gzip)
+            flow.response = http.Response.make(f.status, f.body, f.headers)
+            raw = flow.response.raw_content
+
+            # Som mitmproxy: responseheaders ser kun headers
+            flow.response.raw_content = None
+            start = recorder.enter()
+            addon.responseheaders(flow)
+            recorder.exit('responseheaders', start)
+
+            stream = flow.response.stream
+            if callable(stream):
+                for i in range(0, len(raw), STREAM_CHUNK):
+                    stream(raw[i:i + STREAM_CHUNK])
+                stream(b'')
+            elif not stream:
+                flow.response.raw_content = raw
+
+        start = recorder.enter()
+        addon.response(flow)
+        recorder.exit('response', start)
+
+
+def run_pass(addon, flows: list[ReplayFlow], warmup: int, trace_alloc: bool,
+             real_delays: bool) -> Recorder:
+    recorder = Recorder(trace_alloc)
+    originals = install_probes(addon, recorder, real_delays)
+    try:
+        if warmup:
+            asyncio.run(replay(addon, flows[:warmup], recorder))
+            recorder.latency.clear()
+        if trace_alloc:
+            tracemalloc.start()
+        asyncio.run(replay(addon, flows, recorder))
+    finally:
+        if trace_alloc:
+            tracemalloc.stop()
+        remove_probes(originals)
+    return recorder
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=PROXY_DIR,
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return 'unknown'
+
+
+def compare(current: dict, baseline_path: Path, threshold: float) -> int:
+    """Skriv endring mot tidligere resultat; returnerer antall regresjoner"""
+    baseline = json.loads(baseline_path.read_text())
+    print(f"\n📊 SAMMENLIGNING mot {baseline_path.name} ({baseline['meta']['commit']}):")
+    regressions = 0
+    for section in ('hooks', 'engines'):
+        for name, entry in current[section].items():
+            old = baseline.get(section, {}).get(name)
+            if not old:
+                continue
+            for metric in ('p50_ms', 'p99_ms'):
+                if not old[metric]:
+                    continue
+                change = (entry[metric] - old[metric]) / old[metric] * 100
+                flag = ''
+                if change > threshold:
+                    flag = '  ⚠️  REGRESJON'
+                    regressions += 1
+                print(f"   {name:42s} {metric}: {old[metric]:8.3f} -> {entry[metric]:8.3f}ms "
+                      f"({change:+6.1f}%){flag}")
+    return regressions
+
+
+def print_table(title: str, entries: dict):
+    print(f"\n⏱️  {title}:")
+    print(f"   {'':42s} {'n':>6s} {'p50':>9s} {'p99':>9s} {'peak KiB':>9s}")
+    for name, e in entries.items():
+        peak = e.get('alloc_peak_kib_mean')
+        peak_str = f"{peak:9.1f}" if peak is not None else f"{'-':>9s}"
+        print(f"   {name:42s} {e['count']:6d} {e['p50_ms']:8.3f}ms {e['p99_ms']:8.3f}ms {peak_str}")
+
+
+def run_benchmark(args) -> int:
+    print("=" * 60)
+    print("AIKI PROXY REPLAY BENCHMARK")
+    print(f"Tid: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory(prefix='aiki-replay-') as tmp:
+        module, addon = load_addon(Path(tmp))
+
+        if args.flows:
+            flows = load_recorded_flows(Path(args.flows))
+            source = str(args.flows)
+        else:
+            flows = synthesize_flows(args.n, args.seed)
+            source = f"synthetic(n={args.n}, seed={args.seed})"
+        print(f"\nKjører {len(flows)} flows fra {source}...")
+
+        timing = run_pass(addon, flows, args.warmup, trace_alloc=False,
+                          real_delays=args.real_delays)
+        alloc = None
+        if not args.no_alloc:
+            print("Allokerings-pass (tracemalloc)...")
+            alloc = run_pass(addon, flows, 0, trace_alloc=True,
+                             real_delays=args.real_delays)
+
+        result = {
+            'meta': {
+                'commit': git_commit(),
+                'timestamp': datetime.now().isoformat(),
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'source': source,
+                'flows': len(flows),
+                'warmup': args.warmup,
+                'engines_available': module.ENGINES_AVAILABLE,
+                'real_delays': args.real_delays,
+            },
+            'hooks': summarize(timing, alloc, HOOKS),
+            'engines': summarize(timing, alloc, [name for name, _, _ in ENGINE_PROBES]),
+            'addon_stats': {k: v for k, v in addon.stats.items() if k != 'start_time'},
+            'delays': dict(addon.delay_scheduler.stats),
+        }
+
+        addon.done()
+
+    print_table("HOOKS", result['hooks'])
+    print_table("ENGINES", result['engines'])
+
+    output = Path(args.output or f"proxy_replay_{result['meta']['commit']}.json")
+    output.write_text(json.dumps(result, indent=2))
+    print(f"\n💾 Resultat skrevet til {output}")
+
+    regressions = 0
+    if args.compare:
+        regressions = compare(result, Path(args.compare), args.threshold)
+        print("\n" + "=" * 60)
+        if regressions:
+            print(f"⚠️  {regressions} metrikker over {args.threshold:.0f}% tregere")
+        else:
+            print("✅ Ingen regresjoner")
+
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay flows gjennom AIKI proxy hot path")
+    parser.add_argument('--flows', help="Innspilt mitmproxy-fil (mitmdump -w)")
+    parser.add_argument('-n', type=int, default=2000, help="Antall syntetiske flows")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--warmup', type=int, default=100, help="Flows som kjøres før måling")
+    parser.add_argument('--no-alloc', action='store_true', help="Hopp over tracemalloc-pass")
+    parser.add_argument('--real-delays', action='store_true',
+                        help="Vent faktisk på throttle-/intervensjons-forsinkelser")
+    parser.add_argument('--output', help="JSON-fil (default proxy_replay_<commit>.json)")
+    parser.add_argument('--compare', help="Tidligere JSON-resultat å sammenligne mot")
+    parser.add_argument('--threshold', type=float, default=20.0,
+                        help="Prosent tregere som regnes som regresjon")
+    sys.exit(run_benchmark(parser.parse_args()))
@@ -196,7 +196,9 @@ class MemoryMigrator:
 
         self._init_mem0()
         migrated = 0
+        raw_convs = []
 
+        # Pass 1: parse alle samtaler (ingen I/O)
         for i, conv in enumerate(conversations):
             try:
                 title = conv.get("title", "Untitled")
@@ -216,7 +218,7 @@ class MemoryMigrator:
                 # Opprett RawConversation
                 created_at = datetime.fromtimestamp(create_time).isoformat() if create_time else datetime.now().isoformat()
 
-                raw_conv = RawConversation(
+                raw_convs.append(RawConversation(
                     session_id=session_id,
                     source=ConversationSource.CHATGPT_WEB,
                     messages=messages,
@@ -224,12 +226,28 @@ class MemoryMigrator:
                     title=title,
                     tags=["chatgpt", "migrert"],
                     metadata={"original_create_time": create_time}
-                )
+                ))
 
-                if not self.dry_run:
-                    # Lagre i SQLite (rå tekst)
-                    self.raw_store.store_conversation(raw_conv)
+            except Exception as e:
+                logger.error(f"  Feil ved parsing av samtale {i}: {e}")
+                self.stats["errors"].append(f"ChatGPT {i}: {e}")
+
+        # Pass 2: rå tekst til SQLite i store transaksjoner
+        if not self.dry_run and raw_convs:
+            result = self.raw_store.store_conversations_bulk(raw_convs)
+            logger.info(f"SQLite: {result['messages']} meldinger lagret på {result['seconds']:.1f}s")
+            if result["failed"]:
+                self.stats["errors"].append(f"ChatGPT SQLite bulk: {result['failed']} samtaler feilet")
 
+        # Pass 3: sammendrag til Qdrant (rate-limitet)
+        for i, raw_conv in enumerate(raw_convs):
+            try:
+                title = raw_conv.title
+                session_id = raw_conv.session_id
+                messages = raw_conv.messages
+                created_at = raw_conv.created_at
+
+                if not self.dry_run:
                     # Lagre sammendrag i Qdrant
                     summary = f"ChatGPT samtale: {title}. {len(messages)} meldinger fra {created_at[:10]}."
                     if messages:
@@ -254,7 +272,7 @@ class MemoryMigrator:
                 self.stats["chatgpt_migrated"] += 1
 
                 if (i + 1) % 10 == 0:
-                    logger.info(f"  [{i+1}/{len(conversations)}] Migrert {migrated} samtaler...")
+                    logger.info(f"  [{i+1}/{len(raw_convs)}] Migrert {migrated} samtaler...")
 
                 # Rate limiting for OpenRouter
                 time.sleep(0.5)
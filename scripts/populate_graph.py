@@ -62,6 +62,7 @@ def extract_keywords(text: str) -> list:
 def populate_graph():
     """Hovedfunksjon for å populere grafen"""
     graph = MemoryGraph()
+    store = RawConversationStore(str(DB_PATH))
 
     # Åpne SQLite direkte
     conn = sqlite3.connect(str(DB_PATH))
@@ -96,13 +97,9 @@ def populate_graph():
         )
         created_nodes += 1
 
-        # Hent meldingsinnhold for keyword-ekstraksjon (fra FTS-tabell)
-        cursor.execute("""
-            SELECT content FROM messages_fts
-            WHERE session_id = ?
-            LIMIT 10
-        """, (session_id,))
-        messages = [row[0] for row in cursor.fetchall()]
+        # Hent meldingsinnhold for keyword-ekstraksjon (dekomprimert fra messages)
+        conversation = store.get_conversation(session_id)
+        messages = [msg.content for msg in conversation.messages[:10]] if conversation else []
         full_text = " ".join(messages) + " " + (title or "")
 
         # Ekstraher keywords
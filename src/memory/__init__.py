@@ -47,7 +47,8 @@ Memory Types (10/10 = 100% human coverage):
 
 Raw Storage (supplement):
 - SQLite + FTS5 for exact text retrieval
-- zstd compression (~90% reduction)
+- WAL connection pool (1 writer + N readers, shared per database file)
+- zstd compression with trained, versioned dictionaries (short messages too)
 - Hybrid search: Qdrant → SQLite
 """
 
@@ -71,6 +72,13 @@ from .raw_conversation_store import (
     hybrid_search_sync
 )
 
+from .connection_manager import (
+    ConnectionManager,
+    get_connection_manager
+)
+
+from .zstd_dictionary import ZstdDictionaryCodec
+
 from .unified_memory import (
     UnifiedMemory,
     get_unified_memory,
@@ -113,5 +121,10 @@ __all__ = [
     'ConversationMessage',
     'ConversationSource',
     'hybrid_search',
-    'hybrid_search_sync'
+    'hybrid_search_sync',
+    # SQLite Connection Manager
+    'ConnectionManager',
+    'get_connection_manager',
+    # zstd Dictionary Codec
+    'ZstdDictionaryCodec'
 ]
@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+"""
+AIKI SQLite Connection Manager
+
+Delt connection-lag for SQLite-databasene i memory-systemet.
+
+Før: hver metode i RawConversationStore åpnet en ny sqlite3.connect,
+brukte default rollback-journal og lukket etterpå. Memory-daemonen
+låste hele databasen for hver skriving, og søk/kontekstbyggere betalte
+connect + schema-parsing for hvert kall.
+
+Nå:
+1. Én skrive-connection og N lese-connections i WAL-modus - lesere
+   blokkeres aldri av skriveren (og omvendt)
+2. Tunede pragmas: synchronous=NORMAL, mmap_size, cache_size, temp_store
+3. Prepared statements caches per connection (sqlite3 cached_statements)
+   - SQL-tekst som gjenbrukes kompileres bare én gang per connection
+4. Trådsikker checkout: writer() serialiserer skrivere med en RLock,
+   reader() låner en connection fra en kø. Nestede kall i samme tråd
+   gjenbruker connectionen den allerede har.
+
+Usage:
+    db = get_connection_manager("~/aiki/data/raw_conversations.db")
+
+    with db.writer() as conn:    # commit ved exit, rollback ved exception
+        conn.execute("INSERT ...", params)
+
+    with db.reader() as conn:    # read-only, parallelt med writer
+        rows = conn.execute("SELECT ...", params).fetchall()
+
+#version: 1.0.0
+#created: 2026-10-16
+"""
+
+import atexit
+import logging
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class ConnectionManager:
+    """
+    Én writer + N readers mot samme SQLite-database i WAL-modus.
+
+    Connections opprettes lazy og lever til close(). De flyttes mellom
+    tråder (check_same_thread=False), men brukes aldri av to tråder
+    samtidig - checkout garanterer eksklusiv tilgang.
+    """
+
+    DEFAULT_READERS = 4
+    DEFAULT_MMAP_SIZE = 256 * 1024 * 1024   # 256 MB memory-mapped I/O
+    DEFAULT_CACHE_SIZE_KB = 64 * 1024       # 64 MB page cache per connection
+    DEFAULT_STATEMENT_CACHE = 256           # Prepared statements per connection
+    BUSY_TIMEOUT = 30.0                     # Sekunder å vente på lås fra andre prosesser
+
+    def __init__(
+        self,
+        db_path: str,
+        readers: int = DEFAULT_READERS,
+        mmap_size: int = DEFAULT_MMAP_SIZE,
+        cache_size_kb: int = DEFAULT_CACHE_SIZE_KB,
+        statement_cache: int = DEFAULT_STATEMENT_CACHE
+    ):
+        """
+        Args:
+            db_path: Sti til SQLite database
+            readers: Maks antall samtidige lese-connections
+            mmap_size: Bytes memory-mapped per connection (0 = av)
+            cache_size_kb: Page cache per connection i KB
+            statement_cache: Antall prepared statements som caches per connection
+        """
+        self.db_path = Path(db_path).expanduser()
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_readers = max(1, readers)
+        self.mmap_size = mmap_size
+        self.cache_size_kb = cache_size_kb
+        self.statement_cache = statement_cache
+
+        self._writer: Optional[sqlite3.Connection] = None
+        self._write_lock = threading.RLock()
+        self._readers: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._all_readers: List[sqlite3.Connection] = []
+        self._reader_lock = threading.Lock()
+        self._local = threading.local()
+        self._closed = False
+
+        self.stats = {
+            'connections_opened': 0,
+            'write_checkouts': 0,
+            'read_checkouts': 0,
+            'nested_checkouts': 0,
+            'read_wait_ms': 0.0,
+            'commits': 0,
+            'rollbacks': 0
+        }
+
+    # ==================== CONNECTIONS ====================
+
+    def _connect(self, read_only: bool) -> sqlite3.Connection:
+        """Åpne connection med tunede pragmas"""
+        conn = sqlite3.connect(
+            str(self.db_path),
+            timeout=self.BUSY_TIMEOUT,
+            check_same_thread=False,
+            cached_statements=self.statement_cache
+        )
+        if not read_only:
+            # Persistent i database-filen; settes av writer før lesere åpnes
+            conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA mmap_size={int(self.mmap_size)}")
+        conn.execute(f"PRAGMA cache_size=-{int(self.cache_size_kb)}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        if read_only:
+            conn.execute("PRAGMA query_only=ON")
+
+        self.stats['connections_opened'] += 1
+        return conn
+
+    def _get_writer(self) -> sqlite3.Connection:
+        if self._closed:
+            raise sqlite3.ProgrammingError("ConnectionManager is closed")
+        if self._writer is None:
+            self._writer = self._connect(read_only=False)
+        return self._writer
+
+    # ==================== CHECKOUT ====================
+
+    @contextmanager
+    def writer(self) -> Iterator[sqlite3.Connection]:
+        """
+        Eksklusiv skrive-connection.
+
+        Commit når ytterste writer()-blokk avsluttes, rollback hvis den
+        avsluttes med exception. Nestede writer()-kall i samme tråd deler
+        transaksjonen.
+        """
+        with self._write_lock:
+            conn = self._get_writer()
+            depth = getattr(self._local, 'write_depth', 0)
+            self._local.write_depth = depth + 1
+            if depth:
+                self.stats['nested_checkouts'] += 1
+            else:
+                self.stats['write_checkouts'] += 1
+
+            try:
+                yield conn
+            except BaseException:
+                if depth == 0 and conn.in_transaction:
+                    conn.rollback()
+                    self.stats['rollbacks'] += 1
+                raise
+            else:
+                if depth == 0 and conn.in_transaction:
+                    conn.commit()
+                    self.stats['commits'] += 1
+            finally:
+                self._local.write_depth = depth
+
+    @contextmanager
+    def reader(self) -> Iterator[sqlite3.Connection]:
+        """
+        Read-only connection fra poolen.
+
+        Tråder som holder writer() leser på skrive-connectionen (ser egne
+        ukommitterte endringer). Nestede reader()-kall gjenbruker samme
+        connection, så en metode kan kalle en annen uten å tømme poolen.
+        """
+        if getattr(self._local, 'write_depth', 0):
+            self.stats['nested_checkouts'] += 1
+            yield self._writer
+            return
+
+        current = getattr(self._local, 'reader', None)
+        if current is not None:
+            self.stats['nested_checkouts'] += 1
+            yield current
+            return
+
+        conn = self._checkout_reader()
+        self._local.reader = conn
+        try:
+            yield conn
+        finally:
+            self._local.reader = None
+            if conn.in_transaction:
+                conn.rollback()
+            if self._closed:
+                conn.close()
+            else:
+                self._readers.put(conn)
+
+    def _checkout_reader(self) -> sqlite3.Connection:
+        if self._closed:
+            raise sqlite3.ProgrammingError("ConnectionManager is closed")
+        self.stats['read_checkouts'] += 1
+
+        try:
+            return self._readers.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._reader_lock:
+            if len(self._all_readers) < self.max_readers:
+                # WAL må være satt før første leser åpnes
+                with self._write_lock:
+                    self._get_writer()
+                conn = self._connect(read_only=True)
+                self._all_readers.append(conn)
+                return conn
+
+        # Alle lesere er i bruk - vent på en ledig
+        start = time.perf_counter()
+        conn = self._readers.get()
+        self.stats['read_wait_ms'] += (time.perf_counter() - start) * 1000
+        return conn
+
+    # ==================== VEDLIKEHOLD ====================
+
+    def checkpoint(self, mode: str = "PASSIVE") -> Optional[tuple]:
+        """Kjør WAL-checkpoint (PASSIVE/FULL/RESTART/TRUNCATE)"""
+        with self.writer() as conn:
+            return conn.execute(f"PRAGMA wal_checkpoint({mode})").fetchone()
+
+    def close(self):
+        """Lukk alle connections (ledige lesere nå, utlånte ved retur)"""
+        self._closed = True
+        with self._write_lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+        while True:
+            try:
+                self._readers.get_nowait().close()
+            except queue.Empty:
+                break
+
+    def get_stats(self) -> Dict:
+        """Hent statistikk"""
+        return {
+            **self.stats,
+            'readers_open': len(self._all_readers),
+            'readers_idle': self._readers.qsize(),
+            'max_readers': self.max_readers
+        }
+
+
+# Delt instans per database-fil - alle stores i prosessen deler connections
+_managers: Dict[Path, ConnectionManager] = {}
+_managers_lock = threading.Lock()
+
+
+def get_connection_manager(db_path: str, **kwargs) -> ConnectionManager:
+    """Hent (eller opprett) delt ConnectionManager for en database-fil"""
+    key = Path(db_path).expanduser().resolve()
+    with _managers_lock:
+        manager = _managers.get(key)
+        if manager is None or manager._closed:
+            manager = ConnectionManager(str(key), **kwargs)
+            _managers[key] = manager
+        return manager
+
+
+def close_all_managers():
+    """Lukk alle delte managers (kalles ved prosess-exit)"""
+    with _managers_lock:
+        managers = list(_managers.values())
+        _managers.clear()
+    for manager in managers:
+        try:
+            manager.close()
+        except Exception as e:
+            logger.error(f"Error closing {manager.db_path}: {e}")
+
+
+atexit.register(close_all_managers)
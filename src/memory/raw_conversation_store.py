@@ -6,7 +6,8 @@ Lagrer EKSAKT samtaledata som aldri komprimeres eller reformuleres.
 Løser problemet: "Hva sa jeg NØYAKTIG om bestefar for 2 år siden?"
 
 Arkitektur:
-1. SQLite med FTS5 for full-text search
+1. SQLite med FTS5 for full-text search (contentless - kun indeksen,
+   teksten leses fra den komprimerte messages-tabellen)
 2. zstd komprimering (~90% reduksjon)
 3. Qdrant-pekere: session_id linker til eksakt tekst
 4. Støtter dato-filtrering
@@ -25,19 +26,51 @@ Hybrid-søk flyt:
 #author: Claude (AIKI Memory System)
 """
 
-import sqlite3
-import zstandard as zstd
+import os
+import re
+import threading
+import time
 import json
 import hashlib
+import unicodedata
+from bisect import bisect_left
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
+from itertools import islice
 from pathlib import Path
-from typing import Dict, List, Optional, Any, Tuple
+from typing import Dict, Iterable, Iterator, List, Optional, Any, Tuple
 from dataclasses import dataclass, asdict
 from enum import Enum
 import logging
 
+from .connection_manager import get_connection_manager
+from .zstd_dictionary import ZstdDictionaryCodec
+
 logger = logging.getLogger(__name__)
 
+# Samtaler per transaksjon i store_conversations_bulk
+BULK_BATCH_SIZE = 5000
+# FTS5-konfig under bulk-last vs. FTS5 sine defaults (persistent i indeksen)
+FTS_BULK_CONFIG = {"automerge": 0, "hashsize": 64 * 1024 * 1024}
+FTS_DEFAULT_CONFIG = {"automerge": 4, "hashsize": 1024 * 1024}
+# Meldinger i treningsutvalget for zstd-ordbok
+DICT_SAMPLE_SIZE = 20000
+# Rader per transaksjon når eldre rader re-komprimeres
+RECOMPRESS_BATCH_SIZE = 2000
+# Meldinger per runde når FTS-indeksen bygges på nytt
+FTS_REBUILD_BATCH_SIZE = 5000
+# Tokens i søke-snippets (samme som snippet(..., 32) ga før)
+SNIPPET_TOKENS = 32
+
+# Contentless FTS5: rowid = messages.message_id, ingen kopi av teksten
+FTS_SCHEMA = "CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(content, content='')"
+
+# Samme tokenisering som unicode61: bokstaver og tall, resten skiller
+_TOKEN_RE = re.compile(r"[^\W_]+")
+# Fraser, ord med valgfri prefiks-stjerne, og kolonnefilter som hoppes over
+_QUERY_RE = re.compile(r'"((?:[^"]|"")*)"(\s*\*)?|\w+\s*:|(\w+)(\s*\*)?')
+_QUERY_OPERATORS = {"AND", "OR", "NOT", "NEAR"}
+
 
 class ConversationSource(Enum):
     """Kilde for samtale"""
@@ -73,6 +106,66 @@ class RawConversation:
     metadata: Optional[Dict] = None
 
 
+def _fold(token: str) -> str:
+    """Casefold og fjern diakritiske tegn (som unicode61 remove_diacritics)"""
+    decomposed = unicodedata.normalize("NFKD", token.casefold())
+    return "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+
+
+def _query_terms(query: str) -> Tuple[set, Tuple[str, ...]]:
+    """Hent søkeord fra en FTS5-query: (eksakte ord, prefikser)"""
+    terms, prefixes = set(), []
+    for match in _QUERY_RE.finditer(query):
+        phrase, phrase_star, word, word_star = match.groups()
+        text = phrase.replace('""', '"') if phrase is not None else word
+        if text is None or text in _QUERY_OPERATORS:
+            continue
+        tokens = [_fold(t) for t in _TOKEN_RE.findall(text)]
+        if tokens and (phrase_star or word_star):
+            prefixes.append(tokens.pop())
+        terms.update(tokens)
+    return terms, tuple(prefixes)
+
+
+def _build_snippet(
+    text: str,
+    terms: set,
+    prefixes: Tuple[str, ...],
+    max_tokens: int = SNIPPET_TOKENS
+) -> str:
+    """
+    Bygg snippet fra dekomprimert tekst, som FTS5 sin snippet().
+
+    Contentless FTS5 har ingen tekst å lage snippets fra - vinduet med
+    flest treff velges her, og treff markeres med >>> <<<.
+    """
+    tokens = list(_TOKEN_RE.finditer(text))
+    if not tokens:
+        return text
+
+    hits = []
+    for i, token in enumerate(tokens):
+        folded = _fold(token.group())
+        if folded in terms or folded.startswith(prefixes):
+            hits.append(i)
+
+    start = 0
+    if hits:
+        best = max(hits, key=lambda h: bisect_left(hits, h + max_tokens) - bisect_left(hits, h))
+        start = max(0, min(best - 2, len(tokens) - max_tokens))
+    end = min(len(tokens), start + max_tokens)
+
+    parts = ["..."] if start else []
+    pos = tokens[start].start() if start else 0
+    for i in hits[bisect_left(hits, start):bisect_left(hits, end)]:
+        parts += [text[pos:tokens[i].start()], ">>>", tokens[i].group(), "<<<"]
+        pos = tokens[i].end()
+    parts.append(text[pos:tokens[end - 1].end()] if end < len(tokens) else text[pos:])
+    if end < len(tokens):
+        parts.append("...")
+    return "".join(parts)
+
+
 class RawConversationStore:
     """
     SQLite-basert lagring av rå samtaledata.
@@ -97,214 +190,536 @@ class RawConversationStore:
         self.db_path = Path(db_path)
         self.db_path.parent.mkdir(parents=True, exist_ok=True)
 
-        # zstd kompressor for effektiv lagring
-        self.compressor = zstd.ZstdCompressor(level=3)
-        self.decompressor = zstd.ZstdDecompressor()
+        # Delt WAL-pool per database-fil (1 writer + N readers)
+        self.db = get_connection_manager(str(self.db_path))
+
+        # zstd med versjonerte ordbøker; (de)kompressorer caches per tråd
+        self.codec = ZstdDictionaryCodec(self.db, level=3)
 
         self._init_db()
+        self.codec.load()
+        self._migrate_fts()
+
+        # Bakgrunnsjobb som flytter eldre rader over på aktiv ordbok
+        self._recompress_thread: Optional[threading.Thread] = None
+        self._recompress_stop = threading.Event()
 
     def _init_db(self):
         """Opprett database-tabeller og FTS5 indeks"""
-        conn = sqlite3.connect(str(self.db_path))
-        cursor = conn.cursor()
-
-        # Hovedtabell for samtaler
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS conversations (
-                session_id TEXT PRIMARY KEY,
-                source TEXT NOT NULL,
-                title TEXT,
-                tags TEXT,  -- JSON array
-                qdrant_ids TEXT,  -- JSON array med pekere til Qdrant
-                metadata TEXT,  -- JSON
-                created_at TEXT NOT NULL,
-                updated_at TEXT NOT NULL,
-                message_count INTEGER DEFAULT 0
-            );
-        """)
-
-        # Meldinger - komprimert lagring
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS messages (
-                message_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                session_id TEXT NOT NULL,
-                message_index INTEGER NOT NULL,
-                role TEXT NOT NULL,
-                content_compressed BLOB NOT NULL,  -- zstd komprimert
-                content_hash TEXT NOT NULL,  -- For deduplisering
-                timestamp TEXT,
-                metadata TEXT,  -- JSON
-                created_at TEXT NOT NULL,
-
-                FOREIGN KEY (session_id) REFERENCES conversations(session_id),
-                UNIQUE(session_id, message_index)
-            );
-        """)
-
-        # FTS5 virtuell tabell for full-text search
-        # Note: Standalone FTS table (not contentless) for enklere queries
-        cursor.execute("""
-            CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
-                session_id,
-                role,
-                content
-            );
-        """)
-
-        # Indekser for ytelse
-        cursor.execute("""
-            CREATE INDEX IF NOT EXISTS idx_messages_session_id
-            ON messages(session_id);
-        """)
-        cursor.execute("""
-            CREATE INDEX IF NOT EXISTS idx_conversations_created_at
-            ON conversations(created_at);
-        """)
-        cursor.execute("""
-            CREATE INDEX IF NOT EXISTS idx_conversations_source
-            ON conversations(source);
-        """)
-
-        # Tabell for Qdrant->Session mapping
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS qdrant_mappings (
-                qdrant_id TEXT PRIMARY KEY,
-                session_id TEXT NOT NULL,
-                message_index INTEGER,  -- Null = hele samtalen
-                summary TEXT,  -- Hva Qdrant-minnet handler om
-                created_at TEXT NOT NULL,
-
-                FOREIGN KEY (session_id) REFERENCES conversations(session_id)
-            );
-        """)
-
-        cursor.execute("""
-            CREATE INDEX IF NOT EXISTS idx_qdrant_mappings_session
-            ON qdrant_mappings(session_id);
-        """)
-
-        conn.commit()
-        conn.close()
+        with self.db.writer() as conn:
+            cursor = conn.cursor()
+
+            # Hovedtabell for samtaler
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS conversations (
+                    session_id TEXT PRIMARY KEY,
+                    source TEXT NOT NULL,
+                    title TEXT,
+                    tags TEXT,  -- JSON array
+                    qdrant_ids TEXT,  -- JSON array med pekere til Qdrant
+                    metadata TEXT,  -- JSON
+                    created_at TEXT NOT NULL,
+                    updated_at TEXT NOT NULL,
+                    message_count INTEGER DEFAULT 0
+                );
+            """)
+
+            # Meldinger - komprimert lagring
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS messages (
+                    message_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    session_id TEXT NOT NULL,
+                    message_index INTEGER NOT NULL,
+                    role TEXT NOT NULL,
+                    content_compressed BLOB NOT NULL,  -- zstd komprimert
+                    content_hash TEXT NOT NULL,  -- For deduplisering
+                    timestamp TEXT,
+                    metadata TEXT,  -- JSON
+                    created_at TEXT NOT NULL,
+
+                    FOREIGN KEY (session_id) REFERENCES conversations(session_id),
+                    UNIQUE(session_id, message_index)
+                );
+            """)
+
+            # FTS5 virtuell tabell for full-text search
+            # Contentless: teksten ligger kun komprimert i messages,
+            # indeksen synkes eksplisitt fra Python (rowid = message_id)
+            cursor.execute(FTS_SCHEMA)
+
+            # Indekser for ytelse
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_messages_session_id
+                ON messages(session_id);
+            """)
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_conversations_created_at
+                ON conversations(created_at);
+            """)
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_conversations_source
+                ON conversations(source);
+            """)
+
+            # Tabell for Qdrant->Session mapping
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS qdrant_mappings (
+                    qdrant_id TEXT PRIMARY KEY,
+                    session_id TEXT NOT NULL,
+                    message_index INTEGER,  -- Null = hele samtalen
+                    summary TEXT,  -- Hva Qdrant-minnet handler om
+                    created_at TEXT NOT NULL,
+
+                    FOREIGN KEY (session_id) REFERENCES conversations(session_id)
+                );
+            """)
+
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_qdrant_mappings_session
+                ON qdrant_mappings(session_id);
+            """)
+
+            # Kjedet hash over lagrede meldinger (NULL = beregnes ved neste lagring)
+            columns = {row[1] for row in cursor.execute("PRAGMA table_info(conversations)")}
+            if 'history_hash' not in columns:
+                cursor.execute("ALTER TABLE conversations ADD COLUMN history_hash TEXT")
+
+            # zstd-ordbøker + messages.dict_id (migrerer eldre databaser)
+            ZstdDictionaryCodec.init_schema(conn)
 
         logger.info(f"Database initialized: {self.db_path}")
 
-    def _compress(self, text: str) -> bytes:
-        """Komprimer tekst med zstd"""
-        return self.compressor.compress(text.encode('utf-8'))
+    def _migrate_fts(self):
+        """
+        Erstatt eldre standalone messages_fts med contentless indeks.
+
+        Den gamle tabellen lagret en ukomprimert kopi av hver melding ved
+        siden av zstd-dataene. Indeksen bygges på nytt fra messages, og
+        databasen VACUUM-es så den frigjorte plassen leveres tilbake.
+
+        DROP, CREATE og rebuild kjører i én transaksjon (nestede writer()
+        deler den) - feiler rebuild står den gamle tabellen urørt.
+        """
+        with self.db.reader() as conn:
+            row = conn.execute(
+                "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'messages_fts'"
+            ).fetchone()
+        if row is None or "content=''" in row[0]:
+            return
+
+        logger.info("Migrating messages_fts to contentless FTS5 index...")
+        with self.db.writer() as conn:
+            # DDL starter ingen implisitt transaksjon i sqlite3-modulen
+            if not conn.in_transaction:
+                conn.execute("BEGIN IMMEDIATE")
+            conn.execute("DROP TABLE messages_fts")
+            conn.execute(FTS_SCHEMA)
+            indexed = self.rebuild_fts_index()
+
+        with self.db.writer() as conn:
+            conn.execute("VACUUM")
+        logger.info(f"messages_fts migrated ({indexed} messages re-indexed)")
+
+    def rebuild_fts_index(self, batch_size: int = FTS_REBUILD_BATCH_SIZE) -> int:
+        """
+        Bygg FTS-indeksen på nytt fra de komprimerte meldingene.
+
+        Kjører i én transaksjon - søk ser enten gammel eller ny indeks.
+
+        Returns:
+            Antall indekserte meldinger
+        """
+        count = 0
+        self._set_fts_config(FTS_BULK_CONFIG)
+        try:
+            with self.db.writer() as conn:
+                conn.execute("INSERT INTO messages_fts(messages_fts) VALUES('delete-all')")
+                last_id = 0
+                while True:
+                    rows = conn.execute("""
+                        SELECT message_id, content_compressed, dict_id FROM messages
+                        WHERE message_id > ?
+                        ORDER BY message_id
+                        LIMIT ?
+                    """, (last_id, batch_size)).fetchall()
+                    if not rows:
+                        break
+                    conn.executemany(
+                        "INSERT INTO messages_fts(rowid, content) VALUES (?, ?)",
+                        [(message_id, self._decompress(blob, dict_id)) for message_id, blob, dict_id in rows]
+                    )
+                    count += len(rows)
+                    last_id = rows[-1][0]
+        finally:
+            self._set_fts_config(FTS_DEFAULT_CONFIG)
+
+        with self.db.writer() as conn:
+            conn.execute("INSERT INTO messages_fts(messages_fts) VALUES('optimize')")
+        return count
 
-    def _decompress(self, data: bytes) -> str:
-        """Dekomprimer zstd data"""
-        return self.decompressor.decompress(data).decode('utf-8')
+    def _compress(self, text: str) -> Tuple[bytes, Optional[int]]:
+        """Komprimer tekst med zstd (aktiv ordbok). Returnerer (blob, dict_id)"""
+        return self.codec.compress(text.encode('utf-8'))
+
+    def _decompress(self, data: bytes, dict_id: Optional[int] = None) -> str:
+        """Dekomprimer zstd data med ordboken raden ble skrevet med"""
+        return self.codec.decompress(data, dict_id).decode('utf-8')
 
     def _content_hash(self, content: str) -> str:
         """Generer hash for deduplisering"""
         return hashlib.sha256(content.encode('utf-8')).hexdigest()[:16]
 
+    @staticmethod
+    def _history_hash(hashes: Iterable[Tuple[str, str]], previous: str = "") -> str:
+        """
+        Kjedet hash over (role, content_hash) i rekkefølge.
+
+        Kjeden kan fortsettes fra en lagret verdi, så en append trenger
+        bare hashe de nye meldingene for å få hashen til hele historikken.
+        """
+        digest = previous
+        for role, content_hash in hashes:
+            digest = hashlib.sha256(f"{digest}\0{role}\0{content_hash}".encode('utf-8')).hexdigest()[:32]
+        return digest
+
     def store_conversation(self, conversation: RawConversation) -> bool:
         """
         Lagre en komplett samtale.
 
+        Eksisterende samtaler oppdateres inkrementelt: hvis de lagrede
+        meldingene er et uendret prefiks av samtalen (samme history_hash),
+        skrives bare meldingene etter lagret message_count. Endret eller
+        forkortet historikk gir full omskriving.
+
         Args:
             conversation: RawConversation objekt
 
         Returns:
             bool: True hvis vellykket
         """
-        conn = sqlite3.connect(str(self.db_path))
-        cursor = conn.cursor()
-
         try:
-            now = datetime.now().isoformat()
+            with self.db.writer() as conn:
+                cursor = conn.cursor()
 
-            # Sjekk om samtale allerede eksisterer
-            cursor.execute(
-                "SELECT session_id FROM conversations WHERE session_id = ?",
-                (conversation.session_id,)
-            )
-            exists = cursor.fetchone() is not None
+                now = datetime.now().isoformat()
+                hashes = [(msg.role, self._content_hash(msg.content)) for msg in conversation.messages]
 
-            if exists:
-                # Oppdater eksisterende
-                cursor.execute("""
-                    UPDATE conversations
-                    SET title = ?, tags = ?, qdrant_ids = ?, metadata = ?,
-                        updated_at = ?, message_count = ?
-                    WHERE session_id = ?
-                """, (
-                    conversation.title,
-                    json.dumps(conversation.tags) if conversation.tags else None,
-                    json.dumps(conversation.qdrant_ids) if conversation.qdrant_ids else None,
-                    json.dumps(conversation.metadata) if conversation.metadata else None,
-                    now,
-                    len(conversation.messages),
-                    conversation.session_id
-                ))
-
-                # Slett gamle meldinger og FTS data
+                # Sjekk om samtale allerede eksisterer
                 cursor.execute(
-                    "DELETE FROM messages WHERE session_id = ?",
+                    "SELECT message_count, history_hash FROM conversations WHERE session_id = ?",
                     (conversation.session_id,)
                 )
-                cursor.execute(
-                    "DELETE FROM messages_fts WHERE session_id = ?",
-                    (conversation.session_id,)
+                row = cursor.fetchone()
+                start = 0
+
+                if row:
+                    stored_count, stored_hash = row
+                    if stored_hash is None:
+                        # Lagret før history_hash fantes - beregn fra meldingene
+                        stored_hash = self._history_hash(cursor.execute("""
+                            SELECT role, content_hash FROM messages
+                            WHERE session_id = ?
+                            ORDER BY message_index
+                        """, (conversation.session_id,)).fetchall())
+
+                    prefix_hash = self._history_hash(hashes[:stored_count])
+                    if stored_count <= len(hashes) and prefix_hash == stored_hash:
+                        # Uendret historikk: bare nye meldinger skrives
+                        start = stored_count
+                        history_hash = self._history_hash(hashes[start:], prefix_hash)
+                    else:
+                        # Endret historikk: slett gamle FTS data (trenger teksten) og meldinger
+                        history_hash = self._history_hash(hashes)
+                        self._delete_fts_rows(conn, [conversation.session_id])
+                        cursor.execute(
+                            "DELETE FROM messages WHERE session_id = ?",
+                            (conversation.session_id,)
+                        )
+                        logger.info(f"History changed for {conversation.session_id}, rewriting all messages")
+
+                    # Oppdater eksisterende
+                    cursor.execute("""
+                        UPDATE conversations
+                        SET title = ?, tags = ?, qdrant_ids = ?, metadata = ?,
+                            updated_at = ?, message_count = ?, history_hash = ?
+                        WHERE session_id = ?
+                    """, (
+                        conversation.title,
+                        json.dumps(conversation.tags) if conversation.tags else None,
+                        json.dumps(conversation.qdrant_ids) if conversation.qdrant_ids else None,
+                        json.dumps(conversation.metadata) if conversation.metadata else None,
+                        now,
+                        len(conversation.messages),
+                        history_hash,
+                        conversation.session_id
+                    ))
+                else:
+                    # Ny samtale
+                    cursor.execute("""
+                        INSERT INTO conversations
+                        (session_id, source, title, tags, qdrant_ids, metadata,
+                         created_at, updated_at, message_count, history_hash)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    """, (
+                        conversation.session_id,
+                        conversation.source.value if isinstance(conversation.source, ConversationSource) else conversation.source,
+                        conversation.title,
+                        json.dumps(conversation.tags) if conversation.tags else None,
+                        json.dumps(conversation.qdrant_ids) if conversation.qdrant_ids else None,
+                        json.dumps(conversation.metadata) if conversation.metadata else None,
+                        conversation.created_at,
+                        now,
+                        len(conversation.messages),
+                        self._history_hash(hashes)
+                    ))
+
+                # Lagre meldinger (fra start - 0 for ny/omskrevet samtale)
+                for idx in range(start, len(conversation.messages)):
+                    msg = conversation.messages[idx]
+                    compressed, dict_id = self._compress(msg.content)
+
+                    cursor.execute("""
+                        INSERT INTO messages
+                        (session_id, message_index, role, content_compressed,
+                         dict_id, content_hash, timestamp, metadata, created_at)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    """, (
+                        conversation.session_id,
+                        idx,
+                        msg.role,
+                        compressed,
+                        dict_id,
+                        hashes[idx][1],
+                        msg.timestamp,
+                        json.dumps(msg.metadata) if msg.metadata else None,
+                        now
+                    ))
+
+                    # Indekser for full-text søk (kun tokens, ingen tekst)
+                    cursor.execute(
+                        "INSERT INTO messages_fts (rowid, content) VALUES (?, ?)",
+                        (cursor.lastrowid, msg.content)
+                    )
+
+                logger.info(
+                    f"Stored conversation {conversation.session_id} with {len(conversation.messages)} messages "
+                    f"({len(conversation.messages) - start} written)"
                 )
-            else:
-                # Ny samtale
-                cursor.execute("""
-                    INSERT INTO conversations
-                    (session_id, source, title, tags, qdrant_ids, metadata,
-                     created_at, updated_at, message_count)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """, (
-                    conversation.session_id,
-                    conversation.source.value if isinstance(conversation.source, ConversationSource) else conversation.source,
-                    conversation.title,
-                    json.dumps(conversation.tags) if conversation.tags else None,
-                    json.dumps(conversation.qdrant_ids) if conversation.qdrant_ids else None,
-                    json.dumps(conversation.metadata) if conversation.metadata else None,
-                    conversation.created_at,
-                    now,
-                    len(conversation.messages)
-                ))
+                return True
+
+        except Exception as e:
+            logger.error(f"Error storing conversation: {e}")
+            return False
 
-            # Lagre meldinger
-            for idx, msg in enumerate(conversation.messages):
-                compressed = self._compress(msg.content)
-                content_hash = self._content_hash(msg.content)
+    def store_conversations_bulk(
+        self,
+        conversations: Iterable[RawConversation],
+        batch_size: int = BULK_BATCH_SIZE,
+        workers: Optional[int] = None,
+        optimize: bool = True
+    ) -> Dict[str, Any]:
+        """
+        Lagre mange samtaler effektivt (migrering/backfill).
 
-                cursor.execute("""
-                    INSERT INTO messages
-                    (session_id, message_index, role, content_compressed,
-                     content_hash, timestamp, metadata, created_at)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                """, (
-                    conversation.session_id,
-                    idx,
-                    msg.role,
-                    compressed,
-                    content_hash,
-                    msg.timestamp,
-                    json.dumps(msg.metadata) if msg.metadata else None,
-                    now
-                ))
+        Samme sluttresultat som store_conversation per samtale (eksisterende
+        session_id erstattes helt - ingen prefiks-sjekk), men:
+        - zstd-komprimering og hashing kjøres parallelt i tråder, og
+          neste batch komprimeres mens forrige skrives
+        - hver batch skrives i én transaksjon med executemany
+        - FTS5 automerge er av og hashsize økt under lasten (færre,
+          større segmenter); indeksen merges én gang til slutt (optimize)
 
-                # Legg også til i FTS-tabellen for full-text søk
-                cursor.execute("""
-                    INSERT INTO messages_fts (session_id, role, content)
-                    VALUES (?, ?, ?)
-                """, (conversation.session_id, msg.role, msg.content))
+        Args:
+            conversations: Iterator/liste med RawConversation (leses lazy)
+            batch_size: Antall samtaler per transaksjon
+            workers: Antall kompresjonstråder (default: CPU-antall)
+            optimize: Merge FTS-indeksen til ett segment etter lasten
 
-            conn.commit()
-            logger.info(f"Stored conversation {conversation.session_id} with {len(conversation.messages)} messages")
-            return True
+        Returns:
+            Dict med conversations, messages, failed og seconds
+        """
+        start = time.perf_counter()
+        result = {"conversations": 0, "messages": 0, "failed": 0, "seconds": 0.0}
+        workers = workers or min(8, os.cpu_count() or 1)
 
-        except Exception as e:
-            logger.error(f"Error storing conversation: {e}")
-            conn.rollback()
-            return False
+        self._set_fts_config(FTS_BULK_CONFIG)
+        try:
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="raw-store-zstd") as executor:
+                previous = None
+                for batch in self._batched(conversations, batch_size):
+                    # Map sender hele batchen til trådene med en gang
+                    current = (batch, executor.map(self._prepare_messages, batch))
+                    if previous:
+                        self._write_bulk_batch(*previous, result)
+                    previous = current
+                if previous:
+                    self._write_bulk_batch(*previous, result)
         finally:
-            conn.close()
+            self._set_fts_config(FTS_DEFAULT_CONFIG)
+
+        if optimize and result["messages"]:
+            try:
+                with self.db.writer() as conn:
+                    conn.execute("INSERT INTO messages_fts(messages_fts) VALUES('optimize')")
+            except Exception as e:
+                logger.error(f"FTS optimize failed: {e}")
+
+        result["seconds"] = time.perf_counter() - start
+        logger.info(
+            f"Bulk stored {result['conversations']} conversations / {result['messages']} messages "
+            f"in {result['seconds']:.2f}s ({result['failed']} failed)"
+        )
+        return result
+
+    @staticmethod
+    def _batched(items: Iterable[RawConversation], size: int) -> Iterator[List[RawConversation]]:
+        """Del iterator i lister; siste forekomst av en session_id i batchen vinner"""
+        iterator = iter(items)
+        while True:
+            chunk = list(islice(iterator, size))
+            if not chunk:
+                return
+            yield list({conv.session_id: conv for conv in chunk}.values())
+
+    def _prepare_messages(self, conversation: RawConversation) -> List[Tuple[bytes, Optional[int], str]]:
+        """Komprimer og hash meldingene i én samtale (kjører i worker-tråd)"""
+        prepared = []
+        for msg in conversation.messages:
+            data = msg.content.encode('utf-8')
+            prepared.append((*self.codec.compress(data), hashlib.sha256(data).hexdigest()[:16]))
+        return prepared
+
+    def _write_bulk_batch(
+        self,
+        batch: List[RawConversation],
+        prepared: Iterator[List[Tuple[bytes, Optional[int], str]]],
+        result: Dict[str, Any]
+    ):
+        """Skriv én batch i én transaksjon (rollback og fortsett ved feil)"""
+        now = datetime.now().isoformat()
+        conversation_rows = []
+        update_rows = []
+        message_rows = []
+        fts_rows = []
+
+        try:
+            with self.db.writer() as conn:
+                existing = set()
+                session_ids = [conv.session_id for conv in batch]
+                for i in range(0, len(session_ids), 500):
+                    chunk = session_ids[i:i + 500]
+                    placeholders = ','.join('?' * len(chunk))
+                    existing.update(row[0] for row in conn.execute(
+                        f"SELECT session_id FROM conversations WHERE session_id IN ({placeholders})",
+                        chunk
+                    ))
+
+                # Eksplisitte message_id-er, så FTS-radene kan skrives med executemany
+                message_id = max(
+                    conn.execute("SELECT COALESCE(MAX(message_id), 0) FROM messages").fetchone()[0],
+                    conn.execute(
+                        "SELECT COALESCE(MAX(seq), 0) FROM sqlite_sequence WHERE name = 'messages'"
+                    ).fetchone()[0]
+                )
+
+                for conv, compressed in zip(batch, prepared):
+                    tags = json.dumps(conv.tags) if conv.tags else None
+                    qdrant_ids = json.dumps(conv.qdrant_ids) if conv.qdrant_ids else None
+                    metadata = json.dumps(conv.metadata) if conv.metadata else None
+
+                    history_hash = self._history_hash(
+                        (msg.role, content_hash) for msg, (_, _, content_hash) in zip(conv.messages, compressed)
+                    )
+
+                    if conv.session_id in existing:
+                        update_rows.append((
+                            conv.title, tags, qdrant_ids, metadata, now,
+                            len(conv.messages), history_hash, conv.session_id
+                        ))
+                    else:
+                        conversation_rows.append((
+                            conv.session_id,
+                            conv.source.value if isinstance(conv.source, ConversationSource) else conv.source,
+                            conv.title, tags, qdrant_ids, metadata,
+                            conv.created_at, now, len(conv.messages), history_hash
+                        ))
+
+                    for idx, (msg, (content_compressed, dict_id, content_hash)) in enumerate(zip(conv.messages, compressed)):
+                        message_id += 1
+                        message_rows.append((
+                            message_id, conv.session_id, idx, msg.role, content_compressed, dict_id,
+                            content_hash, msg.timestamp,
+                            json.dumps(msg.metadata) if msg.metadata else None, now
+                        ))
+                        fts_rows.append((message_id, msg.content))
+
+                if update_rows:
+                    conn.executemany("""
+                        UPDATE conversations
+                        SET title = ?, tags = ?, qdrant_ids = ?, metadata = ?,
+                            updated_at = ?, message_count = ?, history_hash = ?
+                        WHERE session_id = ?
+                    """, update_rows)
+                    replaced = [row[-1] for row in update_rows]
+                    self._delete_fts_rows(conn, replaced)
+                    conn.executemany("DELETE FROM messages WHERE session_id = ?", [(sid,) for sid in replaced])
+
+                conn.executemany("""
+                    INSERT INTO conversations
+                    (session_id, source, title, tags, qdrant_ids, metadata,
+                     created_at, updated_at, message_count, history_hash)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """, conversation_rows)
+                conn.executemany("""
+                    INSERT INTO messages
+                    (message_id, session_id, message_index, role, content_compressed,
+                     dict_id, content_hash, timestamp, metadata, created_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """, message_rows)
+                conn.executemany(
+                    "INSERT INTO messages_fts (rowid, content) VALUES (?, ?)",
+                    fts_rows
+                )
+
+            result["conversations"] += len(batch)
+            result["messages"] += len(message_rows)
+
+        except Exception as e:
+            logger.error(f"Error in bulk batch ({len(batch)} conversations): {e}")
+            result["failed"] += len(batch)
+
+    def _set_fts_config(self, config: Dict[str, int]):
+        """Sett FTS5-konfig (persistent i indeksen - må alltid settes tilbake)"""
+        for option, value in config.items():
+            try:
+                with self.db.writer() as conn:
+                    conn.execute(
+                        "INSERT INTO messages_fts(messages_fts, rank) VALUES(?, ?)",
+                        (option, value)
+                    )
+            except Exception as e:
+                # hashsize krever SQLite 3.41+
+                logger.warning(f"Could not set FTS {option}={value}: {e}")
+
+    def _delete_fts_rows(self, conn, session_ids: List[str]):
+        """
+        Fjern sesjonenes meldinger fra FTS-indeksen.
+
+        Contentless FTS5 kan bare slette en rad med de opprinnelige
+        verdiene ('delete'-kommandoen) - teksten dekomprimeres derfor fra
+        messages. Må kalles før meldingene slettes.
+        """
+        for i in range(0, len(session_ids), 500):
+            chunk = session_ids[i:i + 500]
+            placeholders = ','.join('?' * len(chunk))
+            rows = conn.execute(f"""
+                SELECT message_id, content_compressed, dict_id FROM messages
+                WHERE session_id IN ({placeholders})
+            """, chunk).fetchall()
+            conn.executemany(
+                "INSERT INTO messages_fts(messages_fts, rowid, content) VALUES('delete', ?, ?)",
+                [(message_id, self._decompress(blob, dict_id)) for message_id, blob, dict_id in rows]
+            )
 
     def link_qdrant_memory(
         self,
@@ -325,29 +740,26 @@ class RawConversationStore:
         Returns:
             bool: True hvis vellykket
         """
-        conn = sqlite3.connect(str(self.db_path))
-        cursor = conn.cursor()
-
         try:
-            cursor.execute("""
-                INSERT OR REPLACE INTO qdrant_mappings
-                (qdrant_id, session_id, message_index, summary, created_at)
-                VALUES (?, ?, ?, ?, ?)
-            """, (
-                qdrant_id,
-                session_id,
-                message_index,
-                summary,
-                datetime.now().isoformat()
-            ))
-
-            conn.commit()
-            return True
+            with self.db.writer() as conn:
+                cursor = conn.cursor()
+
+                cursor.execute("""
+                    INSERT OR REPLACE INTO qdrant_mappings
+                    (qdrant_id, session_id, message_index, summary, created_at)
+                    VALUES (?, ?, ?, ?, ?)
+                """, (
+                    qdrant_id,
+                    session_id,
+                    message_index,
+                    summary,
+                    datetime.now().isoformat()
+                ))
+
+                return True
         except Exception as e:
             logger.error(f"Error linking Qdrant memory: {e}")
             return False
-        finally:
-            conn.close()
 
     def get_conversation(self, session_id: str) -> Optional[RawConversation]:
         """
@@ -359,56 +771,54 @@ class RawConversationStore:
         Returns:
             RawConversation eller None
         """
-        conn = sqlite3.connect(str(self.db_path))
-        cursor = conn.cursor()
-
         try:
-            # Hent samtale-metadata
-            cursor.execute("""
-                SELECT source, title, tags, qdrant_ids, metadata, created_at
-                FROM conversations WHERE session_id = ?
-            """, (session_id,))
+            with self.db.reader() as conn:
+                cursor = conn.cursor()
 
-            row = cursor.fetchone()
-            if not row:
-                return None
+                # Hent samtale-metadata
+                cursor.execute("""
+                    SELECT source, title, tags, qdrant_ids, metadata, created_at
+                    FROM conversations WHERE session_id = ?
+                """, (session_id,))
 
-            source, title, tags_json, qdrant_ids_json, metadata_json, created_at = row
+                row = cursor.fetchone()
+                if not row:
+                    return None
 
-            # Hent meldinger
-            cursor.execute("""
-                SELECT role, content_compressed, timestamp, metadata
-                FROM messages
-                WHERE session_id = ?
-                ORDER BY message_index
-            """, (session_id,))
-
-            messages = []
-            for role, content_compressed, timestamp, msg_metadata_json in cursor.fetchall():
-                content = self._decompress(content_compressed)
-                messages.append(ConversationMessage(
-                    role=role,
-                    content=content,
-                    timestamp=timestamp,
-                    metadata=json.loads(msg_metadata_json) if msg_metadata_json else None
-                ))
+                source, title, tags_json, qdrant_ids_json, metadata_json, created_at = row
 
-            return RawConversation(
-                session_id=session_id,
-                source=ConversationSource(source) if source in [e.value for e in ConversationSource] else source,
-                messages=messages,
-                created_at=created_at,
-                title=title,
-                tags=json.loads(tags_json) if tags_json else None,
-                qdrant_ids=json.loads(qdrant_ids_json) if qdrant_ids_json else None,
-                metadata=json.loads(metadata_json) if metadata_json else None
-            )
+                # Hent meldinger
+                cursor.execute("""
+                    SELECT role, content_compressed, dict_id, timestamp, metadata
+                    FROM messages
+                    WHERE session_id = ?
+                    ORDER BY message_index
+                """, (session_id,))
+
+                messages = []
+                for role, content_compressed, dict_id, timestamp, msg_metadata_json in cursor.fetchall():
+                    content = self._decompress(content_compressed, dict_id)
+                    messages.append(ConversationMessage(
+                        role=role,
+                        content=content,
+                        timestamp=timestamp,
+                        metadata=json.loads(msg_metadata_json) if msg_metadata_json else None
+                    ))
+
+                return RawConversation(
+                    session_id=session_id,
+                    source=ConversationSource(source) if source in [e.value for e in ConversationSource] else source,
+                    messages=messages,
+                    created_at=created_at,
+                    title=title,
+                    tags=json.loads(tags_json) if tags_json else None,
+                    qdrant_ids=json.loads(qdrant_ids_json) if qdrant_ids_json else None,
+                    metadata=json.loads(metadata_json) if metadata_json else None
+                )
 
         except Exception as e:
             logger.error(f"Error getting conversation: {e}")
             return None
-        finally:
-            conn.close()
 
     def search_exact_text(
         self,
@@ -433,72 +843,73 @@ class RawConversationStore:
         Returns:
             Liste med treff: [{"session_id", "role", "content", "snippet", "rank"}]
         """
-        conn = sqlite3.connect(str(self.db_path))
-        cursor = conn.cursor()
-
         results = []
 
         try:
-            # Bygg FTS5 query
-            # Escape spesialtegn for sikkerhet
-            safe_query = query.replace('"', '""')
-
-            # Først søk i FTS for å finne matchende rader
-            sql = """
-                SELECT
-                    fts.session_id,
-                    fts.role,
-                    fts.content,
-                    c.title,
-                    c.source,
-                    c.created_at,
-                    snippet(messages_fts, 2, '>>>', '<<<', '...', 32) as snippet,
-                    bm25(messages_fts) as rank
-                FROM messages_fts fts
-                JOIN conversations c ON fts.session_id = c.session_id
-                WHERE messages_fts MATCH ?
-            """
-            params = [safe_query]
-
-            if role:
-                sql += " AND fts.role = ?"
-                params.append(role)
-
-            if source:
-                sql += " AND c.source = ?"
-                params.append(source.value if isinstance(source, ConversationSource) else source)
-
-            if date_from:
-                sql += " AND c.created_at >= ?"
-                params.append(date_from)
-
-            if date_to:
-                sql += " AND c.created_at <= ?"
-                params.append(date_to)
-
-            sql += " ORDER BY rank LIMIT ?"
-            params.append(limit)
-
-            cursor.execute(sql, params)
-
-            for row in cursor.fetchall():
-                (session_id, msg_role, content, title, src, created_at, snippet, rank) = row
-
-                results.append({
-                    "session_id": session_id,
-                    "role": msg_role,
-                    "content": content,  # Allerede ukomprimert fra FTS
-                    "conversation_title": title,
-                    "source": src,
-                    "created_at": created_at,
-                    "snippet": snippet,
-                    "rank": rank
-                })
+            with self.db.reader() as conn:
+                cursor = conn.cursor()
+
+                # Bygg FTS5 query
+                # Escape spesialtegn for sikkerhet
+                safe_query = query.replace('"', '""')
+
+                # FTS gir message_id + rank; teksten hentes fra messages
+                sql = """
+                    SELECT
+                        m.session_id,
+                        m.role,
+                        m.content_compressed,
+                        m.dict_id,
+                        c.title,
+                        c.source,
+                        c.created_at,
+                        bm25(messages_fts) as rank
+                    FROM messages_fts
+                    JOIN messages m ON m.message_id = messages_fts.rowid
+                    JOIN conversations c ON m.session_id = c.session_id
+                    WHERE messages_fts MATCH ?
+                """
+                params = [safe_query]
+
+                if role:
+                    sql += " AND m.role = ?"
+                    params.append(role)
+
+                if source:
+                    sql += " AND c.source = ?"
+                    params.append(source.value if isinstance(source, ConversationSource) else source)
+
+                if date_from:
+                    sql += " AND c.created_at >= ?"
+                    params.append(date_from)
+
+                if date_to:
+                    sql += " AND c.created_at <= ?"
+                    params.append(date_to)
+
+                sql += " ORDER BY rank LIMIT ?"
+                params.append(limit)
+
+                cursor.execute(sql, params)
+
+                terms, prefixes = _query_terms(query)
+                for row in cursor.fetchall():
+                    (session_id, msg_role, content_compressed, dict_id, title, src, created_at, rank) = row
+                    content = self._decompress(content_compressed, dict_id)
+
+                    results.append({
+                        "session_id": session_id,
+                        "role": msg_role,
+                        "content": content,
+                        "conversation_title": title,
+                        "source": src,
+                        "created_at": created_at,
+                        "snippet": _build_snippet(content, terms, prefixes),
+                        "rank": rank
+                    })
 
         except Exception as e:
             logger.error(f"FTS search error: {e}")
-        finally:
-            conn.close()
 
         return results
 
@@ -516,78 +927,86 @@ class RawConversationStore:
         Returns:
             Liste med RawConversation objekter
         """
-        conn = sqlite3.connect(str(self.db_path))
-        cursor = conn.cursor()
-
         conversations = []
 
         try:
-            # Finn session_ids fra mappings
-            placeholders = ','.join('?' * len(qdrant_ids))
-            cursor.execute(f"""
-                SELECT DISTINCT session_id
-                FROM qdrant_mappings
-                WHERE qdrant_id IN ({placeholders})
-            """, qdrant_ids)
-
-            session_ids = [row[0] for row in cursor.fetchall()]
-
-            # Hent samtaler
-            for session_id in session_ids:
-                conv = self.get_conversation(session_id)
-                if conv:
-                    conversations.append(conv)
+            with self.db.reader() as conn:
+                cursor = conn.cursor()
+
+                # Finn session_ids fra mappings
+                placeholders = ','.join('?' * len(qdrant_ids))
+                cursor.execute(f"""
+                    SELECT DISTINCT session_id
+                    FROM qdrant_mappings
+                    WHERE qdrant_id IN ({placeholders})
+                """, qdrant_ids)
+
+                session_ids = [row[0] for row in cursor.fetchall()]
+
+                # Hent samtaler
+                for session_id in session_ids:
+                    conv = self.get_conversation(session_id)
+                    if conv:
+                        conversations.append(conv)
 
         except Exception as e:
             logger.error(f"Error getting sessions by Qdrant IDs: {e}")
-        finally:
-            conn.close()
 
         return conversations
 
     def get_stats(self) -> Dict[str, Any]:
         """Hent statistikk om lagret data"""
-        conn = sqlite3.connect(str(self.db_path))
-        cursor = conn.cursor()
-
         stats = {}
 
         try:
-            # Antall samtaler
-            cursor.execute("SELECT COUNT(*) FROM conversations")
-            stats["total_conversations"] = cursor.fetchone()[0]
+            with self.db.reader() as conn:
+                cursor = conn.cursor()
 
-            # Antall meldinger
-            cursor.execute("SELECT COUNT(*) FROM messages")
-            stats["total_messages"] = cursor.fetchone()[0]
+                # Antall samtaler
+                cursor.execute("SELECT COUNT(*) FROM conversations")
+                stats["total_conversations"] = cursor.fetchone()[0]
 
-            # Etter kilde
-            cursor.execute("""
-                SELECT source, COUNT(*)
-                FROM conversations
-                GROUP BY source
-            """)
-            stats["by_source"] = dict(cursor.fetchall())
+                # Antall meldinger
+                cursor.execute("SELECT COUNT(*) FROM messages")
+                stats["total_messages"] = cursor.fetchone()[0]
 
-            # Antall Qdrant mappings
-            cursor.execute("SELECT COUNT(*) FROM qdrant_mappings")
-            stats["qdrant_mappings"] = cursor.fetchone()[0]
+                # Etter kilde
+                cursor.execute("""
+                    SELECT source, COUNT(*)
+                    FROM conversations
+                    GROUP BY source
+                """)
+                stats["by_source"] = dict(cursor.fetchall())
 
-            # Database størrelse
-            stats["db_size_mb"] = self.db_path.stat().st_size / (1024 * 1024)
+                # Antall Qdrant mappings
+                cursor.execute("SELECT COUNT(*) FROM qdrant_mappings")
+                stats["qdrant_mappings"] = cursor.fetchone()[0]
 
-            # Dato-range
-            cursor.execute("""
-                SELECT MIN(created_at), MAX(created_at)
-                FROM conversations
-            """)
-            min_date, max_date = cursor.fetchone()
-            stats["date_range"] = {"from": min_date, "to": max_date}
+                # Database størrelse
+                stats["db_size_mb"] = self.db_path.stat().st_size / (1024 * 1024)
+
+                # Dato-range
+                cursor.execute("""
+                    SELECT MIN(created_at), MAX(created_at)
+                    FROM conversations
+                """)
+                min_date, max_date = cursor.fetchone()
+                stats["date_range"] = {"from": min_date, "to": max_date}
+
+                # Komprimering per ordbok-versjon (None = uten ordbok)
+                cursor.execute("""
+                    SELECT dict_id, COUNT(*), SUM(LENGTH(content_compressed))
+                    FROM messages
+                    GROUP BY dict_id
+                """)
+                stats["zstd_dictionary"] = self.codec.active_dict_id
+                stats["compression"] = {
+                    dict_id: {"messages": count, "compressed_mb": (size or 0) / (1024 * 1024)}
+                    for dict_id, count, size in cursor.fetchall()
+                }
 
         except Exception as e:
             logger.error(f"Error getting stats: {e}")
-        finally:
-            conn.close()
 
         return stats
 
@@ -605,56 +1024,179 @@ class RawConversationStore:
         Returns:
             Liste med samtale-metadata (uten meldinger)
         """
-        conn = sqlite3.connect(str(self.db_path))
-        cursor = conn.cursor()
-
         results = []
 
         try:
-            sql = """
-                SELECT session_id, source, title, tags, created_at,
-                       updated_at, message_count
-                FROM conversations
-                WHERE 1=1
-            """
-            params = []
-
-            if source:
-                sql += " AND source = ?"
-                params.append(source.value if isinstance(source, ConversationSource) else source)
-
-            if date_from:
-                sql += " AND created_at >= ?"
-                params.append(date_from)
-
-            if date_to:
-                sql += " AND created_at <= ?"
-                params.append(date_to)
-
-            sql += " ORDER BY created_at DESC LIMIT ? OFFSET ?"
-            params.extend([limit, offset])
-
-            cursor.execute(sql, params)
-
-            for row in cursor.fetchall():
-                session_id, src, title, tags_json, created_at, updated_at, msg_count = row
-                results.append({
-                    "session_id": session_id,
-                    "source": src,
-                    "title": title,
-                    "tags": json.loads(tags_json) if tags_json else [],
-                    "created_at": created_at,
-                    "updated_at": updated_at,
-                    "message_count": msg_count
-                })
+            with self.db.reader() as conn:
+                cursor = conn.cursor()
+
+                sql = """
+                    SELECT session_id, source, title, tags, created_at,
+                           updated_at, message_count
+                    FROM conversations
+                    WHERE 1=1
+                """
+                params = []
+
+                if source:
+                    sql += " AND source = ?"
+                    params.append(source.value if isinstance(source, ConversationSource) else source)
+
+                if date_from:
+                    sql += " AND created_at >= ?"
+                    params.append(date_from)
+
+                if date_to:
+                    sql += " AND created_at <= ?"
+                    params.append(date_to)
+
+                sql += " ORDER BY created_at DESC LIMIT ? OFFSET ?"
+                params.extend([limit, offset])
+
+                cursor.execute(sql, params)
+
+                for row in cursor.fetchall():
+                    session_id, src, title, tags_json, created_at, updated_at, msg_count = row
+                    results.append({
+                        "session_id": session_id,
+                        "source": src,
+                        "title": title,
+                        "tags": json.loads(tags_json) if tags_json else [],
+                        "created_at": created_at,
+                        "updated_at": updated_at,
+                        "message_count": msg_count
+                    })
 
         except Exception as e:
             logger.error(f"Error listing conversations: {e}")
-        finally:
-            conn.close()
 
         return results
 
+    def train_dictionary(
+        self,
+        sample_size: int = DICT_SAMPLE_SIZE,
+        dict_size: int = ZstdDictionaryCodec.DEFAULT_DICT_SIZE
+    ) -> Optional[int]:
+        """
+        Tren ny zstd-ordbok på et tilfeldig utvalg lagrede meldinger.
+
+        Nye meldinger komprimeres med ordboken med en gang; eksisterende
+        rader flyttes over av recompress() / bakgrunnsjobben.
+
+        Args:
+            sample_size: Antall meldinger i treningsutvalget
+            dict_size: Maks ordbok-størrelse i bytes
+
+        Returns:
+            Ny dict_id, eller None hvis ordboken ikke ble bedre enn den aktive
+        """
+        try:
+            with self.db.reader() as conn:
+                rows = conn.execute("""
+                    SELECT content_compressed, dict_id FROM messages
+                    WHERE message_id IN (
+                        SELECT message_id FROM messages ORDER BY RANDOM() LIMIT ?
+                    )
+                """, (sample_size,)).fetchall()
+
+            samples = [self.codec.decompress(blob, dict_id) for blob, dict_id in rows]
+            return self.codec.train(samples, dict_size)
+
+        except Exception as e:
+            logger.error(f"Error training zstd dictionary: {e}")
+            return None
+
+    def recompress(
+        self,
+        batch_size: int = RECOMPRESS_BATCH_SIZE,
+        pause: float = 0.0,
+        stop_event: Optional[threading.Event] = None
+    ) -> Dict[str, Any]:
+        """
+        Re-komprimer rader som ikke bruker aktiv ordbok.
+
+        Går gjennom messages i message_id-rekkefølge med én kort writer-
+        transaksjon per batch, så ingest og søk kan kjøre innimellom.
+        Rader som er endret siden de ble lest (annen dict_id) hoppes over.
+
+        Args:
+            batch_size: Rader per transaksjon
+            pause: Sekunder å sove mellom batcher (gir plass til andre skrivere)
+            stop_event: Avbryt mellom batcher når satt
+
+        Returns:
+            Dict med rows, bytes_before, bytes_after og seconds
+        """
+        start = time.perf_counter()
+        result = {"rows": 0, "bytes_before": 0, "bytes_after": 0, "seconds": 0.0}
+        target = self.codec.active_dict_id
+        if target is None:
+            return result
+
+        last_id = 0
+        while not (stop_event and stop_event.is_set()):
+            with self.db.reader() as conn:
+                rows = conn.execute("""
+                    SELECT message_id, content_compressed, dict_id FROM messages
+                    WHERE message_id > ? AND (dict_id IS NULL OR dict_id != ?)
+                    ORDER BY message_id
+                    LIMIT ?
+                """, (last_id, target, batch_size)).fetchall()
+            if not rows:
+                break
+
+            updates = []
+            for message_id, blob, dict_id in rows:
+                compressed, new_dict_id = self.codec.compress(self.codec.decompress(blob, dict_id))
+                updates.append((compressed, new_dict_id, message_id, dict_id))
+                result["bytes_before"] += len(blob)
+                result["bytes_after"] += len(compressed)
+
+            with self.db.writer() as conn:
+                conn.executemany("""
+                    UPDATE messages SET content_compressed = ?, dict_id = ?
+                    WHERE message_id = ? AND dict_id IS ?
+                """, updates)
+
+            result["rows"] += len(rows)
+            last_id = rows[-1][0]
+            if pause:
+                time.sleep(pause)
+
+        result["seconds"] = time.perf_counter() - start
+        if result["rows"]:
+            logger.info(
+                f"Recompressed {result['rows']} messages with dictionary {target}: "
+                f"{result['bytes_before'] / 1024:.0f} KB -> {result['bytes_after'] / 1024:.0f} KB "
+                f"in {result['seconds']:.1f}s"
+            )
+        return result
+
+    def start_background_recompression(self, pause: float = 0.05) -> threading.Thread:
+        """
+        Start recompress() i en bakgrunnstråd (no-op hvis den allerede kjører).
+        """
+        if self._recompress_thread and self._recompress_thread.is_alive():
+            return self._recompress_thread
+
+        self._recompress_stop = threading.Event()
+
+        def run():
+            try:
+                self.recompress(pause=pause, stop_event=self._recompress_stop)
+            except Exception as e:
+                logger.error(f"Background recompression failed: {e}")
+
+        self._recompress_thread = threading.Thread(target=run, name="raw-store-recompress", daemon=True)
+        self._recompress_thread.start()
+        return self._recompress_thread
+
+    def stop_background_recompression(self, timeout: Optional[float] = None):
+        """Be bakgrunnsjobben stoppe etter pågående batch og vent på den"""
+        if self._recompress_thread:
+            self._recompress_stop.set()
+            self._recompress_thread.join(timeout)
+
 
 # ============================================================================
 # Hybrid Search: Qdrant + SQLite
@@ -781,6 +1323,9 @@ if __name__ == "__main__":
         print("  python raw_conversation_store.py stats")
         print("  python raw_conversation_store.py search <query>")
         print("  python raw_conversation_store.py list [limit]")
+        print("  python raw_conversation_store.py train-dict [sample_size]")
+        print("  python raw_conversation_store.py recompress")
+        print("  python raw_conversation_store.py rebuild-fts")
         sys.exit(1)
 
     cmd = sys.argv[1]
@@ -795,6 +1340,8 @@ if __name__ == "__main__":
         if stats.get('date_range'):
             print(f"   Date range: {stats['date_range']['from']} → {stats['date_range']['to']}")
         print(f"\n   By source: {stats.get('by_source', {})}")
+        for dict_id, c in stats.get('compression', {}).items():
+            print(f"   zstd dict {dict_id}: {c['messages']} messages, {c['compressed_mb']:.2f} MB")
 
     elif cmd == "search" and len(sys.argv) > 2:
         query = ' '.join(sys.argv[2:])
@@ -818,5 +1365,23 @@ if __name__ == "__main__":
         for c in convs:
             print(f"   [{c['source']}] {c.get('title', c['session_id'][:20])} - {c['message_count']} msgs ({c['created_at'][:10]})")
 
+    elif cmd == "train-dict":
+        sample_size = int(sys.argv[2]) if len(sys.argv) > 2 else DICT_SAMPLE_SIZE
+        dict_id = store.train_dictionary(sample_size=sample_size)
+        if dict_id is None:
+            print("\n📚 No new dictionary (too few samples or no improvement)")
+        else:
+            print(f"\n📚 Activated zstd dictionary {dict_id}")
+
+    elif cmd == "recompress":
+        result = store.recompress()
+        print(f"\n🗜️  Recompressed {result['rows']} messages: "
+              f"{result['bytes_before'] / 1024:.0f} KB → {result['bytes_after'] / 1024:.0f} KB "
+              f"({result['seconds']:.1f}s)")
+
+    elif cmd == "rebuild-fts":
+        count = store.rebuild_fts_index()
+        print(f"\n🔎 Re-indexed {count} messages")
+
     else:
         print(f"Unknown command: {cmd}")
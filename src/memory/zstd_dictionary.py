@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+AIKI zstd Dictionary Codec
+
+Versjonerte zstd-ordbøker for komprimering av korte meldinger.
+
+zstd uten ordbok har ingen historikk å referere til - en melding på
+200 bytes komprimeres knapt (frame-header + literals). En ordbok trent
+på lagrede meldinger gir komprimeringen den felles konteksten
+(vanlige fraser, JSON-nøkler, markdown) som korte meldinger mangler.
+
+Lagring:
+1. zstd_dictionaries: én rad per ordbok-versjon (dict_id), aldri endret
+2. messages.dict_id: hvilken versjon raden er komprimert med
+   (NULL = uten ordbok - alle rader skrevet før første trening)
+3. Ny ordbok aktiveres bare hvis den gir bedre ratio på et hold-out
+   utvalg enn den aktive
+
+Ordbøker slettes aldri: en annen prosess kan fortsatt ha en eldre
+versjon som aktiv og skrive rader med den. Én rad per versjon (maks
+~112 KB, trenes sjelden) er billig.
+
+Frames skrives uten dict-ID (4 bytes spart per rad) - dict_id-kolonnen
+er kilden. (De)kompressorer er ikke trådsikre og caches per tråd.
+
+Usage:
+    codec = ZstdDictionaryCodec(db)
+    blob, dict_id = codec.compress(data)
+    data = codec.decompress(blob, dict_id)
+    codec.train(samples)  # -> ny dict_id eller None
+
+#version: 1.0.0
+#created: 2026-10-16
+"""
+
+import logging
+import random
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import zstandard as zstd
+
+from .connection_manager import ConnectionManager
+
+logger = logging.getLogger(__name__)
+
+
+class ZstdDictionaryCodec:
+    """zstd-komprimering med versjonerte ordbøker lagret i databasen"""
+
+    DEFAULT_LEVEL = 3
+    DEFAULT_DICT_SIZE = 112 * 1024      # zstd sin anbefalte størrelse (~100x snitt-sample)
+    MIN_TRAINING_SAMPLES = 200
+    HOLDOUT_FRACTION = 0.1              # Andel av utvalget som brukes til å evaluere
+    MIN_IMPROVEMENT = 0.02              # Ny ordbok må være minst 2% bedre enn aktiv
+
+    def __init__(self, db: ConnectionManager, level: int = DEFAULT_LEVEL):
+        self.db = db
+        self.level = level
+        self._dicts: Dict[int, zstd.ZstdCompressionDict] = {}
+        self.active_dict_id: Optional[int] = None
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    # ==================== SCHEMA ====================
+
+    @staticmethod
+    def init_schema(conn):
+        """Opprett ordbok-tabell og dict_id-kolonne (idempotent)"""
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS zstd_dictionaries (
+                dict_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                dictionary BLOB NOT NULL,
+                dict_size INTEGER NOT NULL,
+                sample_count INTEGER NOT NULL,
+                ratio REAL,  -- Komprimeringsratio på hold-out utvalg
+                created_at TEXT NOT NULL
+            );
+        """)
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(messages)")}
+        if 'dict_id' not in columns:
+            # NULL = komprimert uten ordbok
+            conn.execute("ALTER TABLE messages ADD COLUMN dict_id INTEGER")
+
+    def load(self):
+        """Last alle ordbok-versjoner fra databasen; nyeste er aktiv"""
+        with self.db.reader() as conn:
+            rows = conn.execute(
+                "SELECT dict_id, dictionary FROM zstd_dictionaries ORDER BY dict_id"
+            ).fetchall()
+        with self._lock:
+            for dict_id, data in rows:
+                if dict_id not in self._dicts:
+                    self._dicts[dict_id] = zstd.ZstdCompressionDict(data)
+            self.active_dict_id = rows[-1][0] if rows else None
+
+    # ==================== (DE)KOMPRIMERING ====================
+
+    def _compressor(self, dict_id: Optional[int]) -> zstd.ZstdCompressor:
+        cache = getattr(self._local, 'compressors', None)
+        if cache is None:
+            cache = self._local.compressors = {}
+        compressor = cache.get(dict_id)
+        if compressor is None:
+            compressor = cache[dict_id] = zstd.ZstdCompressor(
+                level=self.level,
+                dict_data=self._dicts[dict_id] if dict_id is not None else None,
+                write_dict_id=False
+            )
+        return compressor
+
+    def _decompressor(self, dict_id: Optional[int]) -> zstd.ZstdDecompressor:
+        cache = getattr(self._local, 'decompressors', None)
+        if cache is None:
+            cache = self._local.decompressors = {}
+        decompressor = cache.get(dict_id)
+        if decompressor is None:
+            if dict_id is not None and dict_id not in self._dicts:
+                # Trent av en annen prosess etter at vi lastet
+                self.load()
+            decompressor = cache[dict_id] = zstd.ZstdDecompressor(
+                dict_data=self._dicts[dict_id] if dict_id is not None else None
+            )
+        return decompressor
+
+    def compress(self, data: bytes) -> Tuple[bytes, Optional[int]]:
+        """Komprimer med aktiv ordbok. Returnerer (blob, dict_id)"""
+        dict_id = self.active_dict_id
+        return self._compressor(dict_id).compress(data), dict_id
+
+    def decompress(self, blob: bytes, dict_id: Optional[int] = None) -> bytes:
+        """Dekomprimer med ordboken raden ble skrevet med"""
+        return self._decompressor(dict_id).decompress(blob)
+
+    # ==================== TRENING ====================
+
+    def train(self, samples: List[bytes], dict_size: int = DEFAULT_DICT_SIZE) -> Optional[int]:
+        """
+        Tren ny ordbok og aktiver den hvis den slår den aktive.
+
+        Args:
+            samples: Ukomprimerte meldinger (typisk tilfeldig utvalg fra databasen)
+            dict_size: Maks ordbok-størrelse i bytes
+
+        Returns:
+            Ny dict_id, eller None hvis for få samples / ingen forbedring
+        """
+        samples = [s for s in samples if s]
+        if len(samples) < self.MIN_TRAINING_SAMPLES:
+            logger.info(f"Too few samples for dictionary training: {len(samples)}")
+            return None
+
+        random.shuffle(samples)
+        split = max(1, int(len(samples) * self.HOLDOUT_FRACTION))
+        holdout, training = samples[:split], samples[split:]
+
+        try:
+            trained = zstd.train_dictionary(dict_size, training, level=self.level, threads=-1)
+        except zstd.ZstdError as e:
+            logger.warning(f"Dictionary training failed: {e}")
+            return None
+
+        candidate = self._ratio(holdout, zstd.ZstdCompressor(
+            level=self.level, dict_data=trained, write_dict_id=False
+        ))
+        current = self._ratio(holdout, self._compressor(self.active_dict_id))
+        if candidate < current * (1 + self.MIN_IMPROVEMENT):
+            logger.info(f"New dictionary not better: {candidate:.2f}x vs {current:.2f}x")
+            return None
+
+        data = trained.as_bytes()
+        with self.db.writer() as conn:
+            cursor = conn.execute("""
+                INSERT INTO zstd_dictionaries
+                (dictionary, dict_size, sample_count, ratio, created_at)
+                VALUES (?, ?, ?, ?, ?)
+            """, (data, len(data), len(training), candidate, datetime.now().isoformat()))
+            dict_id = cursor.lastrowid
+
+        with self._lock:
+            self._dicts[dict_id] = zstd.ZstdCompressionDict(data)
+            self.active_dict_id = dict_id
+
+        logger.info(f"Activated zstd dictionary {dict_id}: {current:.2f}x -> {candidate:.2f}x "
+                    f"({len(training)} samples, {len(data) // 1024} KB)")
+        return dict_id
+
+    @staticmethod
+    def _ratio(samples: List[bytes], compressor: zstd.ZstdCompressor) -> float:
+        raw = sum(len(s) for s in samples)
+        compressed = sum(len(compressor.compress(s)) for s in samples)
+        return raw / compressed if compressed else 1.0
@@ -42,10 +42,36 @@ logging.basicConfig(
 )
 logger = logging.getLogger("aiki_addon")
 
+# engines-pakken drar inn alle engines (numpy m.fl.) - addonen skal
+# fortsatt fungere standalone, med direkte sqlite-logging som før
+try:
+    from engines.event_sink import close_all_sinks
+    from engines.rollup_log import RollupLog, flush_all_rollups
+    ENGINES_AVAILABLE = True
+except ImportError as e:
+    logger.warning(f"Could not import engines, logging traffic directly to SQLite: {e}")
+    ENGINES_AVAILABLE = False
+
 # Database for persistent learning
 DB_PATH = Path.home() / "aiki" / "data" / "proxy_learning.db"
 DB_PATH.parent.mkdir(parents=True, exist_ok=True)
 
+# traffic_log partisjoneres per måned (traffic_log_pYYYYMM) av RollupLog
+TRAFFIC_LOG_SCHEMA = """
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    timestamp TEXT,
+    client_ip TEXT,
+    host TEXT,
+    path TEXT,
+    method TEXT,
+    status_code INTEGER,
+    content_type TEXT,
+    bytes_sent INTEGER,
+    duration_ms REAL,
+    blocked INTEGER DEFAULT 0,
+    block_reason TEXT
+"""
+
 
 class PinningDetector:
     """Lærer hvilke domener som bruker certificate pinning"""
@@ -104,22 +130,6 @@ class PinningDetector:
                 last_updated TEXT
             )
         """)
-        conn.execute("""
-            CREATE TABLE IF NOT EXISTS traffic_log (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                timestamp TEXT,
-                client_ip TEXT,
-                host TEXT,
-                path TEXT,
-                method TEXT,
-                status_code INTEGER,
-                content_type TEXT,
-                bytes_sent INTEGER,
-                duration_ms REAL,
-                blocked INTEGER DEFAULT 0,
-                block_reason TEXT
-            )
-        """)
         conn.commit()
         conn.close()
 
@@ -183,6 +193,22 @@ class TrafficAnalyzer:
             'domains': defaultdict(int)
         })
         self.start_time = time.time()
+        if not ENGINES_AVAILABLE:
+            self.traffic_log = None
+            self._init_plain_log()
+            return
+
+        self.traffic_log = RollupLog(
+            DB_PATH, 'traffic_log', TRAFFIC_LOG_SCHEMA,
+            time_column='timestamp',
+            dimensions=('client_ip', 'host'),
+            measures={
+                'requests': lambda r: 1,
+                'bytes_sent': lambda r: r['bytes_sent'],
+                'blocked': lambda r: r['blocked'],
+                'duration_ms': lambda r: r['duration_ms']
+            }
+        )
 
     def log_request(self, client_ip: str, host: str, path: str,
                     method: str, status: int, content_type: str,
@@ -197,7 +223,37 @@ class TrafficAnalyzer:
         if blocked:
             self.stats[client_ip]['blocked'] += 1
 
-        # Log til DB
+        if self.traffic_log is None:
+            self._log_plain(client_ip, host, path, method, status, content_type,
+                            bytes_sent, duration_ms, blocked, reason)
+            return
+
+        # Log til DB (write-behind + rollup i minnet - ingen I/O i request-pathen)
+        self.traffic_log.record({
+            'timestamp': datetime.now().isoformat(),
+            'client_ip': client_ip,
+            'host': host,
+            'path': path[:500],
+            'method': method,
+            'status_code': status,
+            'content_type': content_type,
+            'bytes_sent': bytes_sent,
+            'duration_ms': duration_ms,
+            'blocked': 1 if blocked else 0,
+            'block_reason': reason
+        })
+
+    def _init_plain_log(self):
+        """Uten engines: én upartisjonert traffic_log-tabell"""
+        conn = sqlite3.connect(str(DB_PATH))
+        conn.execute(f"CREATE TABLE IF NOT EXISTS traffic_log ({TRAFFIC_LOG_SCHEMA})")
+        conn.commit()
+        conn.close()
+
+    def _log_plain(self, client_ip: str, host: str, path: str, method: str,
+                   status: int, content_type: str, bytes_sent: int,
+                   duration_ms: float, blocked: bool, reason: str):
+        """Synkron logging uten engines"""
         try:
             conn = sqlite3.connect(str(DB_PATH))
             conn.execute("""
@@ -224,6 +280,55 @@ class TrafficAnalyzer:
             'total_blocked': sum(c['blocked'] for c in self.stats.values())
         }
 
+    def get_daily_report(self, since: str = None, client_ip: str = None) -> list[dict]:
+        """Trafikk per dag og klient (leser døgn-rollup, ikke traffic_log)"""
+        filters = {'client_ip': client_ip} if client_ip else {}
+        report = defaultdict(lambda: {'requests': 0, 'bytes': 0, 'blocked': 0, 'duration_ms': 0.0})
+        rows = self.traffic_log.query('daily', since=since, **filters) if self.traffic_log \
+            else self._plain_daily_rows(since, client_ip)
+        for row in rows:
+            entry = report[(row['bucket'], row['client_ip'])]
+            entry['requests'] += int(row['requests'])
+            entry['bytes'] += int(row['bytes_sent'])
+            entry['blocked'] += int(row['blocked'])
+            entry['duration_ms'] += row['duration_ms']
+
+        return [
+            {
+                'date': date,
+                'client_ip': ip,
+                'requests': entry['requests'],
+                'bytes': entry['bytes'],
+                'blocked': entry['blocked'],
+                'avg_duration_ms': entry['duration_ms'] / entry['requests'] if entry['requests'] else 0
+            }
+            for (date, ip), entry in sorted(report.items())
+        ]
+
+    def _plain_daily_rows(self, since: str = None, client_ip: str = None) -> list[dict]:
+        """Døgn-aggregat rett fra traffic_log (uten engines)"""
+        sql = """
+            SELECT substr(timestamp, 1, 10) AS bucket, client_ip,
+                   COUNT(*) AS requests, COALESCE(SUM(bytes_sent), 0) AS bytes_sent,
+                   COALESCE(SUM(blocked), 0) AS blocked, COALESCE(SUM(duration_ms), 0.0) AS duration_ms
+            FROM traffic_log WHERE 1=1
+        """
+        params = []
+        if since:
+            sql += " AND timestamp >= ?"
+            params.append(since)
+        if client_ip:
+            sql += " AND client_ip = ?"
+            params.append(client_ip)
+        sql += " GROUP BY bucket, client_ip"
+
+        conn = sqlite3.connect(str(DB_PATH))
+        conn.row_factory = sqlite3.Row
+        try:
+            return [dict(row) for row in conn.execute(sql, params)]
+        finally:
+            conn.close()
+
 
 class DecisionEngine:
     """AIKI beslutningsmotor for innholdsfiltrering"""
@@ -437,6 +542,12 @@ class AikiAddon:
                 self.pinning.record_failure(host)
                 logger.warning(f"TLS failure (mulig pinning): {host}")
 
+    def done(self):
+        """Called when proxy shuts down - flush ventende logg-events"""
+        if ENGINES_AVAILABLE:
+            flush_all_rollups()
+            close_all_sinks()
+
 
 # Registrer addon
 addons = [AikiAddon()]
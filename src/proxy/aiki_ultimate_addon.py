@@ -16,13 +16,15 @@ Integrerer alle engines:
 Bruk: mitmdump --mode transparent -s aiki_ultimate_addon.py
 """
 
-import gzip
+import asyncio
+import heapq
+import itertools
 import json
 import logging
+import os
 import sqlite3
 import threading
 import time
-from datetime import datetime
 from pathlib import Path
 
 from mitmproxy import ctx, http
@@ -34,8 +36,8 @@ logging.basicConfig(
 )
 logger = logging.getLogger('aiki')
 
-# Data directory
-DATA_DIR = Path("/home/jovnna/aiki/data/proxy")
+# Data directory (kan overstyres, f.eks. av benchmark-harnessen)
+DATA_DIR = Path(os.environ.get('AIKI_PROXY_DATA_DIR', "/home/jovnna/aiki/data/proxy"))
 DATA_DIR.mkdir(parents=True, exist_ok=True)
 
 # Import AIKI engines
@@ -47,6 +49,14 @@ try:
     from engines.active_intervention import ActiveInterventionEngine, create_intervention_engine
     from engines.federation import FederationEngine, create_federation_engine
     from engines.app_throttler import AppThrottler, TikTokThrottler, ThrottleLevel, create_throttler
+    from engines.domain_matcher import get_domain_matcher
+    from engines.event_sink import close_all_sinks
+    from engines.usage_ledger import checkpoint_all_ledgers
+    from engines.rollup_log import flush_all_rollups
+    from engines.analysis_pipeline import create_analysis_pipeline
+    from engines.flow_body import DecodedBody
+    from engines.html_stream import HtmlStreamInjector
+    from engines.buffer_policy import BufferPolicy
     ENGINES_AVAILABLE = True
 except ImportError as e:
     logger.warning(f"Could not import engines: {e}")
@@ -85,6 +95,174 @@ class SessionManager:
         session['app_times'][app] += 1
 
 
+class PinnedDomainStore:
+    """
+    Append-only lager for lærte pinned domener og rot-domener
+
+    - Hver endring er én JSON-linje som appendes til fila - O(1) I/O,
+      uansett hvor mange domener som er lært
+    - Senere linjer for samme nøkkel overstyrer tidligere
+    - compact() skriver én linje per levende entry (atomisk via rename)
+      når loggen har vokst over compact_ratio × levende entries
+    - I minnet: domener som set for suffix-oppslag, roots som set
+    - Hver entry har treff-teller og last_seen; entries uten treff på
+      ttl_days utløper (lat ved oppslag, og ved compaction)
+    """
+
+    def __init__(self, path: Path, ttl_days: float = 30, compact_ratio: float = 2.0,
+                 min_compact_lines: int = 256):
+        self.path = path
+        self.ttl = ttl_days * 86400
+        self.compact_ratio = compact_ratio
+        self.min_compact_lines = min_compact_lines
+
+        # (kind, navn) -> {'first': ts, 'seen': ts, 'hits': n}
+        self._entries: dict[tuple[str, str], dict] = {}
+        self.domains: set[str] = set()
+        self.roots: set[str] = set()
+        self._log_lines = 0
+        self._dirty_hits = False
+        self._lock = threading.Lock()
+
+        self.stats = {
+            'appends': 0,
+            'compactions': 0,
+            'expired': 0
+        }
+
+        self._load()
+
+    def _load(self):
+        """Replay loggen; siste linje per nøkkel vinner"""
+        if not self.path.exists():
+            return
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                for line in f:
+                    self._log_lines += 1
+                    try:
+                        record = json.loads(line)
+                        key = (record['k'], record['n'])
+                    except (ValueError, KeyError):
+                        continue  # Avkuttet linje fra krasj midt i append
+                    self._entries[key] = {
+                        'first': record.get('f', 0),
+                        'seen': record.get('s', 0),
+                        'hits': record.get('h', 0)
+                    }
+        except OSError as e:
+            logger.warning(f"Could not load pinned store: {e}")
+
+        now = time.time()
+        for key in [k for k, e in self._entries.items() if self._expired(e, now)]:
+            del self._entries[key]
+            self.stats['expired'] += 1
+        for kind, name in self._entries:
+            (self.domains if kind == 'domain' else self.roots).add(name)
+
+    def _expired(self, entry: dict, now: float) -> bool:
+        return bool(self.ttl) and now - entry['seen'] > self.ttl
+
+    def _record(self, key: tuple[str, str], entry: dict) -> str:
+        return json.dumps({'k': key[0], 'n': key[1], 'f': entry['first'],
+                           's': entry['seen'], 'h': entry['hits']}) + '\n'
+
+    def add(self, kind: str, name: str) -> bool:
+        """Legg til (eller forny) entry; returnerer True hvis den er ny"""
+        now = time.time()
+        key = (kind, name)
+        with self._lock:
+            entry = self._entries.get(key)
+            is_new = entry is None
+            if is_new:
+                entry = {'first': now, 'seen': now, 'hits': 0}
+                self._entries[key] = entry
+                (self.domains if kind == 'domain' else self.roots).add(name)
+            entry['seen'] = now
+
+            try:
+                with open(self.path, 'a', encoding='utf-8') as f:
+                    f.write(self._record(key, entry))
+                self._log_lines += 1
+                self.stats['appends'] += 1
+            except OSError as e:
+                logger.error(f"Could not append to pinned store: {e}")
+
+        self._maybe_compact()
+        return is_new
+
+    def hit(self, kind: str, name: str) -> bool:
+        """Registrer treff; False hvis entry mangler eller har utløpt"""
+        key = (kind, name)
+        entry = self._entries.get(key)
+        if entry is None:
+            return False
+
+        now = time.time()
+        if self._expired(entry, now):
+            with self._lock:
+                if self._entries.pop(key, None) is not None:
+                    (self.domains if kind == 'domain' else self.roots).discard(name)
+                    self.stats['expired'] += 1
+            return False
+
+        # Kun i minnet - persisteres ved neste compaction
+        entry['hits'] += 1
+        entry['seen'] = now
+        self._dirty_hits = True
+        return True
+
+    def match_domain(self, host: str) -> bool:
+        """Suffix-oppslag: host eller et av foreldre-domenene er lært"""
+        if not self.domains:
+            return False
+        labels = host.split('.')
+        for i in range(len(labels) - 1):
+            suffix = '.'.join(labels[i:])
+            if suffix in self.domains and self.hit('domain', suffix):
+                return True
+        return False
+
+    def match_root(self, root: str) -> bool:
+        return root in self.roots and self.hit('root', root)
+
+    def _maybe_compact(self):
+        live = len(self._entries)
+        if self._log_lines > max(self.min_compact_lines, live * self.compact_ratio):
+            self.compact()
+
+    def compact(self, force: bool = False):
+        """Skriv én linje per levende entry og bytt inn atomisk"""
+        with self._lock:
+            if not force and not self._dirty_hits and self._log_lines <= len(self._entries):
+                return
+            now = time.time()
+            for key in [k for k, e in self._entries.items() if self._expired(e, now)]:
+                del self._entries[key]
+                (self.domains if key[0] == 'domain' else self.roots).discard(key[1])
+                self.stats['expired'] += 1
+
+            lines = [self._record(key, entry) for key, entry in self._entries.items()]
+            tmp = self.path.with_suffix(self.path.suffix + '.tmp')
+            try:
+                tmp.write_text(''.join(lines), encoding='utf-8')
+                os.replace(tmp, self.path)
+            except OSError as e:
+                logger.error(f"Could not compact pinned store: {e}")
+                return
+            self._log_lines = len(lines)
+            self._dirty_hits = False
+            self.stats['compactions'] += 1
+
+    def get_stats(self) -> dict:
+        return {
+            **self.stats,
+            'domains': len(self.domains),
+            'roots': len(self.roots),
+            'log_lines': self._log_lines
+        }
+
+
 class CertPinningBypass:
     """
     SELVLÆRENDE Certificate Pinning Handler
@@ -93,11 +271,14 @@ class CertPinningBypass:
     1. Start med minimalt sett kjente pinned domener
     2. Lær automatisk fra TLS-feil
     3. Ekstraher rot-domene for bredere matching
-    4. Persist til disk - overlever restart
+    4. Persist til disk - overlever restart (append-only PinnedDomainStore)
     5. Aggressive first-fail passthrough for bedre UX
+
+    is_pinned() kalles på hver handshake og gjør kun set-oppslag:
+    én per label i host (suffix) + ett for rot-domenet.
     """
 
-    # Minimalt seed - resten læres automatisk
+    # Minimalt seed - resten læres automatisk (matches som suffix)
     SEED_DOMAINS = [
         # Banking er kritisk - må aldri MITM
         'dnb.no', 'nordea.no', 'sbanken.no', 'sparebank1.no',
@@ -106,15 +287,28 @@ class CertPinningBypass:
         'whatsapp.net', 'signal.org',
     ]
 
-    LEARNED_FILE = DATA_DIR / "learned_pinned_domains.json"
+    LEARNED_FILE = DATA_DIR / "learned_pinned_domains.jsonl"
+    # Gammelt format (hele fila skrevet om ved hver endring) - migreres ved oppstart
+    LEGACY_FILE = DATA_DIR / "learned_pinned_domains.json"
+
+    # Hvor lenge en TLS-feil gir first-fail passthrough
+    RECENT_FAILURE_WINDOW = 300  # 5 minutter
 
     def __init__(self):
-        self.learned_domains: set[str] = set()  # Fulle domener
-        self.learned_roots: set[str] = set()     # Rot-domener (f.eks. "hotmail")
+        self.store = PinnedDomainStore(self.LEARNED_FILE)
+        self.seed_domains = frozenset(self.SEED_DOMAINS)
         self.failure_counts: dict[str, int] = {}
         self.failure_timestamps: dict[str, float] = {}
-        self._load_learned()
-        logger.info(f"CertPinningBypass loaded {len(self.learned_domains)} domains, {len(self.learned_roots)} roots")
+        self._migrate_legacy()
+        logger.info(f"CertPinningBypass loaded {len(self.store.domains)} domains, {len(self.store.roots)} roots")
+
+    @property
+    def learned_domains(self) -> set[str]:
+        return self.store.domains
+
+    @property
+    def learned_roots(self) -> set[str]:
+        return self.store.roots
 
     def _extract_root(self, host: str) -> str:
         """Ekstraher rot-domene for bredere matching
@@ -133,28 +327,20 @@ class CertPinningBypass:
                     return part
         return parts[0] if parts else host
 
-    def _load_learned(self):
-        """Last lærte domener fra disk"""
-        try:
-            if self.LEARNED_FILE.exists():
-                data = json.loads(self.LEARNED_FILE.read_text())
-                self.learned_domains = set(data.get('domains', []))
-                self.learned_roots = set(data.get('roots', []))
-                logger.info(f"Loaded {len(self.learned_domains)} learned pinned domains")
-        except Exception as e:
-            logger.warning(f"Could not load learned domains: {e}")
-
-    def _save_learned(self):
-        """Lagre lærte domener til disk"""
+    def _migrate_legacy(self):
+        """Importer gammel learned_pinned_domains.json én gang"""
+        if self.LEARNED_FILE.exists() or not self.LEGACY_FILE.exists():
+            return
         try:
-            data = {
-                'domains': list(self.learned_domains),
-                'roots': list(self.learned_roots),
-                'updated': datetime.now().isoformat()
-            }
-            self.LEARNED_FILE.write_text(json.dumps(data, indent=2))
+            data = json.loads(self.LEGACY_FILE.read_text())
+            for domain in data.get('domains', []):
+                self.store.add('domain', domain)
+            for root in data.get('roots', []):
+                self.store.add('root', root)
+            self.store.compact(force=True)
+            logger.info(f"Migrated {len(data.get('domains', []))} learned pinned domains")
         except Exception as e:
-            logger.error(f"Could not save learned domains: {e}")
+            logger.warning(f"Could not migrate learned domains: {e}")
 
     # Domener vi ALLTID vil intercepte for content injection (aldri passthrough)
     FORCE_INTERCEPT = [
@@ -162,6 +348,10 @@ class CertPinningBypass:
         'tiktok.com',
     ]
 
+    def _is_seed(self, host: str) -> bool:
+        labels = host.split('.')
+        return any('.'.join(labels[i:]) in self.seed_domains for i in range(len(labels) - 1))
+
     def is_pinned(self, host: str) -> bool:
         """Sjekk om host er cert-pinned"""
         host_lower = host.lower()
@@ -170,26 +360,22 @@ class CertPinningBypass:
         if host_lower in self.FORCE_INTERCEPT:
             return False
 
-        # 1. Eksakt match i lærte domener
-        if host_lower in self.learned_domains:
+        # 1. Lærte domener (host eller foreldre-domene)
+        if self.store.match_domain(host_lower):
             return True
 
         # 2. Rot-domene match (f.eks. "hotmail" matcher m.hotmail.com, outlook.hotmail.com, etc)
-        root = self._extract_root(host_lower)
-        if root in self.learned_roots:
+        if self.store.roots and self.store.match_root(self._extract_root(host_lower)):
             return True
 
-        # 3. Seed domener (substring match)
-        for domain in self.SEED_DOMAINS:
-            if domain in host_lower:
-                return True
+        # 3. Seed domener (suffix match)
+        if self._is_seed(host_lower):
+            return True
 
         # 4. Sjekk om vi nylig har hatt feil på dette domenet (aggressiv first-fail)
-        if host_lower in self.failure_counts and self.failure_counts[host_lower] >= 1:
-            # Hvis vi har hatt minst 1 feil siste 5 min, passthrough
-            last_fail = self.failure_timestamps.get(host_lower, 0)
-            if time.time() - last_fail < 300:  # 5 minutter
-                return True
+        last_fail = self.failure_timestamps.get(host_lower)
+        if last_fail and time.time() - last_fail < self.RECENT_FAILURE_WINDOW:
+            return True
 
         return False
 
@@ -201,31 +387,247 @@ class CertPinningBypass:
         self.failure_counts[host_lower] = self.failure_counts.get(host_lower, 0) + 1
         self.failure_timestamps[host_lower] = now
 
-        # Etter 1 feil - legg til domenet (aggressiv)
-        if self.failure_counts[host_lower] >= 1:
-            if host_lower not in self.learned_domains:
-                self.learned_domains.add(host_lower)
+        # Etter 1 feil - legg til domenet (aggressiv). Allerede lærte
+        # domener gir ingen ny skriving, så feil-stormer koster ingen I/O.
+        if host_lower in self.store.domains:
+            return
 
-                # Ekstraher og lagre rot-domene for bredere matching
-                root = self._extract_root(host_lower)
-                if root and len(root) >= 4:
-                    self.learned_roots.add(root)
-                    logger.info(f"🧠 AUTO-LEARNED: {host_lower} (root: {root})")
-                else:
-                    logger.info(f"🧠 AUTO-LEARNED: {host_lower}")
+        self.store.add('domain', host_lower)
 
-                # Persist til disk
-                self._save_learned()
+        # Ekstraher og lagre rot-domene for bredere matching
+        root = self._extract_root(host_lower)
+        if root and len(root) >= 4:
+            self.store.add('root', root)
+            logger.info(f"🧠 AUTO-LEARNED: {host_lower} (root: {root})")
+        else:
+            logger.info(f"🧠 AUTO-LEARNED: {host_lower}")
+
+    def maintain(self):
+        """Periodisk: rydd gamle feil-tellere og persister treff-tellere"""
+        cutoff = time.time() - self.RECENT_FAILURE_WINDOW
+        for host, timestamp in list(self.failure_timestamps.items()):
+            if timestamp < cutoff:
+                self.failure_timestamps.pop(host, None)
+                self.failure_counts.pop(host, None)
+        self.store.compact()
 
     def get_stats(self) -> dict:
         """Returner statistikk for debugging"""
         return {
-            'learned_domains': len(self.learned_domains),
-            'learned_roots': len(self.learned_roots),
+            'learned_domains': len(self.store.domains),
+            'learned_roots': len(self.store.roots),
             'recent_failures': len([t for t in self.failure_timestamps.values()
-                                   if time.time() - t < 300])
+                                   if time.time() - t < self.RECENT_FAILURE_WINDOW]),
+            'store': self.store.get_stats()
+        }
+
+
+class DelayScheduler:
+    """
+    Ikke-blokkerende forsinkelse av enkelt-flows
+
+    time.sleep() i en mitmproxy-hook stopper event-loopen, og dermed
+    ALLE flows på ALLE enheter. I stedet parkeres hver flow på en
+    future som frigis fra en felles timer-heap. Kun én loop-timer er
+    armert om gangen (for tidligste deadline), uansett hvor mange
+    flows som venter.
+    """
+
+    def __init__(self):
+        self._heap: list[tuple[float, int, asyncio.Future]] = []
+        self._seq = itertools.count()
+        self._timer: asyncio.TimerHandle | None = None
+        self._timer_deadline = float('inf')
+        self.stats = {
+            'parked_total': 0,
+            'parked_now': 0,
+            'parked_max': 0,
+            'delay_ms_total': 0
         }
 
+    async def park(self, delay_ms: int):
+        """Parker kallende flow i delay_ms uten å blokkere andre flows"""
+        if delay_ms <= 0:
+            return
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + delay_ms / 1000
+        future = loop.create_future()
+        heapq.heappush(self._heap, (deadline, next(self._seq), future))
+
+        self.stats['parked_total'] += 1
+        self.stats['parked_now'] += 1
+        self.stats['parked_max'] = max(self.stats['parked_max'], self.stats['parked_now'])
+        self.stats['delay_ms_total'] += delay_ms
+
+        self._arm(loop)
+        try:
+            await future
+        finally:
+            self.stats['parked_now'] -= 1
+
+    def _arm(self, loop: asyncio.AbstractEventLoop):
+        """Sørg for at timeren peker på tidligste deadline i heapen"""
+        if not self._heap:
+            return
+        deadline = self._heap[0][0]
+        if deadline >= self._timer_deadline:
+            return
+        if self._timer:
+            self._timer.cancel()
+        self._timer_deadline = deadline
+        self._timer = loop.call_at(deadline, self._release, loop)
+
+    def _release(self, loop: asyncio.AbstractEventLoop):
+        """Frigi alle flows med utløpt deadline og re-armer timeren"""
+        self._timer = None
+        self._timer_deadline = float('inf')
+        now = loop.time()
+
+        while self._heap and self._heap[0][0] <= now:
+            _, _, future = heapq.heappop(self._heap)
+            # Flow kan være drept/kansellert mens den ventet
+            if not future.done():
+                future.set_result(None)
+
+        self._arm(loop)
+
+
+# CSS/JS som skjuler alle TikTok "åpne i app" elementer
+# Basert på faktiske TikTok CSS-in-JS klassenavn fra uBlock filter lists
+TIKTOK_CLEANUP_MARKUP = '''
+<style id="aiki-tiktok-cleanup">
+/* AIKI: Fjern TikTok "åpne i app" og login popup elementer */
+
+/* === MODAL/POPUP OVERLAYS (login/app prompts) === */
+#loginContainer,
+[class*="DivModalContent"],
+[class*="DivModalContainer"],
+[class*="DivModalMask"],
+[class*="DivCenterWrapper"],
+[class*="DivModalWrapper"],
+[class*="DivLoginContainer"],
+[class*="eg439om"],
+[class*="e1gjoq3k"],
+
+/* === DOWNLOAD APP BANNERS === */
+[data-e2e="download-app-bar"],
+[data-e2e="download-app-button"],
+[data-e2e="open-in-app"],
+[data-e2e="mobile-open-app"],
+[class*="DivDownloadBar"],
+[class*="DivAppDownload"],
+[class*="DivOpenInApp"],
+[class*="DivBottomBanner"],
+[class*="StyledDownloadBar"],
+[class*="StyledOpenInApp"],
+.download-bar,
+.download-app-bar,
+.app-download-bar,
+
+/* === OPEN IN APP BUTTONS === */
+[class*="open-app"],
+[class*="openApp"],
+[class*="OpenApp"],
+[class*="download-app"],
+[class*="downloadApp"],
+[class*="DownloadApp"],
+.open-in-app,
+.open-app-btn,
+.open-app-button,
+
+/* === APP PROMO OVERLAYS === */
+[class*="app-banner"],
+[class*="appBanner"],
+[class*="AppBanner"],
+[class*="bottom-banner"],
+[class*="bottomBanner"],
+[class*="DivBottomBannerContainer"],
+.app-promotion,
+.app-promo,
+
+/* === MOBILE WEB SPECIFIC === */
+[class*="webapp-promo"],
+[class*="DivOpenInAppContainer"],
+[class*="get-app"],
+[class*="getApp"],
+[class*="DivGetApp"],
+
+/* === TIKTOK LITE PROMO === */
+[class*="lite-banner"],
+[class*="LiteBanner"],
+[class*="DivLiteBanner"],
+
+/* === GENERIC CATCH-ALL === */
+div[class*="app"][class*="download"],
+div[class*="app"][class*="banner"],
+a[href*="onelink"],
+a[href*="app.link"],
+a[href*="tiktok.com/download"],
+
+/* === FULLSCREEN MODAL OVERLAYS === */
+div[class*="DivModal"][role="dialog"],
+div[class*="Modal"][aria-modal="true"],
+[class*="DivMask"],
+[class*="DivOverlay"][style*="position: fixed"]
+{
+    display: none !important;
+    visibility: hidden !important;
+    height: 0 !important;
+    max-height: 0 !important;
+    min-height: 0 !important;
+    overflow: hidden !important;
+    opacity: 0 !important;
+    pointer-events: none !important;
+    position: absolute !important;
+    top: -9999px !important;
+    left: -9999px !important;
+}
+
+/* Fjern body scroll lock fra modals */
+body {
+    overflow: auto !important;
+    padding-bottom: 0 !important;
+    position: static !important;
+}
+
+/* Fjern blur/overlay som noen ganger brukes */
+body > div[style*="filter"],
+body > div[style*="blur"] {
+    filter: none !important;
+}
+</style>
+
+<script id="aiki-tiktok-cleanup-js">
+/* AIKI: Dynamisk fjern popups som lastes etter page load */
+(function() {
+    var removePopups = function() {
+        var selectors = [
+            '#loginContainer',
+            '[class*="DivModalContainer"]',
+            '[class*="DivModalMask"]',
+            '[class*="DivDownloadBar"]',
+            '[class*="DivOpenInApp"]',
+            '[data-e2e="download-app-bar"]'
+        ];
+        selectors.forEach(function(sel) {
+            var els = document.querySelectorAll(sel);
+            els.forEach(function(el) { el.remove(); });
+        });
+        document.body.style.overflow = 'auto';
+    };
+
+    /* Run on load and observe for new elements */
+    removePopups();
+    setInterval(removePopups, 1000);
+
+    /* MutationObserver for dynamisk innhold */
+    var observer = new MutationObserver(removePopups);
+    observer.observe(document.body, {childList: true, subtree: true});
+})();
+</script>
+'''
+
 
 class AIKIUltimateAddon:
     """
@@ -235,6 +637,17 @@ class AIKIUltimateAddon:
     ADHD accountability og innholds-manipulasjon.
     """
 
+    # App-mønstre for _identify_app (rekkefølge = prioritet)
+    APP_PATTERNS = {
+        'tiktok': ['tiktok', 'bytedance', 'musical.ly'],
+        'instagram': ['instagram', 'cdninstagram', 'fbcdn'],
+        'youtube': ['youtube', 'googlevideo', 'ytimg'],
+        'snapchat': ['snapchat', 'sc-cdn'],
+        'twitter': ['twitter', 'x.com', 'twimg'],
+        'netflix': ['netflix', 'nflxvideo'],
+        'spotify': ['spotify', 'scdn'],
+    }
+
     def __init__(self):
         logger.info("=" * 60)
         logger.info("AIKI TRAFFIC INTELLIGENCE PLATFORM")
@@ -243,6 +656,7 @@ class AIKIUltimateAddon:
         # Core managers
         self.session_manager = SessionManager()
         self.pinning_bypass = CertPinningBypass()
+        self.delay_scheduler = DelayScheduler()
 
         # Statistics
         self.stats = {
@@ -270,6 +684,11 @@ class AIKIUltimateAddon:
         """Initialize all AIKI engines"""
         if not ENGINES_AVAILABLE:
             logger.warning("Engines not available - running in basic mode")
+            self.fingerprint = None
+            self.domain_matcher = None
+            self.html_injector = None
+            self.buffer_policy = None
+            self.analysis_pipeline = None
             self.classifier = None
             self.analytics = None
             self.content_intel = None
@@ -277,6 +696,16 @@ class AIKIUltimateAddon:
             self.federation = None
             return
 
+        # Delt domene-matcher - engines under registrerer sine tabeller i samme
+        self.domain_matcher = get_domain_matcher()
+        self.domain_matcher.register('addon', self.APP_PATTERNS)
+
+        # Streaming CSS-injeksjon for TikTok HTML (bufret fallback i response)
+        self.html_injector = HtmlStreamInjector(TIKTOK_CLEANUP_MARKUP, marker='aiki-tiktok-cleanup')
+
+        # Media/bulk-responser strømmes forbi response-hooken uten buffering
+        self.buffer_policy = BufferPolicy(self.domain_matcher)
+
         try:
             logger.info("Initializing TLS Fingerprint Engine...")
             self.fingerprint = TLSFingerprintEngine()  # Bruker intern DB_PATH
@@ -289,6 +718,7 @@ class AIKIUltimateAddon:
 
             logger.info("Initializing Content Intelligence...")
             self.content_intel = create_content_intelligence(str(DATA_DIR))
+            self.analysis_pipeline = create_analysis_pipeline(self.content_intel)
 
             logger.info("Initializing Active Intervention...")
             self.intervention = create_intervention_engine(str(DATA_DIR))
@@ -304,6 +734,8 @@ class AIKIUltimateAddon:
 
         except Exception as e:
             logger.error(f"Error initializing engines: {e}")
+            self.fingerprint = None
+            self.analysis_pipeline = None
             self.classifier = None
             self.analytics = None
             self.content_intel = None
@@ -319,6 +751,7 @@ class AIKIUltimateAddon:
                 # Log stats hver 60 sek
                 time.sleep(60)
                 self._log_stats()
+                self.pinning_bypass.maintain()
 
                 # Share stats til federation hver time
                 if self.federation and (time.time() % 3600) < 60:
@@ -335,24 +768,38 @@ class AIKIUltimateAddon:
                    f"Total: {self.stats['requests_total']}, "
                    f"Intercepted: {self.stats['requests_intercepted']}, "
                    f"Passthrough: {self.stats['requests_passthrough']}, "
+                   f"Parked: {self.delay_scheduler.stats['parked_now']} "
+                   f"(max {self.delay_scheduler.stats['parked_max']}), "
+                   f"{self._pipeline_stats_str()}"
+                   f"{self._buffer_stats_str()}"
                    f"Learned domains: {pinning_stats['learned_domains']}, "
                    f"Learned roots: {pinning_stats['learned_roots']}")
 
+    def _pipeline_stats_str(self) -> str:
+        """Kort status for analyse-pipelinen til stats-loggen"""
+        if not getattr(self, 'analysis_pipeline', None):
+            return ""
+        p = self.analysis_pipeline.get_stats()
+        return (f"Analysis queue: {p['depth']} (max {p['max_depth']}, "
+                f"lag {p['lag_ms_avg']:.0f}ms, "
+                f"shed {p['dropped_oldest'] + p['skipped'] + p['sampled_out']}), ")
+
+    def _buffer_stats_str(self) -> str:
+        """Kort status for buffer-policyen til stats-loggen"""
+        if not getattr(self, 'buffer_policy', None):
+            return ""
+        b = self.buffer_policy.get_stats()
+        return (f"Streamed: {b['streamed']}/{b['evaluated']} "
+                f"({b['streamed_bytes_declared'] / 1e6:.1f}MB declared), ")
+
     def _identify_app(self, host: str) -> str:
         """Identifiser app fra host"""
-        host_lower = host.lower()
-
-        app_patterns = {
-            'tiktok': ['tiktok', 'bytedance', 'musical.ly'],
-            'instagram': ['instagram', 'cdninstagram', 'fbcdn'],
-            'youtube': ['youtube', 'googlevideo', 'ytimg'],
-            'snapchat': ['snapchat', 'sc-cdn'],
-            'twitter': ['twitter', 'x.com', 'twimg'],
-            'netflix': ['netflix', 'nflxvideo'],
-            'spotify': ['spotify', 'scdn'],
-        }
+        if self.domain_matcher:
+            return self.domain_matcher.lookup(host, 'addon') or 'unknown'
 
-        for app, patterns in app_patterns.items():
+        # Basic mode: lineær scan
+        host_lower = host.lower()
+        for app, patterns in self.APP_PATTERNS.items():
             if any(p in host_lower for p in patterns):
                 return app
 
@@ -402,12 +849,33 @@ class AIKIUltimateAddon:
                 self.stats['requests_passthrough'] += 1
                 return
 
-            # TODO: Parse ClientHello for JA3/JA4
-            # Dette krever lavnivå TLS parsing
+            # JA3/JA4 fingerprint (memoisert per ClientHello-layout)
+            # Kun klassifisering/analyse - routing styres av SNI-pinning over
+            fingerprint = self._fingerprint_client_hello(data)
+            if fingerprint:
+                data.context._aiki_fingerprint = fingerprint
 
         except Exception as e:
             logger.debug(f"TLS clienthello error: {e}")
 
+    def _fingerprint_client_hello(self, data):
+        """Beregn JA3/JA4 fra rå ClientHello"""
+        if not getattr(self, 'fingerprint', None):
+            return None
+
+        raw = data.client_hello.raw_bytes()
+        client_ip = data.context.client.peername[0] if data.context.client.peername else ""
+        return self.fingerprint.process_client_hello(raw, client_ip)
+
+    def tls_established_client(self, data):
+        """TLS mot klient OK - fingerprint kunne MITM-es"""
+        try:
+            fingerprint = getattr(data.context, '_aiki_fingerprint', None)
+            if fingerprint and self.fingerprint:
+                self.fingerprint.record_success(fingerprint.client_ip, fingerprint.sni)
+        except Exception as e:
+            logger.debug(f"TLS established handler error: {e}")
+
     def tls_failed_client(self, data):
         """Called when TLS fails - might indicate pinning"""
         try:
@@ -428,6 +896,14 @@ class AIKIUltimateAddon:
             if not host:
                 host = data.context.server.address[0] if data.context.server.address else "unknown"
 
+            # Lær pinning per fingerprint også (fanger apper på tvers av domener)
+            fingerprint = getattr(data.context, '_aiki_fingerprint', None)
+            if fingerprint and self.fingerprint:
+                self.fingerprint.record_failure(
+                    fingerprint.client_ip, fingerprint.sni,
+                    str(getattr(data, 'error', '') or 'certificate')
+                )
+
             # Ikke lær IP-adresser direkte
             if host and not self._is_ip_address(host):
                 self.pinning_bypass.record_failure(host)
@@ -446,7 +922,7 @@ class AIKIUltimateAddon:
         ipv6_pattern = r'^[0-9a-fA-F:]+$'
         return bool(re.match(ipv4_pattern, host) or re.match(ipv6_pattern, host))
 
-    def request(self, flow: http.HTTPFlow):
+    async def request(self, flow: http.HTTPFlow):
         """
         Intercept HTTP request
 
@@ -454,6 +930,9 @@ class AIKIUltimateAddon:
         - Blokkere requests
         - Legge til delay
         - Modifisere headers
+
+        Async hook: forsinkelser parkerer kun denne flowen via
+        DelayScheduler, resten av proxyen fortsetter som normalt.
         """
         self.stats['requests_total'] += 1
 
@@ -493,7 +972,7 @@ class AIKIUltimateAddon:
                     return
 
                 if throttle_result['delay_ms'] > 0:
-                    time.sleep(throttle_result['delay_ms'] / 1000)
+                    await self.delay_scheduler.park(throttle_result['delay_ms'])
                     self.stats['delays_added'] += 1
                     logger.debug(f"Throttled {app}: {throttle_result['delay_ms']}ms ({throttle_result['level'].name})")
 
@@ -516,7 +995,7 @@ class AIKIUltimateAddon:
 
                 # Delay injection
                 if decision['delay_ms'] > 0:
-                    time.sleep(decision['delay_ms'] / 1000)
+                    await self.delay_scheduler.park(decision['delay_ms'])
                     self.stats['delays_added'] += 1
 
                 # Block
@@ -540,6 +1019,30 @@ class AIKIUltimateAddon:
         except Exception as e:
             logger.error(f"Request processing error: {e}")
 
+    def responseheaders(self, flow: http.HTTPFlow):
+        """
+        Response headers mottatt - body er ikke lest ennå
+
+        - TikTok HTML strømmes med CSS injisert underveis
+        - Buffer-policy strømmer media/bulk som ingen engine leser
+        Strømmede flows har ingen body i response-hooken.
+        """
+        try:
+            if not self.buffer_policy:
+                return
+            app = flow.metadata.get('aiki_app', 'unknown')
+
+            if app == 'tiktok' and self.html_injector.attach(flow.response):
+                flow.metadata['aiki_streamed'] = True
+                return
+
+            if self.buffer_policy.decide(app, flow.request.host, flow.response.headers).stream:
+                flow.response.stream = True
+                flow.metadata['aiki_streamed'] = True
+
+        except Exception as e:
+            logger.error(f"Response headers processing error: {e}")
+
     def response(self, flow: http.HTTPFlow):
         """
         Intercept HTTP response
@@ -554,18 +1057,20 @@ class AIKIUltimateAddon:
             app = flow.metadata.get('aiki_app', 'unknown')
             decision = flow.metadata.get('aiki_decision', {})
             user_id = flow.metadata.get('aiki_user', 'default')
+            # Strømmet i responseheaders: ingen body her (HTML er allerede injisert)
+            buffered = not flow.metadata.get('aiki_streamed')
 
             # === TIKTOK HTML INJECTION (fjern "åpne i app" popup) ===
-            if app == 'tiktok' and self._is_html_response(flow):
+            if buffered and app == 'tiktok' and self._is_html_response(flow):
                 self._inject_tiktok_css(flow)
 
             # === TIKTOK CONTENT INJECTION ===
-            if decision.get('inject_content') and app == 'tiktok':
+            if buffered and decision.get('inject_content') and app == 'tiktok':
                 if self._is_tiktok_feed_response(flow):
                     self._inject_tiktok_content(flow, user_id)
 
-            # === CONTENT INTELLIGENCE ===
-            if self.content_intel and self._is_json_response(flow):
+            # === CONTENT INTELLIGENCE (off-path) ===
+            if buffered and self.analysis_pipeline and app != 'unknown' and self._is_json_response(flow):
                 self._analyze_content(flow, app)
 
             # === BEHAVIORAL ANALYTICS ===
@@ -575,6 +1080,14 @@ class AIKIUltimateAddon:
         except Exception as e:
             logger.error(f"Response processing error: {e}")
 
+        finally:
+            # Endret body re-encodes og skrives til responsen én gang
+            if ENGINES_AVAILABLE:
+                try:
+                    DecodedBody.commit_flow(flow)
+                except Exception as e:
+                    logger.error(f"Response body commit error: {e}")
+
     def _is_tiktok_feed_response(self, flow: http.HTTPFlow) -> bool:
         """Sjekk om dette er TikTok feed response"""
         url = flow.request.pretty_url
@@ -605,175 +1118,29 @@ class AIKIUltimateAddon:
         - App promotion overlays
         """
         try:
-            body = flow.response.get_content()
-            if not body:
+            # Delt dekodet body - mitmproxy har allerede fjernet content-encoding
+            body = DecodedBody.for_flow(flow)
+            if not body.content:
                 return
 
-            # Decompress if gzipped
-            is_gzipped = flow.response.headers.get('content-encoding', '').lower() == 'gzip'
-            if is_gzipped:
-                try:
-                    body = gzip.decompress(body)
-                except:
-                    pass
-
-            html = body.decode('utf-8', errors='ignore')
+            html = body.text
 
             # Sjekk om det allerede er injisert
             if 'aiki-tiktok-cleanup' in html:
                 return
 
-            # CSS som skjuler alle "åpne i app" elementer
-            # Basert på faktiske TikTok CSS-in-JS klassenavn fra uBlock filter lists
-            inject_css = '''
-<style id="aiki-tiktok-cleanup">
-/* AIKI: Fjern TikTok "åpne i app" og login popup elementer */
-
-/* === MODAL/POPUP OVERLAYS (login/app prompts) === */
-#loginContainer,
-[class*="DivModalContent"],
-[class*="DivModalContainer"],
-[class*="DivModalMask"],
-[class*="DivCenterWrapper"],
-[class*="DivModalWrapper"],
-[class*="DivLoginContainer"],
-[class*="eg439om"],
-[class*="e1gjoq3k"],
-
-/* === DOWNLOAD APP BANNERS === */
-[data-e2e="download-app-bar"],
-[data-e2e="download-app-button"],
-[data-e2e="open-in-app"],
-[data-e2e="mobile-open-app"],
-[class*="DivDownloadBar"],
-[class*="DivAppDownload"],
-[class*="DivOpenInApp"],
-[class*="DivBottomBanner"],
-[class*="StyledDownloadBar"],
-[class*="StyledOpenInApp"],
-.download-bar,
-.download-app-bar,
-.app-download-bar,
-
-/* === OPEN IN APP BUTTONS === */
-[class*="open-app"],
-[class*="openApp"],
-[class*="OpenApp"],
-[class*="download-app"],
-[class*="downloadApp"],
-[class*="DownloadApp"],
-.open-in-app,
-.open-app-btn,
-.open-app-button,
-
-/* === APP PROMO OVERLAYS === */
-[class*="app-banner"],
-[class*="appBanner"],
-[class*="AppBanner"],
-[class*="bottom-banner"],
-[class*="bottomBanner"],
-[class*="DivBottomBannerContainer"],
-.app-promotion,
-.app-promo,
-
-/* === MOBILE WEB SPECIFIC === */
-[class*="webapp-promo"],
-[class*="DivOpenInAppContainer"],
-[class*="get-app"],
-[class*="getApp"],
-[class*="DivGetApp"],
-
-/* === TIKTOK LITE PROMO === */
-[class*="lite-banner"],
-[class*="LiteBanner"],
-[class*="DivLiteBanner"],
-
-/* === GENERIC CATCH-ALL === */
-div[class*="app"][class*="download"],
-div[class*="app"][class*="banner"],
-a[href*="onelink"],
-a[href*="app.link"],
-a[href*="tiktok.com/download"],
-
-/* === FULLSCREEN MODAL OVERLAYS === */
-div[class*="DivModal"][role="dialog"],
-div[class*="Modal"][aria-modal="true"],
-[class*="DivMask"],
-[class*="DivOverlay"][style*="position: fixed"]
-{
-    display: none !important;
-    visibility: hidden !important;
-    height: 0 !important;
-    max-height: 0 !important;
-    min-height: 0 !important;
-    overflow: hidden !important;
-    opacity: 0 !important;
-    pointer-events: none !important;
-    position: absolute !important;
-    top: -9999px !important;
-    left: -9999px !important;
-}
-
-/* Fjern body scroll lock fra modals */
-body {
-    overflow: auto !important;
-    padding-bottom: 0 !important;
-    position: static !important;
-}
-
-/* Fjern blur/overlay som noen ganger brukes */
-body > div[style*="filter"],
-body > div[style*="blur"] {
-    filter: none !important;
-}
-</style>
-
-<script id="aiki-tiktok-cleanup-js">
-/* AIKI: Dynamisk fjern popups som lastes etter page load */
-(function() {
-    var removePopups = function() {
-        var selectors = [
-            '#loginContainer',
-            '[class*="DivModalContainer"]',
-            '[class*="DivModalMask"]',
-            '[class*="DivDownloadBar"]',
-            '[class*="DivOpenInApp"]',
-            '[data-e2e="download-app-bar"]'
-        ];
-        selectors.forEach(function(sel) {
-            var els = document.querySelectorAll(sel);
-            els.forEach(function(el) { el.remove(); });
-        });
-        document.body.style.overflow = 'auto';
-    };
-
-    /* Run on load and observe for new elements */
-    removePopups();
-    setInterval(removePopups, 1000);
-
-    /* MutationObserver for dynamisk innhold */
-    var observer = new MutationObserver(removePopups);
-    observer.observe(document.body, {childList: true, subtree: true});
-})();
-</script>
-'''
-
             # Injiser CSS rett etter <head>
             if '<head>' in html:
-                html = html.replace('<head>', '<head>' + inject_css, 1)
+                html = html.replace('<head>', '<head>' + TIKTOK_CLEANUP_MARKUP, 1)
             elif '<HEAD>' in html:
-                html = html.replace('<HEAD>', '<HEAD>' + inject_css, 1)
+                html = html.replace('<HEAD>', '<HEAD>' + TIKTOK_CLEANUP_MARKUP, 1)
             else:
                 # Fallback: legg til før </body>
-                html = html.replace('</body>', inject_css + '</body>')
-                html = html.replace('</BODY>', inject_css + '</BODY>')
+                html = html.replace('</body>', TIKTOK_CLEANUP_MARKUP + '</body>')
+                html = html.replace('</BODY>', TIKTOK_CLEANUP_MARKUP + '</BODY>')
 
-            # Re-compress if was gzipped
-            modified_body = html.encode('utf-8')
-            if is_gzipped:
-                modified_body = gzip.compress(modified_body)
-
-            flow.response.set_content(modified_body)
+            # Re-encoding (inkl. gzip) skjer én gang i DecodedBody.commit
+            body.set_text(html)
             self.stats['content_injections'] += 1
             logger.info(f"💉 Injected TikTok app-popup CSS cleanup")
 
@@ -790,20 +1157,25 @@ body > div[style*="blur"] {
             if not self.intervention:
                 return
 
-            body = flow.response.get_content()
-            if not body:
+            body = DecodedBody.for_flow(flow)
+            if not body.content:
                 return
 
             # Process with intervention engine
+            items = []
             modified_body, stats = self.intervention.process_response(
-                body,
+                body.content,
                 app='tiktok',
                 inject_content=True,
-                age_group='kids'  # TODO: Hent fra user profile
+                age_group='kids',  # TODO: Hent fra user profile
+                items_out=items
             )
+            # Itemene er allerede dekodet - analysen parser ikke feeden på nytt
+            if items:
+                body.feed_items = items
 
             if stats['modified']:
-                flow.response.set_content(modified_body)
+                body.set_content(modified_body)
                 self.stats['content_injections'] += stats['injected']
                 logger.info(f"Injected {stats['injected']} educational videos into TikTok feed!")
 
@@ -811,30 +1183,19 @@ body > div[style*="blur"] {
             logger.error(f"TikTok injection error: {e}")
 
     def _analyze_content(self, flow: http.HTTPFlow, app: str):
-        """Analyser innhold med Content Intelligence"""
-        try:
-            body = flow.response.get_content()
-            if not body:
-                return
-
-            # Decompress if needed
-            try:
-                body_text = gzip.decompress(body).decode('utf-8')
-            except:
-                body_text = body.decode('utf-8')
-
-            # Parse JSON
-            try:
-                data = json.loads(body_text)
-            except:
-                return
-
-            # Analyze (background - don't block)
-            # TODO: Send to async queue
-            pass
+        """
+        Send innhold til Content Intelligence via analyse-pipelinen
 
+        Kun kø-append her; dekomprimering, parsing og analyse skjer i
+        pipelinens workers, så responsen som serveres får ingen ekstra
+        latency. Full kø håndteres av pipelinens backpressure-policy.
+        """
+        try:
+            body = DecodedBody.for_flow(flow)
+            if body.content:
+                self.analysis_pipeline.submit(body.content, app, body.feed_items)
         except Exception as e:
-            logger.debug(f"Content analysis error: {e}")
+            logger.debug(f"Content analysis submit error: {e}")
 
     def _record_analytics(self, flow: http.HTTPFlow, app: str):
         """Record to behavioral analytics"""
@@ -856,6 +1217,19 @@ body > div[style*="blur"] {
         self._running = False
         logger.info("AIKI addon shutting down")
         self._log_stats()
+        self.pinning_bypass.store.compact()
+
+        # Skriv ut ventende logg-events (policy per sink, default 'flush')
+        if self.analysis_pipeline:
+            self.analysis_pipeline.stop()
+
+        if ENGINES_AVAILABLE:
+            if self.fingerprint:
+                # Glidende pinning-vinduer checkpointes ellers bare periodisk
+                self.fingerprint.database.persist_windows()
+            checkpoint_all_ledgers()
+            flush_all_rollups()
+            close_all_sinks()
 
 
 # Addon instance for mitmproxy
@@ -39,6 +39,7 @@ from .content_intelligence import (
     ContentCategory,
     EngagementTactic,
     DarkPattern,
+    DarkPatternHit,
     ContentAnalysis,
     create_content_intelligence
 )
@@ -72,6 +73,15 @@ from .app_throttler import (
     TikTokThrottler,
     create_throttler
 )
+from .domain_matcher import DomainMatcher, get_domain_matcher
+from .event_sink import EventSink, get_event_sink, close_all_sinks
+from .usage_ledger import UsageLedger, checkpoint_all_ledgers
+from .analysis_pipeline import AnalysisPipeline, create_analysis_pipeline
+from .ttl_cache import TTLCache
+from .rollup_log import RollupLog, flush_all_rollups
+from .flow_body import DecodedBody
+from .html_stream import HtmlStreamInjector
+from .buffer_policy import BufferPolicy, BufferDecision
 
 __all__ = [
     # TLS Fingerprinting
@@ -103,6 +113,7 @@ __all__ = [
     'ContentCategory',
     'EngagementTactic',
     'DarkPattern',
+    'DarkPatternHit',
     'ContentAnalysis',
     'create_content_intelligence',
 
@@ -135,6 +146,40 @@ __all__ = [
     'DeviceProfile',
     'TikTokThrottler',
     'create_throttler',
+
+    # Domain Matcher
+    'DomainMatcher',
+    'get_domain_matcher',
+
+    # Event Sink
+    'EventSink',
+    'get_event_sink',
+    'close_all_sinks',
+
+    # Usage Ledger
+    'UsageLedger',
+    'checkpoint_all_ledgers',
+
+    # Analysis Pipeline
+    'AnalysisPipeline',
+    'create_analysis_pipeline',
+
+    # TTL Cache
+    'TTLCache',
+
+    # Rollup Log
+    'RollupLog',
+    'flush_all_rollups',
+
+    # Flow Body
+    'DecodedBody',
+
+    # HTML Stream
+    'HtmlStreamInjector',
+
+    # Buffer Policy
+    'BufferPolicy',
+    'BufferDecision',
 ]
 
 __version__ = '1.0.0'
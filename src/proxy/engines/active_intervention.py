@@ -22,11 +22,11 @@ TikTok-injeksjon fungerer via:
 
 import gzip
 import hashlib
-import io
 import json
 import random
 import re
 import sqlite3
+import threading
 import time
 from dataclasses import dataclass, field
 from datetime import datetime, timedelta
@@ -35,6 +35,8 @@ from pathlib import Path
 from typing import Any, Callable
 from urllib.parse import parse_qs, urlparse
 
+from .usage_ledger import UsageLedger
+
 
 class InterventionType(Enum):
     """Type intervensjon"""
@@ -131,6 +133,48 @@ class BossBattle:
     won: bool = False
 
 
+class AliasSampler:
+    """
+    Vektet trekning i O(1) med alias-metoden (Vose)
+
+    Tabellene bygges i O(n); hver trekning er ett random-kall, ett
+    oppslag og én sammenligning.
+    """
+
+    def __init__(self, items: list, weights: list[float]):
+        self.items = items
+        n = len(items)
+        self._prob = [0.0] * n
+        self._alias = [0] * n
+        if not n:
+            return
+
+        total = sum(weights)
+        scaled = [w * n / total for w in weights] if total > 0 else [1.0] * n
+        small = [i for i, p in enumerate(scaled) if p < 1.0]
+        large = [i for i, p in enumerate(scaled) if p >= 1.0]
+
+        while small and large:
+            s, l = small.pop(), large.pop()
+            self._prob[s] = scaled[s]
+            self._alias[s] = l
+            scaled[l] -= 1.0 - scaled[s]
+            (small if scaled[l] < 1.0 else large).append(l)
+
+        # Rest (avrundingsfeil) får sannsynlighet 1
+        for i in small + large:
+            self._prob[i] = 1.0
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def draw(self) -> Any:
+        """Trekk ett element (med tilbakelegging)"""
+        u = random.random() * len(self.items)
+        i = int(u)
+        return self.items[i] if u - i < self._prob[i] else self.items[self._alias[i]]
+
+
 class ContentLibrary:
     """
     Bibliotek over educational content som kan injiseres
@@ -141,11 +185,25 @@ class ContentLibrary:
     - Effektivitets-tracking
     """
 
+    # Minste trekkvekt - innhold med score 0 skal fortsatt kunne vises
+    MIN_WEIGHT = 0.05
+
+    # Forsøk per ønsket element før trekning uten duplikater gir opp
+    MAX_DRAW_ATTEMPTS = 8
+
     def __init__(self, db_path: Path):
         self.db_path = db_path
         self._init_db()
         self._load_default_content()
 
+        # Hele biblioteket i minnet; samplere per (kategori, aldersgruppe)
+        # og (None, aldersgruppe), bygges lazy og kun på nytt når dirty
+        self._content: dict[str, EducationalContent] = {}
+        self._samplers: dict[tuple[str | None, str], AliasSampler] = {}
+        self._dirty: set[tuple[str | None, str]] = set()
+        self._lock = threading.Lock()
+        self.reload()
+
     def _init_db(self):
         with sqlite3.connect(self.db_path) as conn:
             conn.executescript("""
@@ -267,43 +325,76 @@ class ContentLibrary:
                     datetime.now().isoformat()
                 ))
 
+    @staticmethod
+    def _row_to_content(row: sqlite3.Row) -> EducationalContent:
+        return EducationalContent(
+            content_id=row['content_id'],
+            title=row['title'],
+            source=row['source'],
+            url=row['url'],
+            duration=row['duration'],
+            category=row['category'],
+            age_group=row['age_group'],
+            tags=json.loads(row['tags']),
+            effectiveness_score=row['effectiveness_score']
+        )
+
+    def reload(self):
+        """Last hele biblioteket fra databasen og bygg samplere på nytt"""
+        with sqlite3.connect(self.db_path) as conn:
+            conn.row_factory = sqlite3.Row
+            rows = conn.execute("SELECT * FROM educational_content").fetchall()
+
+        with self._lock:
+            self._content = {row['content_id']: self._row_to_content(row) for row in rows}
+            self._samplers.clear()
+            self._dirty.clear()
+
+    def _get_sampler(self, category: str | None, age_group: str) -> AliasSampler:
+        key = (category, age_group)
+        with self._lock:
+            sampler = self._samplers.get(key)
+            if sampler is None or key in self._dirty:
+                pool = [
+                    c for c in self._content.values()
+                    if c.age_group == age_group and (category is None or c.category == category)
+                ]
+                sampler = AliasSampler(
+                    pool, [max(self.MIN_WEIGHT, c.effectiveness_score) for c in pool]
+                )
+                self._samplers[key] = sampler
+                self._dirty.discard(key)
+            return sampler
+
     def get_content_for_injection(self, category: str | None = None,
                                    age_group: str = "kids",
                                    count: int = 1) -> list[EducationalContent]:
-        """Hent content for injeksjon"""
-        with sqlite3.connect(self.db_path) as conn:
-            conn.row_factory = sqlite3.Row
+        """
+        Hent content for injeksjon (vektet på effectiveness_score)
 
-            if category:
-                cursor = conn.execute("""
-                    SELECT * FROM educational_content
-                    WHERE category = ? AND age_group = ?
-                    ORDER BY effectiveness_score DESC, RANDOM()
-                    LIMIT ?
-                """, (category, age_group, count))
-            else:
-                cursor = conn.execute("""
-                    SELECT * FROM educational_content
-                    WHERE age_group = ?
-                    ORDER BY effectiveness_score DESC, RANDOM()
-                    LIMIT ?
-                """, (age_group, count))
-
-            results = []
-            for row in cursor.fetchall():
-                results.append(EducationalContent(
-                    content_id=row['content_id'],
-                    title=row['title'],
-                    source=row['source'],
-                    url=row['url'],
-                    duration=row['duration'],
-                    category=row['category'],
-                    age_group=row['age_group'],
-                    tags=json.loads(row['tags']),
-                    effectiveness_score=row['effectiveness_score']
-                ))
+        Trekkes fra sampler i minnet - ingen database-rundtur. Resultatet
+        har ingen duplikater; ber man om hele poolen eller mer, returneres
+        alt sortert på effektivitet.
+        """
+        category = category or None  # '' betyr alle kategorier, som før
+        sampler = self._get_sampler(category, age_group)
+        if count >= len(sampler):
+            return sorted(sampler.items, key=lambda c: c.effectiveness_score, reverse=True)
+
+        chosen: dict[str, EducationalContent] = {}
+        for _ in range(count * self.MAX_DRAW_ATTEMPTS):
+            content = sampler.draw()
+            chosen.setdefault(content.content_id, content)
+            if len(chosen) == count:
+                break
+        else:
+            # Svært skjev vekting: fyll opp med mest effektive som ikke er valgt
+            for content in sorted(sampler.items, key=lambda c: c.effectiveness_score, reverse=True):
+                if len(chosen) == count:
+                    break
+                chosen.setdefault(content.content_id, content)
 
-            return results
+        return list(chosen.values())
 
     def record_response(self, content_id: str, user_id: str,
                        watch_duration: int, skipped: bool, liked: bool):
@@ -332,6 +423,21 @@ class ContentLibrary:
                     WHERE content_id = ?
                 """, (content_id,))
 
+        # Samme justering i minnet; kun samplerne innholdet inngår i bygges på nytt
+        if not skipped and liked:
+            self._adjust_effectiveness(content_id, 0.05)
+        elif skipped:
+            self._adjust_effectiveness(content_id, -0.02)
+
+    def _adjust_effectiveness(self, content_id: str, delta: float):
+        with self._lock:
+            content = self._content.get(content_id)
+            if content is None:
+                return
+            content.effectiveness_score = min(1.0, max(0.0, content.effectiveness_score + delta))
+            self._dirty.add((content.category, content.age_group))
+            self._dirty.add((None, content.age_group))
+
 
 class TikTokInjector:
     """
@@ -344,9 +450,13 @@ class TikTokInjector:
 
     Strategi:
     1. Intercept API response
-    2. Parse JSON
-    3. Erstatt N videoer med educational content
-    4. Re-encode og send til klient
+    2. Finn video-listen og item-grensene uten å bygge hele objekt-treet
+    3. Splice inn ferdig-serialiserte educational entries
+    4. Send til klient
+
+    Kjente layouts (itemList / aweme_list på toppnivå) skrives om uten å
+    bygge hele objekt-treet. Ukjent layout faller tilbake til full
+    json.loads/json.dumps.
     """
 
     # TikTok API patterns
@@ -357,13 +467,21 @@ class TikTokInjector:
         r'/api/post/item_list',
     ]
 
+    # Liste-nøkler på toppnivå som splices uten full parse
+    _SPLICE_LIST_KEYS = ('itemList', 'aweme_list')
+    _WS_RE = re.compile(r'[ \t\n\r]*')
+    _decoder = json.JSONDecoder()
+
     def __init__(self, content_library: ContentLibrary):
         self.content_library = content_library
         self.injection_ratio = 0.3  # 30% av videoer byttes ut
+
         self.stats = {
             'requests_intercepted': 0,
             'videos_injected': 0,
-            'injection_failures': 0
+            'injection_failures': 0,
+            'spliced': 0,
+            'full_parse_fallbacks': 0
         }
 
     def should_intercept(self, url: str) -> bool:
@@ -374,13 +492,16 @@ class TikTokInjector:
         return False
 
     def inject_into_feed(self, response_body: bytes,
-                         age_group: str = "kids") -> tuple[bytes, int]:
+                         age_group: str = "kids",
+                         items_out: list | None = None) -> tuple[bytes, int]:
         """
         Injiser educational content i TikTok feed response
 
         Args:
             response_body: Original response body (may be gzipped)
             age_group: Målgruppe for content
+            items_out: Fylles med de originale feed-itemene som ble dekodet
+                underveis (gjenbrukes av analyse-pipelinen)
 
         Returns:
             (modified_body, num_injected)
@@ -389,20 +510,33 @@ class TikTokInjector:
 
         try:
             # Decompress if gzipped
-            try:
-                body_text = gzip.decompress(response_body).decode('utf-8')
-                was_gzipped = True
-            except:
-                body_text = response_body.decode('utf-8')
-                was_gzipped = False
-
-            # Parse JSON
-            data = json.loads(body_text)
+            was_gzipped = response_body[:2] == b'\x1f\x8b'
+            body = gzip.decompress(response_body) if was_gzipped else response_body
+
+            # Rask vei: splice direkte i teksten
+            spliced = self._splice_feed(body, age_group, items_out)
+            if spliced is not None:
+                modified, injected = spliced
+                if not injected:
+                    return response_body, 0
+                self.stats['spliced'] += 1
+                self.stats['videos_injected'] += injected
+                if was_gzipped:
+                    modified = gzip.compress(modified)
+                return modified, injected
+
+            # Ukjent layout: full parse
+            self.stats['full_parse_fallbacks'] += 1
+            if items_out is not None:
+                items_out.clear()  # Splice kan ha avbrutt midt i listen
+            data = json.loads(body)
 
             # Finn video-listen
             video_list = self._find_video_list(data)
             if not video_list:
                 return response_body, 0
+            if items_out is not None:
+                items_out.extend(item for item in video_list if isinstance(item, dict))
 
             # Beregn hvor mange å injisere
             num_to_inject = max(1, int(len(video_list) * self.injection_ratio))
@@ -430,20 +564,150 @@ class TikTokInjector:
             self.stats['videos_injected'] += injected
 
             # Re-encode
-            modified_json = json.dumps(data, ensure_ascii=False)
-
+            modified = json.dumps(data, ensure_ascii=False).encode('utf-8')
             if was_gzipped:
-                buf = io.BytesIO()
-                with gzip.GzipFile(fileobj=buf, mode='wb') as f:
-                    f.write(modified_json.encode('utf-8'))
-                return buf.getvalue(), injected
-            else:
-                return modified_json.encode('utf-8'), injected
+                modified = gzip.compress(modified)
+            return modified, injected
 
         except Exception as e:
             self.stats['injection_failures'] += 1
+            if items_out is not None:
+                items_out.clear()
             return response_body, 0
 
+    def _splice_feed(self, body: bytes, age_group: str,
+                     items_out: list | None = None) -> tuple[bytes, int] | None:
+        """
+        Bytt ut items direkte i teksten uten å bygge hele objekt-treet
+
+        Item-grensene finnes med C-decoderens raw_decode, ett item om
+        gangen, så kun ett item er materialisert samtidig og resten av
+        responsen re-serialiseres aldri. Returnerer None hvis layouten
+        ikke er gjenkjent (kaller faller da tilbake til full parse).
+        """
+        text = body.decode('utf-8')
+        found = self._find_top_level_list(text)
+        if found is None:
+            return None
+
+        _, list_start = found
+        spans = self._find_item_spans(text, list_start, items_out)
+        if spans is None:
+            return None
+        if not spans:
+            return body, 0
+
+        num_to_inject = max(1, int(len(spans) * self.injection_ratio))
+        edu_content = self.content_library.get_content_for_injection(
+            age_group=age_group,
+            count=num_to_inject
+        )
+        if not edu_content:
+            return body, 0
+
+        positions = random.sample(range(len(spans)), min(num_to_inject, len(spans)))
+
+        replacements = []
+        for pos, content in zip(positions, edu_content):
+            start, end = spans[pos]
+            try:
+                # Bygges fra hvert utbyttet item (egen id, forfatter, signerte URLer)
+                entry = json.dumps(
+                    self._create_edu_video_entry(content, json.loads(text[start:end])),
+                    ensure_ascii=False
+                )
+            except Exception:
+                continue
+            replacements.append((start, end, entry))
+
+        if not replacements:
+            return body, 0
+
+        # Sett sammen: uendrede segmenter + ferdige entries
+        replacements.sort()
+        parts = []
+        cursor = 0
+        for start, end, entry in replacements:
+            parts.append(text[cursor:start])
+            parts.append(entry)
+            cursor = end
+        parts.append(text[cursor:])
+
+        return ''.join(parts).encode('utf-8'), len(replacements)
+
+    def _find_top_level_list(self, text: str) -> tuple[str, int] | None:
+        """
+        Finn itemList/aweme_list blant toppnivå-nøklene
+
+        Går gjennom toppnivå-objektet nøkkel for nøkkel; verdier foran
+        listen hoppes over med raw_decode (små felt som statusCode/cursor),
+        listen selv dekodes aldri her. Returnerer (nøkkel, posisjon etter
+        '[') eller None hvis listen ikke finnes på toppnivå.
+        """
+        if not any(f'"{key}"' in text for key in self._SPLICE_LIST_KEYS):
+            return None
+
+        skip_ws = self._WS_RE.match
+        pos = skip_ws(text, 0).end()
+        if not text.startswith('{', pos):
+            return None
+        pos = skip_ws(text, pos + 1).end()
+
+        try:
+            while text.startswith('"', pos):
+                key, pos = self._decoder.raw_decode(text, pos)
+                pos = skip_ws(text, pos).end()
+                if not text.startswith(':', pos):
+                    return None
+                pos = skip_ws(text, pos + 1).end()
+
+                if key in self._SPLICE_LIST_KEYS and text.startswith('[', pos):
+                    return key, pos + 1
+
+                _, pos = self._decoder.raw_decode(text, pos)
+                pos = skip_ws(text, pos).end()
+                if not text.startswith(',', pos):
+                    return None
+                pos = skip_ws(text, pos + 1).end()
+        except ValueError:
+            return None
+        return None
+
+    def _find_item_spans(self, text: str, pos: int,
+                         items_out: list | None = None) -> list[tuple[int, int]] | None:
+        """
+        Finn (start, end) for hvert element i listen som starter ved pos
+
+        raw_decode dekoder hvert item uansett - med items_out beholdes
+        objektene i stedet for å kastes. Returnerer None hvis listen ikke
+        består av objekter eller JSON-en er ødelagt.
+        """
+        spans = []
+        skip_ws = self._WS_RE.match
+        pos = skip_ws(text, pos).end()
+
+        if text.startswith(']', pos):
+            return spans
+
+        while True:
+            if not text.startswith('{', pos):
+                return None
+            try:
+                item, end = self._decoder.raw_decode(text, pos)
+            except ValueError:
+                return None
+            spans.append((pos, end))
+            if items_out is not None:
+                items_out.append(item)
+
+            pos = skip_ws(text, end).end()
+            if text.startswith(',', pos):
+                pos = skip_ws(text, pos + 1).end()
+            elif text.startswith(']', pos):
+                return spans
+            else:
+                return None
+
     def _find_video_list(self, data: dict) -> list | None:
         """Finn video-listen i TikTok response"""
         # Mulige stier til video-data
@@ -474,11 +738,12 @@ class TikTokInjector:
 
         Vi bruker template fra original video og bytter ut video-URL
         """
-        # Deep copy template
-        entry = json.loads(json.dumps(template))
+        # Kopier kun nivåene vi endrer - resten deles med template
+        entry = dict(template)
 
         # Oppdater video info
-        if 'video' in entry:
+        if isinstance(entry.get('video'), dict):
+            entry['video'] = dict(entry['video'])
             # Marker som educational
             entry['video']['__aiki_educational'] = True
             entry['video']['__aiki_content_id'] = content.content_id
@@ -553,10 +818,25 @@ class QuotaManager:
     4. 110% quota: Økende blokkering
     """
 
+    # Default limits (sekunder) for nye kvote-rader
+    DEFAULT_LIMITS = {
+        'tiktok': 1800,
+        'instagram': 1800,
+        'youtube_shorts': 1800,
+        'gaming': 3600
+    }
+
     def __init__(self, db_path: Path):
         self.db_path = db_path
         self._init_db()
 
+        # Kvoter i minnet - get_quota er et dict-oppslag, ikke SELECT/INSERT
+        self.ledger = UsageLedger(
+            db_path, 'user_quotas',
+            key_columns=('user_id', 'date', 'app'),
+            value_columns=('seconds_used', 'seconds_limit', 'bonus_time')
+        )
+
     def _init_db(self):
         with sqlite3.connect(self.db_path) as conn:
             conn.execute("""
@@ -576,47 +856,31 @@ class QuotaManager:
         if date is None:
             date = datetime.now().strftime('%Y-%m-%d')
 
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.execute("""
-                SELECT seconds_used, seconds_limit, bonus_time
-                FROM user_quotas
-                WHERE user_id = ? AND date = ? AND app = ?
-            """, (user_id, date, app))
-
-            row = cursor.fetchone()
-            if row:
-                used, limit, bonus = row
-            else:
-                # Default limits
-                defaults = {
-                    'tiktok': 1800,
-                    'instagram': 1800,
-                    'youtube_shorts': 1800,
-                    'gaming': 3600
-                }
-                used = 0
-                limit = defaults.get(app, 3600)
-                bonus = 0
-
-                # Opprett entry
-                conn.execute("""
-                    INSERT INTO user_quotas (user_id, date, app, seconds_used, seconds_limit, bonus_time)
-                    VALUES (?, ?, ?, 0, ?, 0)
-                """, (user_id, date, app, limit))
+        row = self._ensure_row(user_id, app, date)
+        used = row['seconds_used']
+        limit = row['seconds_limit']
+        bonus = row['bonus_time']
 
-            total_limit = limit + bonus
-            remaining = max(0, total_limit - used)
-            percentage = (used / total_limit * 100) if total_limit > 0 else 100
+        total_limit = limit + bonus
+        remaining = max(0, total_limit - used)
+        percentage = (used / total_limit * 100) if total_limit > 0 else 100
 
-            return {
-                'used': used,
-                'limit': limit,
-                'bonus': bonus,
-                'total_limit': total_limit,
-                'remaining': remaining,
-                'percentage': percentage,
-                'status': self._get_quota_status(percentage)
-            }
+        return {
+            'used': used,
+            'limit': limit,
+            'bonus': bonus,
+            'total_limit': total_limit,
+            'remaining': remaining,
+            'percentage': percentage,
+            'status': self._get_quota_status(percentage)
+        }
+
+    def _ensure_row(self, user_id: str, app: str, date: str) -> dict:
+        """Hent kvote-rad fra ledger, opprett med default limit hvis ny"""
+        return self.ledger.ensure(
+            (user_id, date, app),
+            seconds_limit=self.DEFAULT_LIMITS.get(app, 3600)
+        )
 
     def _get_quota_status(self, percentage: float) -> str:
         if percentage < 80:
@@ -633,24 +897,14 @@ class QuotaManager:
     def add_usage(self, user_id: str, app: str, seconds: int):
         """Legg til brukstid"""
         date = datetime.now().strftime('%Y-%m-%d')
-
-        with sqlite3.connect(self.db_path) as conn:
-            conn.execute("""
-                UPDATE user_quotas
-                SET seconds_used = seconds_used + ?
-                WHERE user_id = ? AND date = ? AND app = ?
-            """, (seconds, user_id, date, app))
+        self._ensure_row(user_id, app, date)
+        self.ledger.add((user_id, date, app), seconds_used=seconds)
 
     def add_bonus_time(self, user_id: str, app: str, bonus_seconds: int):
         """Legg til bonus-tid (fra boss battles etc)"""
         date = datetime.now().strftime('%Y-%m-%d')
-
-        with sqlite3.connect(self.db_path) as conn:
-            conn.execute("""
-                UPDATE user_quotas
-                SET bonus_time = bonus_time + ?
-                WHERE user_id = ? AND date = ? AND app = ?
-            """, (bonus_seconds, user_id, date, app))
+        self._ensure_row(user_id, app, date)
+        self.ledger.add((user_id, date, app), bonus_time=bonus_seconds)
 
 
 class BossBattleGenerator:
@@ -844,10 +1098,13 @@ class ActiveInterventionEngine:
         return result
 
     def process_response(self, response_body: bytes, app: str,
-                         inject_content: bool, age_group: str = "kids") -> tuple[bytes, dict]:
+                         inject_content: bool, age_group: str = "kids",
+                         items_out: list | None = None) -> tuple[bytes, dict]:
         """
         Prosesser response og injiser content hvis nødvendig
 
+        items_out fylles med feed-items dekodet underveis (se inject_into_feed).
+
         Returns: (modified_body, stats)
         """
         stats = {
@@ -860,7 +1117,7 @@ class ActiveInterventionEngine:
 
         if app == 'tiktok':
             modified_body, num_injected = self.tiktok_injector.inject_into_feed(
-                response_body, age_group
+                response_body, age_group, items_out
             )
             stats['injected'] = num_injected
             stats['modified'] = num_injected > 0
@@ -0,0 +1,220 @@
+"""
+AIKI Analysis Pipeline
+======================
+
+Bounded, off-path innholdsanalyse for proxyen.
+
+Response-hooken skal aldri vente på dyp analyse. I stedet:
+
+1. submit() legger rå body + app i en bounded kø - O(1)
+   (pluss item-listen hvis et tidligere steg allerede har dekodet den)
+2. En worker-pool dekomprimerer, parser JSON (kun hvis items mangler) og kjører
+   ContentIntelligenceEngine.analyze_feed (med rå bytes for
+   dark pattern-scan)
+3. Når køen fylles brukes eksplisitt backpressure:
+   - 'drop_oldest': nye jobber fortrenger de eldste
+   - 'skip':        nye jobber avvises når køen er full
+   - 'sample':      over high-water aksepteres en andel proporsjonal
+                    med ledig plass, full kø avviser
+4. Kødybde og lag (tid fra submit til start) måles kontinuerlig;
+   alle tellere oppdateres under køens Condition (flere workers)
+"""
+
+import gzip
+import json
+import logging
+import random
+import threading
+import time
+from collections import deque
+from typing import Any, Callable
+
+logger = logging.getLogger('aiki.analysis_pipeline')
+
+BACKPRESSURE_POLICIES = ('drop_oldest', 'skip', 'sample')
+
+
+class AnalysisPipeline:
+    """
+    Worker-pool som analyserer feeds utenfor request/response-pathen
+
+    Bruk:
+        pipeline = AnalysisPipeline(content_intel.analyze_feed)
+        pipeline.submit(body, 'tiktok')
+    """
+
+    # Mulige stier til item-listen i feed-responser
+    FEED_PATHS = [
+        ['itemList'],
+        ['aweme_list'],
+        ['items'],
+        ['data', 'itemList'],
+        ['data', 'items'],
+        ['feed_items'],
+    ]
+
+    def __init__(
+        self,
+        analyze_feed: Callable[[list[dict], str, bytes], Any],
+        workers: int = 2,
+        max_queue: int = 256,
+        policy: str = 'drop_oldest',
+        high_water: float = 0.5
+    ):
+        if policy not in BACKPRESSURE_POLICIES:
+            raise ValueError(f"Unknown backpressure policy: {policy}")
+
+        self.analyze_feed = analyze_feed
+        self.max_queue = max_queue
+        self.policy = policy
+        self.high_water = high_water
+
+        self._queue: deque[tuple[float, bytes, str, list[dict] | None]] = deque()
+        self._cond = threading.Condition()
+        self._running = True
+
+        self.stats = {
+            'submitted': 0,
+            'processed': 0,
+            'items_analyzed': 0,
+            'dropped_oldest': 0,
+            'skipped': 0,
+            'sampled_out': 0,
+            'not_feed': 0,
+            'errors': 0,
+            'max_depth': 0,
+            'lag_ms_avg': 0.0,
+            'lag_ms_max': 0.0
+        }
+
+        self._workers = [
+            threading.Thread(target=self._worker_loop, name=f"aiki-analysis-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def submit(self, body: bytes, app: str, items: list[dict] | None = None) -> bool:
+        """
+        Legg respons-body i analysekøen (kalles fra response-hooken)
+
+        items: feed-items som allerede er dekodet (f.eks. av feed-
+        injeksjonen) - workeren parser da ikke JSON-en på nytt.
+
+        Returnerer False hvis jobben ble avvist av backpressure.
+        """
+        if not self._running or not body:
+            return False
+
+        with self._cond:
+            depth = len(self._queue)
+
+            if depth >= self.max_queue:
+                if self.policy == 'drop_oldest':
+                    self._queue.popleft()
+                    self.stats['dropped_oldest'] += 1
+                else:
+                    self.stats['skipped'] += 1
+                    return False
+
+            elif self.policy == 'sample' and depth >= self.max_queue * self.high_water:
+                # Andel som slippes inn synker lineært mot 0 ved full kø
+                free_ratio = (self.max_queue - depth) / (self.max_queue * (1 - self.high_water))
+                if random.random() > free_ratio:
+                    self.stats['sampled_out'] += 1
+                    return False
+
+            self._queue.append((time.monotonic(), body, app, items))
+            self.stats['submitted'] += 1
+            self.stats['max_depth'] = max(self.stats['max_depth'], len(self._queue))
+            self._cond.notify()
+
+        return True
+
+    def _worker_loop(self):
+        while True:
+            with self._cond:
+                while self._running and not self._queue:
+                    self._cond.wait()
+                if not self._queue:
+                    return
+                enqueued_at, body, app, items = self._queue.popleft()
+                self._record_lag((time.monotonic() - enqueued_at) * 1000)
+
+            outcome = 'processed'
+            try:
+                body = self._decompress(body)
+                if items is None:
+                    items = self._extract_items(body)
+                if items is None:
+                    outcome = 'not_feed'
+                else:
+                    self.analyze_feed(items, app, body)
+            except Exception as e:
+                outcome = 'errors'
+                logger.debug(f"Content analysis error ({app}): {e}")
+
+            with self._cond:
+                self.stats['processed'] += 1
+                if outcome != 'processed':
+                    self.stats[outcome] += 1
+                elif items:
+                    self.stats['items_analyzed'] += len(items)
+
+    def _record_lag(self, lag_ms: float):
+        # EWMA - ingen historikk å holde på (kalles med self._cond holdt)
+        self.stats['lag_ms_avg'] = self.stats['lag_ms_avg'] * 0.9 + lag_ms * 0.1
+        self.stats['lag_ms_max'] = max(self.stats['lag_ms_max'], lag_ms)
+
+    @staticmethod
+    def _decompress(body: bytes) -> bytes:
+        if body[:2] == b'\x1f\x8b':
+            return gzip.decompress(body)
+        return body
+
+    def _extract_items(self, body: bytes) -> list[dict] | None:
+        """Parse dekomprimert body og finn item-listen (kjører i worker)"""
+        try:
+            data = json.loads(body)
+        except ValueError:
+            return None
+
+        if isinstance(data, list):
+            return [item for item in data if isinstance(item, dict)] or None
+
+        for path in self.FEED_PATHS:
+            current = data
+            try:
+                for key in path:
+                    current = current[key]
+            except (KeyError, TypeError):
+                continue
+            if isinstance(current, list):
+                return [item for item in current if isinstance(item, dict)] or None
+
+        return None
+
+    def stop(self, drain: bool = False, timeout: float = 5.0):
+        """Stopp workers; drain=False kaster ventende jobber"""
+        with self._cond:
+            self._running = False
+            if not drain:
+                self.stats['skipped'] += len(self._queue)
+                self._queue.clear()
+            self._cond.notify_all()
+        for worker in self._workers:
+            worker.join(timeout)
+
+    def get_stats(self) -> dict:
+        """Hent statistikk inkl. nåværende kødybde"""
+        return {
+            **self.stats,
+            'depth': len(self._queue),
+            'policy': self.policy,
+            'workers': len(self._workers)
+        }
+
+
+def create_analysis_pipeline(content_intel, **kwargs) -> AnalysisPipeline:
+    """Opprett pipeline som kjører ContentIntelligenceEngine.analyze_feed"""
+    return AnalysisPipeline(content_intel.analyze_feed, **kwargs)
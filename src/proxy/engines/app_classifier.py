@@ -32,6 +32,9 @@ from typing import Any
 
 import numpy as np
 
+from .domain_matcher import get_domain_matcher
+from .ttl_cache import TTLCache
+
 
 class AppCategory(Enum):
     """Detaljert app-kategorisering"""
@@ -332,7 +335,7 @@ class SignatureDatabase:
     def __init__(self, db_path: Path):
         self.db_path = db_path
         self._init_db()
-        self._domain_cache: dict[str, str] = {}
+        self.domain_matcher = get_domain_matcher()
         self._build_domain_cache()
 
     def _init_db(self):
@@ -371,23 +374,14 @@ class SignatureDatabase:
             """)
 
     def _build_domain_cache(self):
-        """Bygg cache for rask domene-oppslag"""
-        for app_name, sig in self.KNOWN_SIGNATURES.items():
-            for domain in sig['domains']:
-                self._domain_cache[domain] = app_name
+        """Registrer signatur-domener i delt kompilert matcher"""
+        self.domain_matcher.register('signatures', {
+            app_name: sig['domains'] for app_name, sig in self.KNOWN_SIGNATURES.items()
+        })
 
     def lookup_domain(self, sni: str) -> str | None:
-        """Finn app basert på SNI"""
-        # Direkt match
-        if sni in self._domain_cache:
-            return self._domain_cache[sni]
-
-        # Substring match
-        for domain, app_name in self._domain_cache.items():
-            if domain in sni or sni.endswith('.' + domain):
-                return app_name
-
-        return None
+        """Finn app basert på SNI (suffix-trie + LRU, ikke lineær scan)"""
+        return self.domain_matcher.lookup(sni, 'signatures')
 
     def get_signature(self, app_name: str) -> dict | None:
         """Hent signatur for app"""
@@ -461,15 +455,86 @@ class TrafficPatternAnalyzer:
         return 2 < avg_interval < 15
 
 
+class CompiledForest:
+    """
+    Ren NumPy-evaluator for en trent RandomForest + StandardScaler
+
+    Alle trær flates ut til felles node-arrays. Blader peker på seg selv,
+    så traversering er branchless: depth steg med fancy indexing over
+    (samples × trees), uavhengig av sklearn sin per-kall overhead.
+    """
+
+    def __init__(self, model, scaler):
+        lefts, rights, features, thresholds, values, roots = [], [], [], [], [], []
+        offset = 0
+        depth = 0
+        n_classes = len(model.classes_)
+
+        for estimator in model.estimators_:
+            tree = estimator.tree_
+            n = tree.node_count
+            node_ids = np.arange(n)
+            is_leaf = tree.children_left == -1
+
+            lefts.append(np.where(is_leaf, node_ids, tree.children_left) + offset)
+            rights.append(np.where(is_leaf, node_ids, tree.children_right) + offset)
+            features.append(np.where(is_leaf, 0, tree.feature))
+            thresholds.append(np.where(is_leaf, np.inf, tree.threshold))
+
+            # Per-tre sannsynligheter (samme som sklearn sin predict_proba)
+            value = tree.value[:, 0, :].astype(np.float64)
+            value /= np.maximum(value.sum(axis=1, keepdims=True), 1e-12)
+            # Trær kan ha sett færre klasser enn skogen
+            if value.shape[1] != n_classes:
+                full = np.zeros((n, n_classes))
+                full[:, np.searchsorted(model.classes_, estimator.classes_)] = value
+                value = full
+            values.append(value)
+
+            roots.append(offset)
+            offset += n
+            depth = max(depth, tree.max_depth)
+
+        self.left = np.concatenate(lefts).astype(np.intp)
+        self.right = np.concatenate(rights).astype(np.intp)
+        self.feature = np.concatenate(features).astype(np.intp)
+        self.threshold = np.concatenate(thresholds)
+        self.value = np.concatenate(values)
+        self.roots = np.array(roots, dtype=np.intp)
+        self.depth = depth
+        self.n_trees = len(roots)
+
+        self.mean = np.asarray(scaler.mean_, dtype=np.float64)
+        self.scale = np.asarray(scaler.scale_, dtype=np.float64)
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        """(n_samples, n_features) rå features -> (n_samples, n_classes)"""
+        X = (np.asarray(X, dtype=np.float64) - self.mean) / self.scale
+        # sklearn sammenligner i float32 - gjør det samme for identiske splits
+        X = X.astype(np.float32).astype(np.float64)
+        rows = np.arange(X.shape[0])[:, None]
+        node = np.broadcast_to(self.roots, (X.shape[0], self.n_trees)).copy()
+
+        for _ in range(self.depth):
+            go_left = X[rows, self.feature[node]] <= self.threshold[node]
+            node = np.where(go_left, self.left[node], self.right[node])
+
+        return self.value[node].mean(axis=1)
+
+
 class MLClassifier:
     """Maskinlæringsbasert klassifiserer"""
 
-    def __init__(self, model_path: Path):
+    def __init__(self, model_path: Path, use_compiled: bool = True):
         self.model_path = model_path
         self.model = None
         self.label_encoder = None
         self.scaler = None
+        self.use_compiled = use_compiled
+        self._labels: list[str] = []
+        self._compiled: CompiledForest | None = None
         self._load_or_init_model()
+        self._prepare_inference()
 
     def _load_or_init_model(self):
         """Last eksisterende modell eller initialiser ny"""
@@ -535,27 +600,60 @@ class MLClassifier:
         self.label_encoder = dict(zip(le.classes_, range(len(le.classes_))))
         self.scaler = scaler
         self.save_model()
+        self._prepare_inference()
+
+    def _prepare_inference(self):
+        """Bygg indeks -> label og (valgfritt) kompilert evaluator"""
+        self._labels = [None] * len(self.label_encoder or {})
+        for name, idx in (self.label_encoder or {}).items():
+            self._labels[idx] = name
+
+        self._compiled = self.export_compiled() if self.use_compiled else None
+
+    def export_compiled(self) -> CompiledForest | None:
+        """Eksporter trent modell til NumPy-evaluator (None hvis ikke mulig)"""
+        if self.model is None or self.scaler is None:
+            return None
+        try:
+            return CompiledForest(self.model, self.scaler)
+        except Exception:
+            # Ukjent modelltype - bruk sklearn
+            return None
 
     def predict(self, feature: FeatureVector) -> tuple[str, float]:
         """Prediker app-kategori"""
-        if self.model is None or self.scaler is None:
-            return "unknown", 0.0
+        return self.predict_batch(feature.to_numpy().reshape(1, -1))[0]
+
+    def predict_batch(self, X: np.ndarray) -> list[tuple[str, float]]:
+        """
+        Prediker for mange samples i ett kall
 
-        X = feature.to_numpy().reshape(1, -1)
-        X_scaled = self.scaler.transform(X)
+        Args:
+            X: (n_samples, n_features) matrise av FeatureVector.to_numpy()
 
-        proba = self.model.predict_proba(X_scaled)[0]
-        pred_idx = np.argmax(proba)
-        confidence = proba[pred_idx]
+        Returns: [(label, confidence), ...] i samme rekkefølge
+        """
+        X = np.atleast_2d(X)
+        if self.model is None or self.scaler is None:
+            return [("unknown", 0.0)] * len(X)
+
+        if self._compiled is not None:
+            proba = self._compiled.predict_proba(X)
+        else:
+            proba = self.model.predict_proba(self.scaler.transform(X))
 
-        # Reverse label encoding
-        label = None
-        for name, idx in self.label_encoder.items():
-            if idx == pred_idx:
-                label = name
-                break
+        pred_idx = proba.argmax(axis=1)
+        confidence = proba[np.arange(len(X)), pred_idx]
+        # model.classes_ er encodede label-indekser
+        classes = getattr(self.model, 'classes_', None)
+        if classes is not None:
+            pred_idx = np.asarray(classes)[pred_idx]
 
-        return label or "unknown", float(confidence)
+        labels = self._labels
+        return [
+            ((labels[i] if 0 <= i < len(labels) else None) or "unknown", float(c))
+            for i, c in zip(pred_idx.tolist(), confidence.tolist())
+        ]
 
 
 class ClusteringEngine:
@@ -616,8 +714,8 @@ class AppClassifierEngine:
         self.pattern_analyzer = TrafficPatternAnalyzer()
 
         # Cache for nylige klassifiseringer
-        self._classification_cache: dict[str, AppClassification] = {}
         self._cache_ttl = 300  # 5 minutter
+        self._classification_cache = TTLCache(maxsize=20_000, ttl=self._cache_ttl)
 
         # Statistikk
         self.stats = {
@@ -644,14 +742,15 @@ class AppClassifierEngine:
 
         # 1. Sjekk cache
         cache_key = f"{sample.sni}:{sample.ja3_hash}"
-        if cache_key in self._classification_cache:
+        cached = self._classification_cache.get(cache_key)
+        if cached is not None:
             self.stats['cache_hits'] += 1
-            return self._classification_cache[cache_key]
+            return cached
 
         classification = self._do_classify(sample)
 
         # Cache resultatet
-        self._classification_cache[cache_key] = classification
+        self._classification_cache.set(cache_key, classification)
 
         # Legg til i clustering hvis ukjent
         if classification.app_category == AppCategory.UNKNOWN:
@@ -813,6 +912,7 @@ class AppClassifierEngine:
         return {
             **self.stats,
             'cache_size': len(self._classification_cache),
+            'cache': self._classification_cache.get_stats(),
             'pending_clusters': len(self.clustering.samples)
         }
 
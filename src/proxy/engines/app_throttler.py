@@ -34,6 +34,10 @@ from enum import Enum, auto
 from pathlib import Path
 from typing import Optional
 
+from .domain_matcher import get_domain_matcher
+from .rollup_log import RollupLog
+from .usage_ledger import UsageLedger
+
 logger = logging.getLogger('aiki.throttler')
 
 
@@ -220,6 +224,17 @@ DEFAULT_APP_CONFIGS = {
     ),
 }
 
+# throttle_events partisjoneres per måned (throttle_events_pYYYYMM) av RollupLog
+THROTTLE_EVENTS_SCHEMA = '''
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    timestamp TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    app_name TEXT NOT NULL,
+    level TEXT NOT NULL,
+    reason TEXT NOT NULL,
+    delay_ms INTEGER DEFAULT 0
+'''
+
 
 class AppThrottler:
     """
@@ -254,6 +269,27 @@ class AppThrottler:
         self.db_path = self.data_dir / "throttle_data.db"
         self._init_database()
 
+        # Dagens forbruk i minnet - throttle-beslutninger er dict-oppslag
+        self.usage_ledger = UsageLedger(
+            self.db_path, 'app_usage',
+            key_columns=('user_id', 'app_name', 'date'),
+            value_columns=('minutes_used',)
+        )
+
+        # Throttle events: månedspartisjoner + time/døgn-rollups
+        self.throttle_log = RollupLog(
+            self.db_path, 'throttle_events', THROTTLE_EVENTS_SCHEMA,
+            time_column='timestamp',
+            dimensions=('user_id', 'app_name', 'level', 'reason'),
+            measures={
+                'events': lambda r: 1,
+                'delay_ms': lambda r: r['delay_ms']
+            }
+        )
+
+        # Delt kompilert domene-matcher
+        self.domain_matcher = get_domain_matcher()
+
         # Load configs
         self._load_default_configs()
         self._load_saved_configs()
@@ -342,19 +378,6 @@ class AppThrottler:
             )
         ''')
 
-        # Throttle events
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS throttle_events (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                timestamp TEXT NOT NULL,
-                user_id TEXT NOT NULL,
-                app_name TEXT NOT NULL,
-                level TEXT NOT NULL,
-                reason TEXT NOT NULL,
-                delay_ms INTEGER DEFAULT 0
-            )
-        ''')
-
         # User preferences
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS user_preferences (
@@ -372,6 +395,13 @@ class AppThrottler:
         for app_key, config in DEFAULT_APP_CONFIGS.items():
             self.configs[app_key] = config
             self.stats[app_key] = ThrottleStats(app=app_key)
+        self._register_domains()
+
+    def _register_domains(self):
+        """Registrer app-domener i delt matcher (rebuildes atomisk)"""
+        self.domain_matcher.register('throttler', {
+            app_key: config.domains for app_key, config in self.configs.items()
+        })
 
     def _load_saved_configs(self):
         """Last lagrede konfigurasjoner fra database"""
@@ -394,14 +424,7 @@ class AppThrottler:
 
     def identify_app(self, host: str) -> Optional[str]:
         """Identifiser app fra hostname"""
-        host_lower = host.lower()
-
-        for app_key, config in self.configs.items():
-            for domain in config.domains:
-                if domain in host_lower:
-                    return app_key
-
-        return None
+        return self.domain_matcher.lookup(host, 'throttler')
 
     def get_config(self, app: str, user_id: str = 'default') -> Optional[ThrottleConfig]:
         """Hent config for app, med user overrides"""
@@ -467,23 +490,10 @@ class AppThrottler:
         return ThrottleLevel.OFF, ThrottleReason.MANUAL
 
     def _get_today_usage(self, app: str, user_id: str) -> float:
-        """Hent dagens bruk i minutter"""
-        try:
-            conn = sqlite3.connect(str(self.db_path))
-            cursor = conn.cursor()
-
-            today = datetime.now().strftime('%Y-%m-%d')
-            cursor.execute(
-                'SELECT minutes_used FROM app_usage WHERE user_id = ? AND app_name = ? AND date = ?',
-                (user_id, app, today)
-            )
-            row = cursor.fetchone()
-            conn.close()
-
-            return row[0] if row else 0.0
-        except Exception as e:
-            logger.error(f"Error getting usage: {e}")
-            return 0.0
+        """Hent dagens bruk i minutter (fra usage ledger, ingen I/O)"""
+        today = datetime.now().strftime('%Y-%m-%d')
+        row = self.usage_ledger.get((user_id, app, today))
+        return row['minutes_used'] if row else 0.0
 
     def process_request(
         self,
@@ -583,23 +593,9 @@ class AppThrottler:
             session['last_seen'] = now
 
     def _record_usage(self, user_id: str, app: str, minutes: float):
-        """Lagre brukstid til database"""
-        try:
-            conn = sqlite3.connect(str(self.db_path))
-            cursor = conn.cursor()
-
-            today = datetime.now().strftime('%Y-%m-%d')
-            cursor.execute('''
-                INSERT INTO app_usage (user_id, app_name, date, minutes_used)
-                VALUES (?, ?, ?, ?)
-                ON CONFLICT(user_id, app_name, date)
-                DO UPDATE SET minutes_used = minutes_used + ?
-            ''', (user_id, app, today, minutes, minutes))
-
-            conn.commit()
-            conn.close()
-        except Exception as e:
-            logger.error(f"Error recording usage: {e}")
+        """Lagre brukstid (usage ledger, checkpointes periodisk til database)"""
+        today = datetime.now().strftime('%Y-%m-%d')
+        self.usage_ledger.add((user_id, app, today), minutes_used=minutes)
 
     def _log_throttle_event(
         self,
@@ -609,27 +605,15 @@ class AppThrottler:
         reason: ThrottleReason,
         delay_ms: int
     ):
-        """Logg throttle-event til database"""
-        try:
-            conn = sqlite3.connect(str(self.db_path))
-            cursor = conn.cursor()
-
-            cursor.execute('''
-                INSERT INTO throttle_events (timestamp, user_id, app_name, level, reason, delay_ms)
-                VALUES (?, ?, ?, ?, ?, ?)
-            ''', (
-                datetime.now().isoformat(),
-                user_id,
-                app,
-                level.name,
-                reason.name,
-                delay_ms
-            ))
-
-            conn.commit()
-            conn.close()
-        except Exception as e:
-            logger.error(f"Error logging event: {e}")
+        """Logg throttle-event til database (write-behind + rollup)"""
+        self.throttle_log.record({
+            'timestamp': datetime.now().isoformat(),
+            'user_id': user_id,
+            'app_name': app,
+            'level': level.name,
+            'reason': reason.name,
+            'delay_ms': delay_ms
+        })
 
     # === ADMIN METHODS ===
 
@@ -694,16 +678,25 @@ class AppThrottler:
 
     def get_usage_report(self, user_id: str = 'default', days: int = 7) -> list[dict]:
         """Hent bruksrapport for bruker"""
+        since = (datetime.now() - timedelta(days=days)).strftime('%Y-%m-%d')
         try:
+            self.usage_ledger.checkpoint()
+
+            # Throttle-events per (dato, app) fra døgn-rollup
+            throttled: dict[tuple[str, str], int] = {}
+            for row in self.throttle_log.query('daily', since=since, user_id=user_id):
+                key = (row['bucket'], row['app_name'])
+                throttled[key] = throttled.get(key, 0) + int(row['events'])
+
             conn = sqlite3.connect(str(self.db_path))
             cursor = conn.cursor()
 
             cursor.execute('''
-                SELECT date, app_name, minutes_used, requests_throttled, sessions_abandoned
+                SELECT date, app_name, minutes_used, sessions_abandoned
                 FROM app_usage
-                WHERE user_id = ? AND date >= date('now', ?)
+                WHERE user_id = ? AND date >= ?
                 ORDER BY date DESC, minutes_used DESC
-            ''', (user_id, f'-{days} days'))
+            ''', (user_id, since))
 
             rows = cursor.fetchall()
             conn.close()
@@ -713,8 +706,8 @@ class AppThrottler:
                     'date': row[0],
                     'app': row[1],
                     'minutes': row[2],
-                    'throttled': row[3],
-                    'abandoned': row[4]
+                    'throttled': throttled.get((row[0], row[1]), 0),
+                    'abandoned': row[3]
                 }
                 for row in rows
             ]
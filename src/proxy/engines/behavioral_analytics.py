@@ -20,7 +20,6 @@ Bruker:
 import json
 import math
 import sqlite3
-import statistics
 import time
 from collections import defaultdict
 from dataclasses import dataclass, field
@@ -31,6 +30,8 @@ from typing import Any, Callable
 
 import numpy as np
 
+from .rollup_log import RollupLog
+
 
 class BehaviorState(Enum):
     """Brukerens nåværende atferdstilstand"""
@@ -137,35 +138,138 @@ class BehaviorAlert:
 
 
 class TimeSeriesBuffer:
-    """Ringbuffer for time-series data"""
+    """
+    Ringbuffer for time-series data
+
+    Fast kapasitet i NumPy-arrays - add() er O(1) uansett hvor lenge
+    en session varer:
+    - Eldste verdi overskrives når bufferen er full (ingen list.pop(0))
+    - Mean/std for hele bufferen holdes løpende (Welford, med fjerning)
+    - Tidsvinduer finnes med binærsøk over tidsstemplene - O(log n)
+
+    Tidsstempler antas ikke-synkende; et eldre tidsstempel (f.eks. ved
+    klokkejustering) klemmes til forrige.
+    """
 
     def __init__(self, max_size: int = 1000):
         self.max_size = max_size
-        self.data: list[tuple[float, float]] = []  # (timestamp, value)
+        self._times = np.zeros(max_size, dtype=np.float64)
+        self._values = np.zeros(max_size, dtype=np.float64)
+        self._head = 0    # Neste skriveposisjon
+        self._count = 0
+
+        # Welford over hele bufferen
+        self._mean = 0.0
+        self._m2 = 0.0
+        self._evictions = 0
+
+    def __len__(self) -> int:
+        return self._count
 
     def add(self, value: float, timestamp: float | None = None):
         if timestamp is None:
             timestamp = time.time()
-        self.data.append((timestamp, value))
-        if len(self.data) > self.max_size:
-            self.data.pop(0)
+        if self._count:
+            timestamp = max(timestamp, self._times[self._head - 1])
+
+        if self._count == self.max_size:
+            self._remove_stat(self._values[self._head])
+        else:
+            self._count += 1
+
+        self._times[self._head] = timestamp
+        self._values[self._head] = value
+        self._head = (self._head + 1) % self.max_size
+        self._add_stat(value)
+
+    def _add_stat(self, value: float):
+        n = self._count
+        delta = value - self._mean
+        self._mean += delta / n
+        self._m2 += delta * (value - self._mean)
+
+    def _remove_stat(self, value: float):
+        n = self._count - 1
+        if n == 0:
+            self._mean = self._m2 = 0.0
+            return
+        delta = value - self._mean
+        self._mean -= delta / n
+        self._m2 = max(0.0, self._m2 - delta * (value - self._mean))
+
+        # Rekalkuler eksakt én gang per kapasitet (amortisert O(1)),
+        # så avrundingsfeil fra fjerning ikke akkumuleres
+        self._evictions += 1
+        if self._evictions >= self.max_size:
+            self._evictions = 0
+            values = np.delete(self._values, self._head)
+            self._mean = float(values.mean())
+            self._m2 = float(((values - self._mean) ** 2).sum())
+
+    def _ordered(self, array: np.ndarray, start: int = 0) -> np.ndarray:
+        """Logisk indeks start..slutt (eldste først) som array"""
+        if self._count < self.max_size:
+            return array[start:self._count]
+        split = self.max_size - self._head
+        if start >= split:
+            return array[start - split:self._head]
+        return np.concatenate((array[self._head + start:], array[:self._head]))
+
+    def _window_start(self, duration_seconds: float) -> int:
+        """Logisk indeks for første punkt med t >= nå - duration (binærsøk)"""
+        cutoff = time.time() - duration_seconds
+        if self._count < self.max_size:
+            return int(np.searchsorted(self._times[:self._count], cutoff, side='left'))
+
+        older = self._times[self._head:]
+        if cutoff <= older[-1]:
+            return int(np.searchsorted(older, cutoff, side='left'))
+        return len(older) + int(np.searchsorted(self._times[:self._head], cutoff, side='left'))
+
+    def count(self, duration_seconds: float) -> int:
+        """Antall punkter fra siste N sekunder - O(log n)"""
+        return self._count - self._window_start(duration_seconds)
+
+    def window_values(self, duration_seconds: float) -> np.ndarray:
+        """Verdier fra siste N sekunder som array (eldste først)"""
+        return self._ordered(self._values, self._window_start(duration_seconds))
+
+    def window_times(self, duration_seconds: float) -> np.ndarray:
+        """Tidsstempler fra siste N sekunder som array (eldste først)"""
+        return self._ordered(self._times, self._window_start(duration_seconds))
 
     def get_window(self, duration_seconds: float) -> list[tuple[float, float]]:
         """Hent data fra siste N sekunder"""
-        cutoff = time.time() - duration_seconds
-        return [(t, v) for t, v in self.data if t >= cutoff]
+        start = self._window_start(duration_seconds)
+        return list(zip(self._ordered(self._times, start).tolist(),
+                        self._ordered(self._values, start).tolist()))
 
     def get_values(self, duration_seconds: float) -> list[float]:
         """Hent bare verdier fra siste N sekunder"""
-        return [v for _, v in self.get_window(duration_seconds)]
+        return self.window_values(duration_seconds).tolist()
+
+    def sum(self, duration_seconds: float) -> float:
+        start = self._window_start(duration_seconds)
+        if start == 0:
+            return self._mean * self._count
+        return float(self._ordered(self._values, start).sum())
 
     def mean(self, duration_seconds: float) -> float:
-        values = self.get_values(duration_seconds)
-        return statistics.mean(values) if values else 0.0
+        start = self._window_start(duration_seconds)
+        if start == self._count:
+            return 0.0
+        if start == 0:
+            return self._mean
+        return float(self._ordered(self._values, start).mean())
 
     def std(self, duration_seconds: float) -> float:
-        values = self.get_values(duration_seconds)
-        return statistics.stdev(values) if len(values) > 1 else 0.0
+        start = self._window_start(duration_seconds)
+        n = self._count - start
+        if n < 2:
+            return 0.0
+        if start == 0:
+            return math.sqrt(self._m2 / (n - 1))
+        return float(self._ordered(self._values, start).std(ddof=1))
 
 
 class DopamineLoopDetector:
@@ -183,20 +287,20 @@ class DopamineLoopDetector:
     SCROLL_INTERVAL_THRESHOLD = 3.0  # sekunder mellom scrolls
     MIN_LOOP_EVENTS = 5  # minimum events for loop detection
     LOOP_WINDOW = 60.0  # sekunder å analysere
+    MAX_EVENTS = 1024  # kapasitet - langt over realistisk event-rate i LOOP_WINDOW
 
     def __init__(self):
-        self.recent_events: list[DopamineEvent] = []
+        # Verdi = event-type kode (se _type_codes)
+        self.recent_events = TimeSeriesBuffer(max_size=self.MAX_EVENTS)
+        self._type_codes: dict[str, int] = {'scroll': 0, 'video_start': 1}
         self.loop_active = False
         self.loop_start_time: float | None = None
         self.loop_intensity = 0.0
 
     def add_event(self, event: DopamineEvent):
         """Legg til nytt dopamin-event"""
-        self.recent_events.append(event)
-
-        # Fjern gamle events
-        cutoff = time.time() - self.LOOP_WINDOW * 2
-        self.recent_events = [e for e in self.recent_events if e.timestamp > cutoff]
+        code = self._type_codes.setdefault(event.event_type, len(self._type_codes))
+        self.recent_events.add(code, event.timestamp)
 
     def detect_loop(self) -> tuple[bool, float, str]:
         """
@@ -205,28 +309,21 @@ class DopamineLoopDetector:
         Returns: (is_looping, intensity, loop_type)
         """
         now = time.time()
-        recent = [e for e in self.recent_events
-                  if e.timestamp > now - self.LOOP_WINDOW]
+        n_recent = self.recent_events.count(self.LOOP_WINDOW)
 
-        if len(recent) < self.MIN_LOOP_EVENTS:
+        if n_recent < self.MIN_LOOP_EVENTS:
             self.loop_active = False
             return False, 0.0, ""
 
-        # Analyser intervaller
-        intervals = []
-        for i in range(1, len(recent)):
-            intervals.append(recent[i].timestamp - recent[i-1].timestamp)
-
-        if not intervals:
-            return False, 0.0, ""
-
-        avg_interval = statistics.mean(intervals)
+        # Snitt av intervaller teleskoperer til (siste - første) / (n - 1)
+        times = self.recent_events.window_times(self.LOOP_WINDOW)
+        avg_interval = float(times[-1] - times[0]) / (n_recent - 1)
 
         # Rapid scrolling detection
         if avg_interval < self.SCROLL_INTERVAL_THRESHOLD:
             self.loop_active = True
             if self.loop_start_time is None:
-                self.loop_start_time = recent[0].timestamp
+                self.loop_start_time = float(times[0])
 
             # Beregn intensitet basert på:
             # - Hvor raskt scrollingen er
@@ -234,17 +331,17 @@ class DopamineLoopDetector:
             # - Antall events
             speed_factor = max(0, 1 - (avg_interval / self.SCROLL_INTERVAL_THRESHOLD))
             duration_factor = min(1, (now - self.loop_start_time) / 300)  # Max ved 5 min
-            event_factor = min(1, len(recent) / 20)
+            event_factor = min(1, n_recent / 20)
 
             self.loop_intensity = (speed_factor * 0.4 +
                                    duration_factor * 0.4 +
                                    event_factor * 0.2)
 
             # Kategoriser loop-type
-            event_types = [e.event_type for e in recent]
-            if event_types.count('scroll') > len(event_types) * 0.7:
+            codes = self.recent_events.window_values(self.LOOP_WINDOW)
+            if np.count_nonzero(codes == self._type_codes['scroll']) > n_recent * 0.7:
                 loop_type = "infinite_scroll"
-            elif event_types.count('video_start') > len(event_types) * 0.5:
+            elif np.count_nonzero(codes == self._type_codes['video_start']) > n_recent * 0.5:
                 loop_type = "video_binge"
             else:
                 loop_type = "rapid_consumption"
@@ -271,7 +368,7 @@ class FocusTracker:
         self.current_app: str | None = None
         self.app_start_time: float | None = None
         self.app_durations: dict[str, float] = defaultdict(float)
-        self.switch_times: list[float] = []
+        self.switch_times = TimeSeriesBuffer(max_size=1000)
         self.focus_streak = 0.0
         self.last_focus_check = time.time()
 
@@ -293,7 +390,7 @@ class FocusTracker:
             if duration < 30:  # Under 30 sek
                 result['was_distraction'] = True
 
-        self.switch_times.append(now)
+        self.switch_times.add(1.0, now)
         self.current_app = new_app
         self.app_start_time = now
 
@@ -306,12 +403,9 @@ class FocusTracker:
         - Tid på produktive apper
         - Avbrudd-mønster
         """
-        now = time.time()
-        window_start = now - (window_minutes * 60)
-
         # Tell bytter i vinduet
-        recent_switches = [t for t in self.switch_times if t > window_start]
-        switches_per_hour = len(recent_switches) / (window_minutes / 60)
+        recent_switches = self.switch_times.count(window_minutes * 60)
+        switches_per_hour = recent_switches / (window_minutes / 60)
 
         # Optimal: 5-10 switches per time
         # Dårlig: 30+ switches per time
@@ -342,24 +436,25 @@ class AddictionScorer:
         'intervention_resistance': 0.1
     }
 
+    # Kapasitet per app - dekker 30 dager med ~150 sessions/dag
+    MAX_SESSIONS_PER_APP = 5000
+    MAX_INTERVENTIONS = 5000
+
     def __init__(self):
-        self.usage_history: dict[str, list[tuple[float, float]]] = defaultdict(list)
-        self.intervention_history: list[tuple[float, str, bool]] = []  # (time, type, accepted)
+        # (start_time, duration) per app
+        self.usage_history: dict[str, TimeSeriesBuffer] = defaultdict(
+            lambda: TimeSeriesBuffer(max_size=self.MAX_SESSIONS_PER_APP)
+        )
+        # (time, accepted som 1.0/0.0)
+        self.intervention_history = TimeSeriesBuffer(max_size=self.MAX_INTERVENTIONS)
 
     def record_usage(self, app: str, start_time: float, duration: float):
-        """Registrer app-bruk"""
-        self.usage_history[app].append((start_time, duration))
-
-        # Trim gammel historie
-        cutoff = time.time() - 86400 * 30  # 30 dager
-        for app_name in self.usage_history:
-            self.usage_history[app_name] = [
-                (t, d) for t, d in self.usage_history[app_name] if t > cutoff
-            ]
+        """Registrer app-bruk (eldste session overskrives ved full buffer)"""
+        self.usage_history[app].add(duration, start_time)
 
     def record_intervention(self, intervention_type: str, accepted: bool):
         """Registrer respons på intervensjon"""
-        self.intervention_history.append((time.time(), intervention_type, accepted))
+        self.intervention_history.add(1.0 if accepted else 0.0)
 
     def calculate_score(self, app: str | None = None, days: int = 7) -> float:
         """
@@ -367,39 +462,34 @@ class AddictionScorer:
 
         Høyere = mer avhengig/problematisk bruk
         """
-        cutoff = time.time() - (days * 86400)
+        window = days * 86400
 
         if app:
-            history = [(t, d) for t, d in self.usage_history.get(app, []) if t > cutoff]
+            buffers = [self.usage_history[app]] if app in self.usage_history else []
         else:
-            history = []
-            for app_history in self.usage_history.values():
-                history.extend([(t, d) for t, d in app_history if t > cutoff])
+            buffers = list(self.usage_history.values())
 
-        if not history:
+        n_sessions = sum(b.count(window) for b in buffers)
+        if not n_sessions:
             return 0.0
 
         # Frekvens-score
-        daily_sessions = len(history) / days
+        daily_sessions = n_sessions / days
         freq_score = min(100, daily_sessions * 5)  # 20 sessions/dag = 100
 
         # Varighet-score
-        total_duration = sum(d for _, d in history)
+        total_duration = sum(b.sum(window) for b in buffers)
         daily_duration = total_duration / days
         duration_score = min(100, (daily_duration / 3600) * 25)  # 4 timer/dag = 100
 
         # Tid-på-dagen score (natt-bruk er mer problematisk)
-        night_sessions = sum(1 for t, _ in history
-                           if 0 <= datetime.fromtimestamp(t).hour < 6)
-        time_score = min(100, (night_sessions / max(1, len(history))) * 200)
+        night_sessions = sum(1 for b in buffers for t in b.window_times(window).tolist()
+                             if 0 <= datetime.fromtimestamp(t).hour < 6)
+        time_score = min(100, (night_sessions / n_sessions) * 200)
 
         # Intervention resistance
-        recent_interventions = [
-            accepted for t, _, accepted in self.intervention_history
-            if t > cutoff
-        ]
-        if recent_interventions:
-            resistance_score = (1 - sum(recent_interventions) / len(recent_interventions)) * 100
+        if self.intervention_history.count(window):
+            resistance_score = (1 - self.intervention_history.mean(window)) * 100
         else:
             resistance_score = 50  # Nøytral uten data
 
@@ -474,6 +564,31 @@ class CircadianAnalyzer:
         return False, ""
 
 
+# sessions og alerts partisjoneres per måned (sessions_pYYYYMM osv.) av RollupLog
+SESSIONS_SCHEMA = """
+    id TEXT PRIMARY KEY,
+    user_id TEXT,
+    start_time REAL,
+    end_time REAL,
+    focus_score REAL,
+    dopamine_score REAL,
+    addiction_score REAL,
+    app_switches INTEGER,
+    dominant_app TEXT,
+    data JSON
+"""
+
+ALERTS_SCHEMA = """
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    timestamp REAL,
+    user_id TEXT,
+    alert_level INTEGER,
+    alert_type TEXT,
+    message TEXT,
+    data JSON
+"""
+
+
 class BehavioralAnalyticsEngine:
     """
     Hoved-engine for atferdsanalyse
@@ -512,42 +627,37 @@ class BehavioralAnalyticsEngine:
         db_path = self.data_dir / "behavioral.db"
         with sqlite3.connect(db_path) as conn:
             conn.executescript("""
-                CREATE TABLE IF NOT EXISTS sessions (
-                    id TEXT PRIMARY KEY,
-                    user_id TEXT,
-                    start_time REAL,
-                    end_time REAL,
-                    focus_score REAL,
-                    dopamine_score REAL,
-                    addiction_score REAL,
-                    app_switches INTEGER,
-                    dominant_app TEXT,
-                    data JSON
-                );
-
-                CREATE TABLE IF NOT EXISTS alerts (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    timestamp REAL,
-                    user_id TEXT,
-                    alert_level INTEGER,
-                    alert_type TEXT,
-                    message TEXT,
-                    data JSON
-                );
-
                 CREATE TABLE IF NOT EXISTS user_profiles (
                     user_id TEXT PRIMARY KEY,
                     profile_data JSON,
                     updated_at REAL
                 );
-
-                CREATE INDEX IF NOT EXISTS idx_sessions_user
-                ON sessions(user_id);
-
-                CREATE INDEX IF NOT EXISTS idx_alerts_user_time
-                ON alerts(user_id, timestamp);
             """)
 
+        # Sessions og alerts: månedspartisjoner + time/døgn-rollups
+        self.session_log = RollupLog(
+            db_path, 'sessions', SESSIONS_SCHEMA,
+            time_column='start_time',
+            dimensions=('user_id', 'dominant_app'),
+            measures={
+                'sessions': lambda r: 1,
+                'duration': lambda r: (r['end_time'] or r['start_time']) - r['start_time'],
+                'focus_sum': lambda r: r['focus_score'],
+                'focus_n': lambda r: 1 if r['focus_score'] else 0,
+                'dopamine_sum': lambda r: r['dopamine_score'],
+                'dopamine_n': lambda r: 1 if r['dopamine_score'] else 0,
+                'app_switches': lambda r: r['app_switches']
+            },
+            epoch_time=True
+        )
+        self.alert_log = RollupLog(
+            db_path, 'alerts', ALERTS_SCHEMA,
+            time_column='timestamp',
+            dimensions=('user_id', 'alert_type', 'alert_level'),
+            measures={'alerts': lambda r: 1},
+            epoch_time=True
+        )
+
     def get_or_create_profile(self, user_id: str) -> UserProfile:
         """Hent eller opprett brukerprofil"""
         if user_id not in self.profiles:
@@ -591,30 +701,23 @@ class BehavioralAnalyticsEngine:
         return session
 
     def _save_session(self, session: SessionMetrics):
-        """Lagre session til database"""
-        db_path = self.data_dir / "behavioral.db"
-        with sqlite3.connect(db_path) as conn:
-            conn.execute("""
-                INSERT INTO sessions
-                (id, user_id, start_time, end_time, focus_score, dopamine_score,
-                 addiction_score, app_switches, dominant_app, data)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                session.session_id,
-                session.user_id,
-                session.start_time,
-                session.end_time,
-                session.focus_score,
-                session.dopamine_score,
-                session.addiction_score,
-                session.app_switches,
-                session.dominant_app,
-                json.dumps({
-                    'unique_apps': list(session.unique_apps),
-                    'scroll_events': session.scroll_events,
-                    'video_starts': session.video_starts,
-                })
-            ))
+        """Lagre session til database (write-behind + rollup)"""
+        self.session_log.record({
+            'id': session.session_id,
+            'user_id': session.user_id,
+            'start_time': session.start_time,
+            'end_time': session.end_time,
+            'focus_score': session.focus_score,
+            'dopamine_score': session.dopamine_score,
+            'addiction_score': session.addiction_score,
+            'app_switches': session.app_switches,
+            'dominant_app': session.dominant_app,
+            'data': json.dumps({
+                'unique_apps': list(session.unique_apps),
+                'scroll_events': session.scroll_events,
+                'video_starts': session.video_starts,
+            })
+        })
 
     def process_event(self, session_id: str, event_type: str,
                       app_name: str, metadata: dict | None = None) -> list[BehaviorAlert]:
@@ -725,19 +828,14 @@ class BehavioralAnalyticsEngine:
                 pass
 
         # Lagre til database
-        db_path = self.data_dir / "behavioral.db"
-        with sqlite3.connect(db_path) as conn:
-            conn.execute("""
-                INSERT INTO alerts (timestamp, user_id, alert_level, alert_type, message, data)
-                VALUES (?, ?, ?, ?, ?, ?)
-            """, (
-                alert.timestamp,
-                "",  # TODO: Add user_id
-                alert.alert_level.value,
-                alert.alert_type,
-                alert.message,
-                json.dumps(alert.data)
-            ))
+        self.alert_log.record({
+            'timestamp': alert.timestamp,
+            'user_id': "",  # TODO: Add user_id
+            'alert_level': alert.alert_level.value,
+            'alert_type': alert.alert_type,
+            'message': alert.message,
+            'data': json.dumps(alert.data)
+        })
 
     def register_alert_callback(self, callback: Callable[[BehaviorAlert], None]):
         """Registrer callback for alerts"""
@@ -781,50 +879,41 @@ class BehavioralAnalyticsEngine:
         if date is None:
             date = datetime.now()
 
-        day_start = datetime(date.year, date.month, date.day).timestamp()
-        day_end = day_start + 86400
+        # Døgn-rollup: én rad per (user_id, dominant_app) i stedet for alle sessions
+        rows = self.session_log.query(
+            'daily', since=date.strftime('%Y-%m-%d'),
+            until=(date + timedelta(days=1)).strftime('%Y-%m-%d'),
+            user_id=user_id
+        )
 
-        db_path = self.data_dir / "behavioral.db"
-        with sqlite3.connect(db_path) as conn:
-            # Hent sessions for dagen
-            cursor = conn.execute("""
-                SELECT focus_score, dopamine_score, addiction_score,
-                       app_switches, dominant_app,
-                       end_time - start_time as duration
-                FROM sessions
-                WHERE user_id = ? AND start_time >= ? AND start_time < ?
-            """, (user_id, day_start, day_end))
-
-            sessions = cursor.fetchall()
-
-            if not sessions:
-                return {'has_data': False}
-
-            # Aggreger
-            total_duration = sum(s[5] or 0 for s in sessions)
-            avg_focus = statistics.mean(s[0] for s in sessions if s[0])
-            avg_dopamine = statistics.mean(s[1] for s in sessions if s[1])
-            total_switches = sum(s[3] for s in sessions)
-
-            # Finn mest brukte app
-            app_counts = defaultdict(int)
-            for s in sessions:
-                if s[4]:
-                    app_counts[s[4]] += 1
-            dominant_app = max(app_counts.keys(), key=lambda x: app_counts[x]) if app_counts else None
+        if not rows:
+            return {'has_data': False}
 
-            return {
-                'has_data': True,
-                'date': date.strftime('%Y-%m-%d'),
-                'total_sessions': len(sessions),
-                'total_duration_hours': total_duration / 3600,
-                'avg_focus_score': avg_focus,
-                'avg_dopamine_score': avg_dopamine,
-                'total_app_switches': total_switches,
-                'dominant_app': dominant_app,
-                'best_focus_hours': self.circadian_analyzer.get_best_focus_hours(),
-                'risky_hours': self.circadian_analyzer.get_risky_hours()
-            }
+        # Aggreger
+        total_sessions = sum(int(r['sessions']) for r in rows)
+        total_duration = sum(r['duration'] for r in rows)
+        focus_n = sum(r['focus_n'] for r in rows)
+        dopamine_n = sum(r['dopamine_n'] for r in rows)
+        avg_focus = sum(r['focus_sum'] for r in rows) / focus_n if focus_n else 0
+        avg_dopamine = sum(r['dopamine_sum'] for r in rows) / dopamine_n if dopamine_n else 0
+        total_switches = int(sum(r['app_switches'] for r in rows))
+
+        # Finn mest brukte app
+        app_counts = {r['dominant_app']: r['sessions'] for r in rows if r['dominant_app']}
+        dominant_app = max(app_counts, key=app_counts.get) if app_counts else None
+
+        return {
+            'has_data': True,
+            'date': date.strftime('%Y-%m-%d'),
+            'total_sessions': total_sessions,
+            'total_duration_hours': total_duration / 3600,
+            'avg_focus_score': avg_focus,
+            'avg_dopamine_score': avg_dopamine,
+            'total_app_switches': total_switches,
+            'dominant_app': dominant_app,
+            'best_focus_hours': self.circadian_analyzer.get_best_focus_hours(),
+            'risky_hours': self.circadian_analyzer.get_risky_hours()
+        }
 
     def get_intervention_recommendation(self, session_id: str) -> dict | None:
         """
@@ -0,0 +1,154 @@
+"""
+AIKI Buffer Policy
+==================
+
+Bestemmer i responseheaders-hooken om en respons skal bufres for
+inspeksjon eller strømmes rett gjennom.
+
+mitmproxy bufrer hele bodyen før response-hooken som default - også
+videosegmenter fra googlevideo/tiktokcdn som ingen engine leser. Hvert
+segment kopieres da inn i Python-minne, og klienten får første byte
+først når siste byte er mottatt. Policyen ser kun på headers:
+
+1. Per-app inspeksjonsliste: app + content-type som en engine faktisk
+   leser (TikTok-feed, HTML-injeksjon, content intelligence) bufres
+2. Vertsklasse fra delt domain matcher ('media_cdn') → strøm
+3. Content-type (video/, audio/, image/, ...) → strøm
+4. Content-length over grensen → strøm
+5. Ellers bufres som før
+
+Strømmede flows har ingen body i response-hooken (response.stream = True,
+mitmproxy sender bytene videre uten å samle dem).
+"""
+
+import logging
+from dataclasses import dataclass
+
+from .domain_matcher import DomainMatcher, get_domain_matcher
+
+logger = logging.getLogger('aiki.buffer_policy')
+
+
+@dataclass
+class BufferDecision:
+    """Resultat av policy-evaluering for én respons"""
+    stream: bool
+    reason: str  # 'inspect', 'host_class', 'content_type', 'content_length', 'too_large', 'default'
+
+
+class BufferPolicy:
+    """
+    Header-basert buffer/strøm-policy
+
+    Bruk:
+        policy = BufferPolicy()
+        decision = policy.decide(app, host, flow.response.headers)
+        if decision.stream:
+            flow.response.stream = True
+    """
+
+    # Vertsklasser i delt domain matcher (navnerom 'host_class')
+    HOST_CLASSES = {
+        'media_cdn': [
+            'googlevideo.com', 'tiktokcdn.com', 'tiktokcdn-us.com', 'tiktokcdn-eu.com',
+            'ibyteimg.com', 'muscdn.com', 'byteoversea.com',
+            'cdninstagram.com', 'fbcdn.net', 'video.twimg.com', 'pbs.twimg.com',
+            'nflxvideo.net', 'nflxso.net', 'scdn.co', 'sc-cdn.net', 'ytimg.com',
+        ],
+    }
+    STREAM_HOST_CLASSES = frozenset({'media_cdn'})
+
+    # Content-type prefikser som aldri inspiseres
+    STREAM_CONTENT_TYPES = (
+        'video/', 'audio/', 'image/', 'font/',
+        'application/octet-stream', 'application/vnd.yt-ump',
+        'application/dash+xml', 'application/vnd.apple.mpegurl',
+        'application/x-mpegurl', 'application/mp4', 'application/zip',
+    )
+
+    # Per app: content-type-deler som en engine leser i response-hooken
+    INSPECT_TYPES = {
+        'tiktok': ('json', 'text/html'),
+        'instagram': ('json',),
+        'youtube': ('json',),
+        'snapchat': ('json',),
+        'twitter': ('json',),
+        'netflix': ('json',),
+        'spotify': ('json',),
+    }
+
+    # Ukjente responser større enn dette strømmes
+    MAX_BUFFER_BYTES = 1024 * 1024
+    # Selv inspiserte typer strømmes over denne grensen
+    MAX_INSPECT_BYTES = 16 * 1024 * 1024
+
+    def __init__(self, domain_matcher: DomainMatcher | None = None,
+                 inspect_types: dict[str, tuple[str, ...]] | None = None,
+                 max_buffer_bytes: int = MAX_BUFFER_BYTES,
+                 max_inspect_bytes: int = MAX_INSPECT_BYTES):
+        self.domain_matcher = domain_matcher or get_domain_matcher()
+        self.domain_matcher.register('host_class', self.HOST_CLASSES)
+        self.inspect_types = dict(self.INSPECT_TYPES if inspect_types is None else inspect_types)
+        self.max_buffer_bytes = max_buffer_bytes
+        self.max_inspect_bytes = max_inspect_bytes
+
+        self.stats = {
+            'evaluated': 0,
+            'buffered': 0,
+            'streamed': 0,
+            'streamed_bytes_declared': 0,
+            'reasons': {}
+        }
+
+    def decide(self, app: str, host: str, headers) -> BufferDecision:
+        """Evaluer policy for en respons (kun headers er mottatt)"""
+        content_type = headers.get('content-type', '').lower()
+        length = self._content_length(headers)
+
+        wanted = self.inspect_types.get(app, ())
+        if content_type and any(t in content_type for t in wanted):
+            if length is not None and length > self.max_inspect_bytes:
+                return self._record(BufferDecision(True, 'too_large'), length)
+            return self._record(BufferDecision(False, 'inspect'), length)
+
+        if self.domain_matcher.lookup(host, 'host_class') in self.STREAM_HOST_CLASSES:
+            return self._record(BufferDecision(True, 'host_class'), length)
+
+        if content_type.startswith(self.STREAM_CONTENT_TYPES):
+            return self._record(BufferDecision(True, 'content_type'), length)
+
+        if length is not None and length > self.max_buffer_bytes:
+            return self._record(BufferDecision(True, 'content_length'), length)
+
+        return self._record(BufferDecision(False, 'default'), length)
+
+    def set_inspect_types(self, app: str, types: tuple[str, ...]):
+        """Sett hvilke content-type-deler en app inspiserer (tom tuple = ingen)"""
+        self.inspect_types[app] = tuple(types)
+
+    @staticmethod
+    def _content_length(headers) -> int | None:
+        try:
+            return int(headers.get('content-length', ''))
+        except ValueError:
+            return None
+
+    def _record(self, decision: BufferDecision, length: int | None) -> BufferDecision:
+        self.stats['evaluated'] += 1
+        reasons = self.stats['reasons']
+        reasons[decision.reason] = reasons.get(decision.reason, 0) + 1
+        if decision.stream:
+            self.stats['streamed'] += 1
+            self.stats['streamed_bytes_declared'] += length or 0
+        else:
+            self.stats['buffered'] += 1
+        return decision
+
+    def get_stats(self) -> dict:
+        """Hent statistikk inkl. andel strømmet"""
+        evaluated = self.stats['evaluated']
+        return {
+            **self.stats,
+            'reasons': dict(self.stats['reasons']),
+            'stream_rate': (self.stats['streamed'] / evaluated * 100) if evaluated else 0
+        }
@@ -21,6 +21,7 @@ import hashlib
 import json
 import re
 import sqlite3
+import threading
 import time
 from collections import defaultdict
 from dataclasses import dataclass, field
@@ -31,6 +32,9 @@ from typing import Any, Callable
 
 import numpy as np
 
+from .event_sink import get_event_sink
+from .ttl_cache import TTLCache
+
 
 class ContentType(Enum):
     """Type innhold"""
@@ -136,18 +140,32 @@ class TextAnalysisResult:
     entities: list[str] = field(default_factory=list)
 
 
+@dataclass
+class DarkPatternHit:
+    """Ett indikator-treff i rå respons"""
+    indicator: str  # Matchet frase (normalisert til lowercase)
+    group: str      # Indikator-gruppe, se DarkPatternDetector.INDICATORS
+    offset: int     # Byte-/tegn-offset i scannet data
+
+
 class TextAnalyzer:
     """
     Analyserer tekstinnhold
 
     Uten eksterne avhengigheter - bruker keyword-basert analyse
     Kan oppgraderes til transformer-modeller senere
-    """
 
-    # Toxic keywords (forenklet)
-    TOXIC_PATTERNS = [
-        r'\b(hate|kill|die|stupid|idiot|loser)\b',
-        r'\b(slut|whore|bitch|fuck|shit)\b',
+    Alle kategorier scannes i ett pass: hvert mønster har et literal
+    anker, og alle ankre er kompilert til én trie-formet lookahead-regex.
+    findall gir alle ankre i teksten (også overlappende) i ett C-kall.
+    Mønstre som er mer enn et literal (ordgrenser, \\d+) verifiseres kun
+    når ankeret deres faktisk finnes. Kostnad følger tekstlengde og
+    antall distinkte treff, ikke antall mønstre x kategorier.
+    """
+    # Toxic keywords (forenklet) - én score-gruppe per tuple, hele ord
+    TOXIC_WORDS = [
+        ('hate', 'kill', 'die', 'stupid', 'idiot', 'loser'),
+        ('slut', 'whore', 'bitch', 'fuck', 'shit'),
         # Add more as needed
     ]
 
@@ -159,7 +177,7 @@ class TextAnalyzer:
         'lære', 'forklare', 'hvordan', 'vitenskap', 'historie'
     ]
 
-    # Engagement bait patterns
+    # Engagement bait patterns (regex med literal prefiks)
     ENGAGEMENT_BAIT = [
         r'wait for it',
         r'you won\'t believe',
@@ -173,46 +191,138 @@ class TextAnalyzer:
         r'follow for more',
     ]
 
-    def analyze(self, text: str) -> TextAnalysisResult:
-        """Analyser tekst"""
-        text_lower = text.lower()
+    # Simple sentiment (positive vs negative word count)
+    POSITIVE_WORDS = ['good', 'great', 'love', 'amazing', 'best', 'happy',
+                      'bra', 'flott', 'fantastisk', 'glad']
+    NEGATIVE_WORDS = ['bad', 'worst', 'hate', 'terrible', 'awful',
+                      'dårlig', 'forferdelig', 'hater']
+
+    # Language detection (simplified)
+    NORWEGIAN_WORDS = ['jeg', 'du', 'det', 'er', 'og', 'på', 'for', 'ikke']
+
+    _WORD_RE = re.compile(r'\b\w{4,}\b')
+    _REGEX_META = set('.^$*+?{}[]|()\\')
+    _SEPARATOR = '\0'
+
+    def __init__(self):
+        # feature_id -> (kategori, score-nøkkel); score-nøkkel er gruppe/mønster
+        # som teller maks én gang per tekst
+        self._features: list[tuple[str, Any]] = []
+        anchors: dict[str, list[tuple[int, re.Pattern | None]]] = defaultdict(list)
+
+        def add(category: str, key: Any, anchor: str, verifier: re.Pattern | None = None):
+            anchors[anchor].append((len(self._features), verifier))
+            self._features.append((category, key))
+
+        for group, words in enumerate(self.TOXIC_WORDS):
+            for word in words:
+                add('toxic', group, word, re.compile(rf'(?<!\w){re.escape(word)}\b'))
+        for kw in self.EDUCATIONAL_KEYWORDS:
+            add('educational', kw, kw)
+        for pattern in self.ENGAGEMENT_BAIT:
+            anchor, exact = self._literal_prefix(pattern)
+            add('bait', pattern, anchor, None if exact else re.compile(pattern))
+        for word in self.POSITIVE_WORDS:
+            add('positive', word, word)
+        for word in self.NEGATIVE_WORDS:
+            add('negative', word, word)
+        for word in self.NORWEGIAN_WORDS:
+            add('norwegian', word, word)
+
+        # anker -> (features som er bekreftet av ankeret, features som må verifiseres).
+        # Lookahead gir lengste anker per posisjon; ankre som er prefiks av det
+        # matcher på samme posisjon og tas med her.
+        self._by_anchor: dict[str, tuple[frozenset[int], tuple[tuple[int, re.Pattern], ...]]] = {}
+        for anchor in anchors:
+            entries = [entry for prefix, prefix_entries in anchors.items()
+                       if anchor.startswith(prefix) for entry in prefix_entries]
+            self._by_anchor[anchor] = (
+                frozenset(fid for fid, verifier in entries if verifier is None),
+                tuple((fid, verifier) for fid, verifier in entries if verifier is not None)
+            )
+
+        # Lookahead - overlappende ankre ('hate' i 'hater', 'er' i 'teacher')
+        # matcher hver på sin posisjon. Separatoren deler batch-scan per tekst.
+        self._scanner = re.compile(
+            f'(?=({re.escape(self._SEPARATOR)}|{self._trie_regex(list(anchors))}))'
+        )
 
-        # Toxicity
-        toxicity = 0.0
-        for pattern in self.TOXIC_PATTERNS:
-            if re.search(pattern, text_lower, re.IGNORECASE):
-                toxicity += 0.3
-        toxicity = min(1.0, toxicity)
-
-        # Educational score
-        edu_count = sum(1 for kw in self.EDUCATIONAL_KEYWORDS if kw in text_lower)
-        educational = min(1.0, edu_count * 0.2)
-
-        # Engagement bait
-        bait_count = sum(1 for pattern in self.ENGAGEMENT_BAIT
-                        if re.search(pattern, text_lower, re.IGNORECASE))
-        engagement_bait = min(1.0, bait_count * 0.25)
-
-        # Simple sentiment (positive vs negative word count)
-        positive_words = ['good', 'great', 'love', 'amazing', 'best', 'happy',
-                         'bra', 'flott', 'fantastisk', 'glad']
-        negative_words = ['bad', 'worst', 'hate', 'terrible', 'awful',
-                         'dårlig', 'forferdelig', 'hater']
-
-        pos_count = sum(1 for w in positive_words if w in text_lower)
-        neg_count = sum(1 for w in negative_words if w in text_lower)
+    @staticmethod
+    def _trie_regex(words: list[str]) -> str:
+        """Bygg regex med felles prefikser faktorert ut (ett tegn-valg per nivå)"""
+        trie: dict = {}
+        for word in words:
+            node = trie
+            for char in word:
+                node = node.setdefault(char, {})
+            node[''] = True
+
+        def emit(node: dict) -> str:
+            branches = [re.escape(char) + emit(child)
+                        for char, child in sorted(node.items()) if char]
+            if not branches:
+                return ''
+            body = branches[0] if len(branches) == 1 else f"(?:{'|'.join(branches)})"
+            if '' in node:
+                # Grådig valgfri hale: lengste anker vinner, prefikset er også et anker
+                return f"(?:{body})?"
+            return body
+
+        return emit(trie)
+
+    @classmethod
+    def _literal_prefix(cls, pattern: str) -> tuple[str, bool]:
+        """Literal prefiks av regex og om mønsteret er rent literal"""
+        prefix = []
+        i = 0
+        while i < len(pattern):
+            char = pattern[i]
+            if char == '\\' and i + 1 < len(pattern) and not pattern[i + 1].isalnum():
+                prefix.append(pattern[i + 1])
+                i += 2
+                continue
+            if char in cls._REGEX_META:
+                # Kvantor gjelder forrige tegn - det er ikke lenger literal
+                if char in '*?{' and prefix:
+                    prefix.pop()
+                if not prefix:
+                    raise ValueError(f"Pattern needs a literal prefix: {pattern}")
+                return ''.join(prefix), False
+            prefix.append(char)
+            i += 1
+        return ''.join(prefix), True
+
+    def _resolve(self, text_lower: str, found: set[str]) -> set[int]:
+        """Oversett funne ankre til feature-ID-er (verifiserer ved behov)"""
+        hits: set[int] = set()
+        for anchor in found:
+            confirmed, to_verify = self._by_anchor[anchor]
+            hits |= confirmed
+            for feature_id, verifier in to_verify:
+                if feature_id not in hits and verifier.search(text_lower):
+                    hits.add(feature_id)
+        return hits
+
+    def _build_result(self, text_lower: str, hits: set[int]) -> TextAnalysisResult:
+        scores: dict[str, set] = defaultdict(set)
+        for feature_id in hits:
+            category, key = self._features[feature_id]
+            scores[category].add(key)
+
+        toxicity = min(1.0, len(scores['toxic']) * 0.3)
+        educational = min(1.0, len(scores['educational']) * 0.2)
+        engagement_bait = min(1.0, len(scores['bait']) * 0.25)
+
+        pos_count = len(scores['positive'])
+        neg_count = len(scores['negative'])
         total = pos_count + neg_count
         sentiment = (pos_count - neg_count) / total if total > 0 else 0.0
 
-        # Language detection (simplified)
-        norwegian_words = ['jeg', 'du', 'det', 'er', 'og', 'på', 'for', 'ikke']
-        is_norwegian = sum(1 for w in norwegian_words if w in text_lower) > 2
-        language = 'no' if is_norwegian else 'en'
+        language = 'no' if len(scores['norwegian']) > 2 else 'en'
 
         # Keywords extraction (top frequent words)
-        words = re.findall(r'\b\w{4,}\b', text_lower)
         word_freq = defaultdict(int)
-        for w in words:
+        for w in self._WORD_RE.findall(text_lower):
             word_freq[w] += 1
         keywords = sorted(word_freq.keys(), key=lambda x: word_freq[x], reverse=True)[:10]
 
@@ -225,6 +335,35 @@ class TextAnalyzer:
             keywords=keywords
         )
 
+    def analyze(self, text: str) -> TextAnalysisResult:
+        """Analyser tekst"""
+        text_lower = text.lower()
+        found = set(self._scanner.findall(text_lower))
+        return self._build_result(text_lower, self._resolve(text_lower, found))
+
+    def analyze_batch(self, texts: list[str]) -> list[TextAnalysisResult]:
+        """
+        Analyser mange tekster (f.eks. alle captions i en feed)
+
+        Tekstene slås sammen med NUL-separator og scannes i ett
+        findall-kall; separator-treffene deler ankrene per tekst.
+        """
+        if not texts:
+            return []
+
+        lowered = [text.lower() for text in texts]
+        found_per_text: list[set[str]] = [set()]
+        for anchor in self._scanner.findall(self._SEPARATOR.join(lowered)):
+            if anchor == self._SEPARATOR:
+                found_per_text.append(set())
+            else:
+                found_per_text[-1].add(anchor)
+
+        return [
+            self._build_result(text_lower, self._resolve(text_lower, found))
+            for text_lower, found in zip(lowered, found_per_text)
+        ]
+
 
 class EngagementDetector:
     """
@@ -307,49 +446,90 @@ class DarkPatternDetector:
     """
     Detekter manipulative UI/UX patterns i responses
 
-    Analyserer HTML/JSON for kjente dark patterns
+    Analyserer HTML/JSON for kjente dark patterns. Rå (dekomprimerte)
+    bytes scannes direkte - ingen json.dumps av parset respons. Én
+    ASCII-lowercase (samme lengde, offsets bevares) og deretter
+    C-nivå find per indikator; treff rapporteres med offset og
+    klassifiseres etterpå.
     """
 
-    def detect_patterns(self, response_data: dict | str,
-                        content_type: str) -> list[DarkPattern]:
-        """Detekter dark patterns"""
-        patterns = []
-
-        if isinstance(response_data, str):
-            data_str = response_data.lower()
-        else:
-            data_str = json.dumps(response_data).lower()
-
-        # Disguised ads
-        if '"sponsored"' in data_str or '"ad"' in data_str:
-            if '"organic"' in data_str or 'looks like' in data_str:
-                patterns.append(DarkPattern.DISGUISED_ADS)
-
-        # Confirm shaming
-        shame_patterns = [
+    # Indikator-gruppe -> fraser (lowercase, matches case-insensitivt)
+    INDICATORS = {
+        'ad_marker': ['"sponsored"', '"ad"'],
+        'organic_marker': ['"organic"', 'looks like'],
+        'confirm_shaming': [
             'no thanks, i don\'t want',
             'i\'ll stay',
             'maybe later',
             'no, i prefer'
+        ],
+        'notification': ['"notification"'],
+        'privacy': [
+            'share with friends',
+            'let contacts know',
+            'post to feed'
+        ],
+    }
+
+    # Flere enn dette antall '"notification"' = notification spam
+    NOTIFICATION_SPAM_THRESHOLD = 5
+
+    def __init__(self):
+        self._indicators: list[tuple[str, str, bytes]] = [
+            (phrase, group, phrase.encode())
+            for group, phrases in self.INDICATORS.items()
+            for phrase in phrases
         ]
-        if any(p in data_str for p in shame_patterns):
+
+    def scan(self, data: bytes | str) -> list[DarkPatternHit]:
+        """Scan rå respons (bytes eller str), treff sortert på offset"""
+        lowered = data.lower()
+        is_bytes = isinstance(lowered, bytes)
+
+        hits = []
+        for phrase, group, phrase_bytes in self._indicators:
+            needle = phrase_bytes if is_bytes else phrase
+            offset = lowered.find(needle)
+            while offset != -1:
+                hits.append(DarkPatternHit(phrase, group, offset))
+                offset = lowered.find(needle, offset + len(needle))
+
+        hits.sort(key=lambda hit: hit.offset)
+        return hits
+
+    def classify(self, hits: list[DarkPatternHit]) -> list[DarkPattern]:
+        """Oversett indikator-treff til dark patterns"""
+        counts: dict[str, int] = defaultdict(int)
+        for hit in hits:
+            counts[hit.group] += 1
+
+        patterns = []
+
+        # Disguised ads
+        if counts['ad_marker'] and counts['organic_marker']:
+            patterns.append(DarkPattern.DISGUISED_ADS)
+
+        # Confirm shaming
+        if counts['confirm_shaming']:
             patterns.append(DarkPattern.CONFIRM_SHAMING)
 
         # Notification spam indicators
-        if data_str.count('"notification"') > 5:
+        if counts['notification'] > self.NOTIFICATION_SPAM_THRESHOLD:
             patterns.append(DarkPattern.NOTIFICATION_SPAM)
 
         # Privacy zuckering
-        privacy_patterns = [
-            'share with friends',
-            'let contacts know',
-            'post to feed'
-        ]
-        if any(p in data_str for p in privacy_patterns):
+        if counts['privacy']:
             patterns.append(DarkPattern.PRIVACY_ZUCKERING)
 
         return patterns
 
+    def detect_patterns(self, response_data: dict | str | bytes,
+                        content_type: str) -> list[DarkPattern]:
+        """Detekter dark patterns (rå bytes/str scannes direkte)"""
+        if isinstance(response_data, (bytes, str)):
+            return self.classify(self.scan(response_data))
+        return self.classify(self.scan(json.dumps(response_data)))
+
 
 class VideoMetadataExtractor:
     """
@@ -520,18 +700,20 @@ class ContentIntelligenceEngine:
         self.scorer = ContentScorer()
 
         # Cache
-        self._analysis_cache: dict[str, ContentAnalysis] = {}
+        self._analysis_cache = TTLCache(maxsize=50_000, ttl=3600)
 
-        # Stats
+        # Stats (analyze_feed kjøres av flere pipeline-workers samtidig)
         self.stats = {
             'total_analyzed': 0,
             'blocked': 0,
             'injected': 0,
             'allowed': 0
         }
+        self._stats_lock = threading.Lock()
 
         # Database
         self._init_db()
+        self.event_sink = get_event_sink(self.data_dir / "content_intelligence.db")
 
     def _init_db(self):
         db_path = self.data_dir / "content_intelligence.db"
@@ -575,12 +757,17 @@ class ContentIntelligenceEngine:
         Returns: ContentAnalysis med beslutning
         """
         # Sjekk cache
-        if content_id in self._analysis_cache:
-            return self._analysis_cache[content_id]
+        cached = self._analysis_cache.get(content_id)
+        if cached is not None:
+            return cached
 
-        self.stats['total_analyzed'] += 1
+        metadata, text = self._extract_metadata(content_data, source_app)
+        return self._analyze_extracted(
+            content_id, content_data, metadata, text, self.text_analyzer.analyze(text)
+        )
 
-        # Ekstraher metadata basert på kilde
+    def _extract_metadata(self, content_data: dict, source_app: str) -> tuple[dict, str]:
+        """Ekstraher metadata og tekst (description/caption) basert på kilde"""
         if source_app == 'tiktok':
             metadata = self.metadata_extractor.extract_from_tiktok(content_data)
         elif source_app == 'instagram':
@@ -588,6 +775,17 @@ class ContentIntelligenceEngine:
         else:
             metadata = content_data
 
+        text = metadata.get('description', '') or metadata.get('caption', '')
+        return metadata, text
+
+    def _analyze_extracted(self, content_id: str, content_data: dict, metadata: dict,
+                           text: str, text_analysis: TextAnalysisResult,
+                           dark_patterns: list[DarkPattern] | None = None) -> ContentAnalysis:
+        """
+        Fullfør analyse og beslutning når tekstanalysen er gjort
+
+        dark_patterns=None betyr at item-et scannes selv.
+        """
         # Bestem content type
         duration = metadata.get('duration', 0)
         if duration > 0:
@@ -600,10 +798,6 @@ class ContentIntelligenceEngine:
         else:
             content_type = ContentType.UNKNOWN
 
-        # Analyser tekst (description/caption)
-        text = metadata.get('description', '') or metadata.get('caption', '')
-        text_analysis = self.text_analyzer.analyze(text)
-
         # Detekter engagement tactics
         tactics = self.engagement_detector.detect_tactics(metadata, text)
         engagement_intensity = self.engagement_detector.calculate_engagement_intensity(
@@ -611,9 +805,10 @@ class ContentIntelligenceEngine:
         )
 
         # Detekter dark patterns
-        dark_patterns = self.dark_pattern_detector.detect_patterns(
-            content_data, 'json'
-        )
+        if dark_patterns is None:
+            dark_patterns = self.dark_pattern_detector.detect_patterns(
+                content_data, 'json'
+            )
 
         # Bestem kategori
         if metadata.get('is_ad'):
@@ -650,53 +845,81 @@ class ContentIntelligenceEngine:
 
         # Oppdater stats
         if not should_allow:
-            self.stats['blocked'] += 1
+            outcome = 'blocked'
         elif should_inject:
-            self.stats['injected'] += 1
+            outcome = 'injected'
         else:
-            self.stats['allowed'] += 1
+            outcome = 'allowed'
+        with self._stats_lock:
+            self.stats['total_analyzed'] += 1
+            self.stats[outcome] += 1
 
         # Cache og lagre
-        self._analysis_cache[content_id] = analysis
+        self._analysis_cache.set(content_id, analysis)
         self._save_analysis(analysis)
 
         return analysis
 
     def _save_analysis(self, analysis: ContentAnalysis):
-        """Lagre analyse til database"""
-        db_path = self.data_dir / "content_intelligence.db"
-        with sqlite3.connect(db_path) as conn:
-            conn.execute("""
-                INSERT OR REPLACE INTO content_analysis
-                (content_id, analysis_time, content_type, category,
-                 educational_value, toxicity_score, engagement_intensity,
-                 manipulation_score, final_score, decision, metadata)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                analysis.content_id,
-                time.time(),
-                analysis.content_type.name,
-                analysis.category.name,
-                analysis.educational_value,
-                analysis.toxicity_score,
-                analysis.engagement_intensity,
-                analysis.manipulation_score,
-                self.scorer.calculate_score(analysis),
-                'allow' if analysis.should_allow else 'block',
-                json.dumps({
-                    'tactics': [t.name for t in analysis.engagement_tactics],
-                    'dark_patterns': [p.name for p in analysis.dark_patterns]
-                })
-            ))
+        """Lagre analyse til database (write-behind)"""
+        self.event_sink.submit("""
+            INSERT OR REPLACE INTO content_analysis
+            (content_id, analysis_time, content_type, category,
+             educational_value, toxicity_score, engagement_intensity,
+             manipulation_score, final_score, decision, metadata)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, (
+            analysis.content_id,
+            time.time(),
+            analysis.content_type.name,
+            analysis.category.name,
+            analysis.educational_value,
+            analysis.toxicity_score,
+            analysis.engagement_intensity,
+            analysis.manipulation_score,
+            self.scorer.calculate_score(analysis),
+            'allow' if analysis.should_allow else 'block',
+            json.dumps({
+                'tactics': [t.name for t in analysis.engagement_tactics],
+                'dark_patterns': [p.name for p in analysis.dark_patterns]
+            })
+        ))
+
+    def analyze_feed(self, feed_data: list[dict], source_app: str,
+                     raw: bytes | None = None) -> list[ContentAnalysis]:
+        """
+        Analyser hele feed (tekstene til nye items scannes i ett batch-pass)
+
+        raw er den dekomprimerte responsen feeden ble parset fra. Den
+        scannes én gang for dark pattern-indikatorer; uten treff (vanlig
+        tilfelle) hoppes scan per item over helt.
+        """
+        skip_dark_scan = raw is not None and not self.dark_pattern_detector.scan(raw)
+        content_ids = [
+            item.get('id') or item.get('awemeId') or str(hash(str(item)))
+            for item in feed_data
+        ]
+
+        analyses: dict[str, ContentAnalysis] = {}
+        pending: dict[str, tuple[dict, dict, str]] = {}
+        for content_id, item in zip(content_ids, feed_data):
+            if content_id in analyses or content_id in pending:
+                continue
+            cached = self._analysis_cache.get(content_id)
+            if cached is not None:
+                analyses[content_id] = cached
+            else:
+                metadata, text = self._extract_metadata(item, source_app)
+                pending[content_id] = (item, metadata, text)
+
+        text_analyses = self.text_analyzer.analyze_batch([text for _, _, text in pending.values()])
+        for (content_id, (item, metadata, text)), text_analysis in zip(pending.items(), text_analyses):
+            analyses[content_id] = self._analyze_extracted(
+                content_id, item, metadata, text, text_analysis,
+                dark_patterns=[] if skip_dark_scan else None
+            )
 
-    def analyze_feed(self, feed_data: list[dict], source_app: str) -> list[ContentAnalysis]:
-        """Analyser hele feed"""
-        results = []
-        for item in feed_data:
-            content_id = item.get('id') or item.get('awemeId') or str(hash(str(item)))
-            analysis = self.analyze_content(content_id, item, source_app)
-            results.append(analysis)
-        return results
+        return [analyses[content_id] for content_id in content_ids]
 
     def get_feed_summary(self, analyses: list[ContentAnalysis]) -> dict:
         """Lag sammendrag av feed-analyse"""
@@ -722,7 +945,8 @@ class ContentIntelligenceEngine:
         """Hent statistikk"""
         return {
             **self.stats,
-            'cache_size': len(self._analysis_cache)
+            'cache_size': len(self._analysis_cache),
+            'cache': self._analysis_cache.get_stats()
         }
 
 
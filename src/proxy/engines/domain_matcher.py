@@ -0,0 +1,197 @@
+"""
+AIKI Domain Matcher
+===================
+
+Kompilert host -> app oppslag, delt av alle proxy engines.
+
+Tidligere gjorde addon, throttler og classifier hver sin lineære
+substring-scan over sine mønstertabeller - tre O(mønstre) scans per
+request. Nå kompileres alle tabellene én gang til:
+
+1. Et reversert label-trie (com -> tiktok -> ...) for domene-mønstre
+   som "tiktok.com". Matcher host og alle subdomener, men ikke
+   "nottiktok.com".
+2. Én regex-alternasjon for nøkkelord uten punktum ("bytedance",
+   "sc-cdn") som fortsatt matches som substring.
+3. En LRU over nylige hosts - samme host treffer typisk hundrevis av
+   ganger per minutt.
+
+Hver tabell registreres under et eget navnerom ('addon', 'throttler',
+'signatures'), og ett oppslag returnerer treff for alle navnerom.
+Ved endring bygges en ny snapshot og byttes inn atomisk - pågående
+oppslag ser enten gammel eller ny tabell, aldri en halvferdig.
+"""
+
+import logging
+import re
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger('aiki.domain_matcher')
+
+
+class _CompiledTables:
+    """Immutabel snapshot av trie + nøkkelord-regex for alle navnerom"""
+
+    def __init__(self, tables: dict[str, dict[str, list[str]]]):
+        # Trie-node: {'children': {label: node}, 'apps': {namespace: (prioritet, app)}}
+        self.root: dict = {'children': {}, 'apps': {}}
+        # namespace -> (regex, {nøkkelord: (prioritet, app)})
+        self.keywords: dict[str, tuple[re.Pattern, dict[str, tuple[int, str]]]] = {}
+
+        for namespace, table in tables.items():
+            keyword_map: dict[str, tuple[int, str]] = {}
+
+            for priority, (app, patterns) in enumerate(table.items()):
+                for pattern in patterns:
+                    pattern = pattern.lower().strip('.')
+                    if not pattern:
+                        continue
+                    if '.' in pattern:
+                        self._insert(namespace, pattern, priority, app)
+                    else:
+                        keyword_map.setdefault(pattern, (priority, app))
+
+            if keyword_map:
+                # Lengste først så "cdninstagram" vinner over "instagram"
+                alternation = '|'.join(
+                    re.escape(k) for k in sorted(keyword_map, key=len, reverse=True)
+                )
+                self.keywords[namespace] = (re.compile(alternation), keyword_map)
+
+        self.namespaces = tuple(tables)
+
+    def _insert(self, namespace: str, domain: str, priority: int, app: str):
+        """Legg inn domene i reversert label-rekkefølge"""
+        node = self.root
+        for label in reversed(domain.split('.')):
+            node = node['children'].setdefault(label, {'children': {}, 'apps': {}})
+        # Første registrering vinner (samme semantikk som gammel dict-iterasjon)
+        node['apps'].setdefault(namespace, (priority, app))
+
+    def match(self, host: str) -> dict[str, str]:
+        """Finn app per navnerom for en (lowercase) host"""
+        best: dict[str, tuple[int, str]] = {}
+
+        # 1. Suffix-walk: én node per label
+        node = self.root
+        for label in reversed(host.split('.')):
+            node = node['children'].get(label)
+            if node is None:
+                break
+            for namespace, hit in node['apps'].items():
+                current = best.get(namespace)
+                if current is None or hit[0] < current[0]:
+                    best[namespace] = hit
+
+        # 2. Nøkkelord - kun for navnerom uten domene-treff
+        for namespace, (regex, keyword_map) in self.keywords.items():
+            if namespace in best:
+                continue
+            for m in regex.finditer(host):
+                hit = keyword_map[m.group(0)]
+                current = best.get(namespace)
+                if current is None or hit[0] < current[0]:
+                    best[namespace] = hit
+
+        return {namespace: app for namespace, (_, app) in best.items()}
+
+
+class DomainMatcher:
+    """
+    Delt, kompilert domene-matcher med LRU foran
+
+    Bruk:
+        matcher = get_domain_matcher()
+        matcher.register('throttler', {'tiktok': ['tiktok.com', ...]})
+        matcher.lookup(host, 'throttler')  # -> 'tiktok' | None
+    """
+
+    def __init__(self, cache_size: int = 4096):
+        self.cache_size = cache_size
+        self._tables: dict[str, dict[str, list[str]]] = {}
+        self._compiled = _CompiledTables({})
+        self._cache: OrderedDict[str, dict[str, str]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {
+            'lookups': 0,
+            'cache_hits': 0,
+            'rebuilds': 0
+        }
+
+    def register(self, namespace: str, table: dict[str, list[str]]):
+        """
+        Registrer (eller erstatt) mønstertabell for et navnerom
+
+        Tabellen er {app: [mønstre]}; rekkefølgen bestemmer prioritet når
+        flere apper matcher samme host. Hele matcheren rebuildes og byttes
+        inn atomisk.
+        """
+        table = {app: list(patterns) for app, patterns in table.items()}
+        with self._lock:
+            if self._tables.get(namespace) == table:
+                return
+            tables = dict(self._tables)
+            tables[namespace] = table
+            compiled = _CompiledTables(tables)
+
+            self._tables = tables
+            self._compiled = compiled
+            self._cache = OrderedDict()
+            self.stats['rebuilds'] += 1
+
+        logger.debug(f"Domain matcher rebuilt: {namespace} ({len(table)} apps)")
+
+    def match(self, host: str) -> dict[str, str]:
+        """Returner {navnerom: app} for alle navnerom som matcher host"""
+        host = host.lower().rstrip('.')
+        self.stats['lookups'] += 1
+
+        with self._lock:
+            cache = self._cache
+            compiled = self._compiled
+            hit = cache.get(host)
+            if hit is not None:
+                cache.move_to_end(host)
+                self.stats['cache_hits'] += 1
+                return hit
+
+        result = compiled.match(host)
+
+        with self._lock:
+            # Ikke cache resultat fra en snapshot som er byttet ut
+            if self._compiled is compiled:
+                cache[host] = result
+                if len(cache) > self.cache_size:
+                    cache.popitem(last=False)
+
+        return result
+
+    def lookup(self, host: str, namespace: str) -> str | None:
+        """Finn app for host i ett navnerom"""
+        return self.match(host).get(namespace)
+
+    def get_stats(self) -> dict:
+        """Hent statistikk"""
+        return {
+            **self.stats,
+            'namespaces': list(self._compiled.namespaces),
+            'cached_hosts': len(self._cache),
+            'hit_rate': (self.stats['cache_hits'] / self.stats['lookups'] * 100)
+                        if self.stats['lookups'] else 0
+        }
+
+
+# Delt instans - alle engines i samme prosess bruker samme matcher
+_shared_matcher: DomainMatcher | None = None
+_shared_lock = threading.Lock()
+
+
+def get_domain_matcher() -> DomainMatcher:
+    """Hent delt DomainMatcher instans"""
+    global _shared_matcher
+    if _shared_matcher is None:
+        with _shared_lock:
+            if _shared_matcher is None:
+                _shared_matcher = DomainMatcher()
+    return _shared_matcher
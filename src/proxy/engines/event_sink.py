@@ -0,0 +1,289 @@
+"""
+AIKI Event Sink
+===============
+
+Write-behind SQLite-logging for proxy engines.
+
+Før: hver event åpnet ny sqlite3.connect(), skrev én rad og gjorde
+commit (= fsync) - midt i request-pathen. Nå:
+
+1. submit() legger (sql, params) i en bounded kø - O(1), ingen I/O
+2. Én writer-tråd per database eier én langlevd WAL-connection
+3. Writer group-committer med executemany hvert flush_interval_ms
+   eller når batch_size rader venter
+4. Ved shutdown: 'flush' skriver resten, 'drop' kaster dem
+
+Rekkefølge bevares: påfølgende events med samme SQL slås sammen til
+én executemany, alt i samme transaksjon. En feilende gruppe isoleres
+med SAVEPOINT og kjøres rad for rad - kun de dårlige radene droppes.
+
+Lesere bruker fortsatt egne connections; skrevne rader blir synlige
+etter maks ett flush-intervall (eller etter eksplisitt flush()).
+"""
+
+import atexit
+import logging
+import queue
+import sqlite3
+import threading
+import time
+from itertools import groupby
+from pathlib import Path
+
+logger = logging.getLogger('aiki.event_sink')
+
+# Sentinel for å vekke writer ved flush/close
+_WAKE = object()
+
+
+class EventSink:
+    """
+    Write-behind sink for én SQLite-database
+
+    Bruk:
+        sink = get_event_sink(db_path)
+        sink.submit("INSERT INTO t (a, b) VALUES (?, ?)", (1, 2))
+    """
+
+    def __init__(
+        self,
+        db_path: str | Path,
+        flush_interval_ms: int = 250,
+        batch_size: int = 500,
+        max_queue: int = 50_000,
+        shutdown_policy: str = 'flush'
+    ):
+        if shutdown_policy not in ('flush', 'drop'):
+            raise ValueError(f"Unknown shutdown policy: {shutdown_policy}")
+
+        self.db_path = Path(db_path)
+        self.flush_interval = flush_interval_ms / 1000
+        self.batch_size = batch_size
+        self.shutdown_policy = shutdown_policy
+
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        self._flushed = threading.Condition()
+        # submit() kalles fra event-loopen og analyse-workerne - put og
+        # teller må skje atomisk, ellers venter flush() på et for lavt mål
+        self._submit_lock = threading.Lock()
+        self._submitted = 0
+        self._committed = 0
+        self._running = True
+
+        self.stats = {
+            'submitted': 0,
+            'written': 0,
+            'dropped': 0,
+            'failed': 0,  # rader som feilet i SQLite (constraint o.l.)
+            'batches': 0,
+            'errors': 0
+        }
+
+        self._thread = threading.Thread(
+            target=self._writer_loop,
+            name=f"aiki-sink-{self.db_path.stem}",
+            daemon=True
+        )
+        self._thread.start()
+
+    def submit(self, sql: str, params: tuple = ()) -> bool:
+        """
+        Legg event i kø (kalles fra request-pathen)
+
+        Returnerer False hvis køen er full eller sinken er stengt -
+        eventen droppes heller enn å blokkere proxyen.
+        """
+        with self._submit_lock:
+            if not self._running:
+                self.stats['dropped'] += 1
+                return False
+            try:
+                self._queue.put_nowait((sql, params))
+            except queue.Full:
+                self.stats['dropped'] += 1
+                return False
+            self._submitted += 1
+            self.stats['submitted'] += 1
+        return True
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Vent til alt som er submitted er committed"""
+        with self._submit_lock:
+            target = self._submitted
+        try:
+            self._queue.put_nowait(_WAKE)
+        except queue.Full:
+            pass
+        with self._flushed:
+            return self._flushed.wait_for(
+                lambda: self._committed >= target or not self._thread.is_alive(),
+                timeout
+            )
+
+    def close(self, policy: str | None = None, timeout: float = 5.0):
+        """Stopp writer; 'flush' skriver gjenværende events, 'drop' kaster dem"""
+        if not self._running:
+            return
+        policy = policy or self.shutdown_policy
+
+        if policy == 'drop':
+            dropped = 0
+            while True:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is not _WAKE:
+                    dropped += 1
+            with self._submit_lock:
+                self.stats['dropped'] += dropped
+
+        self._running = False
+        try:
+            self._queue.put(_WAKE, timeout=timeout)
+        except queue.Full:
+            pass
+        self._thread.join(timeout)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(str(self.db_path), timeout=30)
+        for _ in range(50):
+            try:
+                conn.execute("PRAGMA journal_mode=WAL")
+                break
+            except sqlite3.OperationalError:
+                # Annen tilkobling holder lås (skjema-init/backfill ved oppstart)
+                time.sleep(0.1)
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _writer_loop(self):
+        """Writer-tråd: samle batch, executemany, commit"""
+        conn = self._connect()
+        try:
+            while True:
+                batch = self._collect_batch()
+                if batch:
+                    self._write_batch(conn, batch)
+                if not self._running and self._queue.empty():
+                    break
+        finally:
+            conn.close()
+            with self._flushed:
+                self._flushed.notify_all()
+
+    def _collect_batch(self) -> list[tuple[str, tuple]]:
+        """Blokker til første event, fyll så opp til batch_size eller deadline"""
+        batch = []
+        try:
+            item = self._queue.get(timeout=self.flush_interval)
+        except queue.Empty:
+            return batch
+        if item is _WAKE:
+            return batch
+        batch.append(item)
+
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is _WAKE:
+                break
+            batch.append(item)
+        return batch
+
+    def _write_batch(self, conn: sqlite3.Connection, batch: list[tuple[str, tuple]]):
+        """
+        Skriv batch i én transaksjon, påfølgende like SQL som executemany
+
+        Hver gruppe kjøres i en SAVEPOINT. Feiler gruppen (constraint,
+        manglende tabell) prøves radene enkeltvis, så bare de dårlige
+        radene droppes - ikke resten av batchen.
+        """
+        written = failed = 0
+        try:
+            conn.execute("BEGIN")
+            for sql, group in groupby(batch, key=lambda e: e[0]):
+                rows = [params for _, params in group]
+                error = self._execute_isolated(conn, sql, rows)
+                if error is None:
+                    written += len(rows)
+                    continue
+
+                logger.error(f"Event sink statement failed ({self.db_path.name}): {error} - {sql[:120]}")
+                for params in rows:
+                    if self._execute_isolated(conn, sql, [params]) is None:
+                        written += 1
+                    else:
+                        failed += 1
+            conn.commit()
+            self.stats['batches'] += 1
+        except Exception as e:
+            # BEGIN/COMMIT feilet (låst, disk full) - hele batchen er tapt
+            if conn.in_transaction:
+                conn.rollback()
+            written, failed = 0, len(batch)
+            logger.error(f"Event sink write error ({self.db_path.name}, {len(batch)} rows): {e}")
+
+        self.stats['written'] += written
+        self.stats['failed'] += failed
+        if failed:
+            self.stats['errors'] += 1
+
+        with self._flushed:
+            self._committed += len(batch)
+            self._flushed.notify_all()
+
+    @staticmethod
+    def _execute_isolated(conn: sqlite3.Connection, sql: str, rows: list[tuple]) -> Exception | None:
+        """executemany i egen SAVEPOINT; rull tilbake bare denne ved feil"""
+        conn.execute("SAVEPOINT sink_group")
+        try:
+            conn.executemany(sql, rows)
+        except sqlite3.Error as e:
+            conn.execute("ROLLBACK TO sink_group")
+            conn.execute("RELEASE sink_group")
+            return e
+        conn.execute("RELEASE sink_group")
+        return None
+
+    def get_stats(self) -> dict:
+        """Hent statistikk"""
+        return {
+            **self.stats,
+            'pending': self._queue.qsize(),
+            'db': str(self.db_path)
+        }
+
+
+# Én sink per database-fil, delt av alle engines i prosessen
+_sinks: dict[str, EventSink] = {}
+_sinks_lock = threading.Lock()
+
+
+def get_event_sink(db_path: str | Path, **kwargs) -> EventSink:
+    """Hent (eller opprett) delt EventSink for en database"""
+    key = str(Path(db_path).resolve())
+    with _sinks_lock:
+        sink = _sinks.get(key)
+        if sink is None or not sink._running:
+            sink = EventSink(db_path, **kwargs)
+            _sinks[key] = sink
+        return sink
+
+
+def close_all_sinks(policy: str | None = None):
+    """Steng alle sinks (kalles ved proxy-shutdown og atexit)"""
+    with _sinks_lock:
+        sinks = list(_sinks.values())
+        _sinks.clear()
+    for sink in sinks:
+        sink.close(policy)
+
+
+atexit.register(close_all_sinks)
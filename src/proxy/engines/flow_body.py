@@ -0,0 +1,145 @@
+"""
+AIKI Flow Body
+==============
+
+Per-flow dekodet response-body delt mellom addon-stegene.
+
+Før: CSS-injeksjon, feed-injeksjon og content intelligence kalte hver
+sin get_content(), dekomprimerte og parset den samme responsen på nytt
+- og CSS-stien gzip-et på toppen av set_content() sin egen encoding.
+Nå:
+
+1. DecodedBody.for_flow(flow) henger ett objekt på flow.metadata
+2. content (bytes), text (str) og json() materialiseres lazy, hver
+   maks én gang, avledet fra den representasjonen som sist ble satt.
+   Steg som dekoder feed-items selv (splice-injeksjon) legger dem i
+   feed_items, så analyse-pipelinen ikke parser JSON-en på nytt
+3. Et steg som endrer body kaller set_content/set_text/set_json -
+   copy-on-write: de andre representasjonene invalideres, ingenting
+   re-encodes ennå
+4. commit() skriver til responsen én gang ved slutten av hooken;
+   mitmproxy re-encoder (gzip/br) etter content-encoding én gang.
+   commit_flow() fjerner objektet fra flow.metadata - metadata
+   deep-copies av mitmproxy ved lagring (-w, mitmweb)
+
+Mutasjon av objektet fra json() uten set_json() er ikke synlig for
+andre steg - eieren av endringen må kalle set_json().
+"""
+
+import json
+import logging
+from typing import Any
+
+logger = logging.getLogger('aiki.flow_body')
+
+_UNSET = object()
+
+
+class DecodedBody:
+    """
+    Lazy dekodet body for én HTTP-melding (normalt flow.response)
+
+    Bruk:
+        body = DecodedBody.for_flow(flow)
+        html = body.text
+        body.set_text(html.replace('<head>', '<head>' + css, 1))
+        ...
+        DecodedBody.commit_flow(flow)  # én re-encoding
+    """
+
+    METADATA_KEY = 'aiki_body'
+
+    def __init__(self, message):
+        self._message = message
+        self._content: bytes | None | object = _UNSET
+        self._text: str | object = _UNSET
+        self._json: Any = _UNSET
+        self.dirty = False
+        # Originale feed-items dekodet av et steg (uendret av set_*)
+        self.feed_items: list[dict] | None = None
+
+        self.stats = {
+            'decodes': 0,
+            'text_decodes': 0,
+            'json_parses': 0,
+            'encodes': 0,
+            'mutations': 0
+        }
+
+    @classmethod
+    def for_flow(cls, flow) -> 'DecodedBody':
+        """Hent (eller opprett) flowens delte response-body"""
+        body = flow.metadata.get(cls.METADATA_KEY)
+        if body is None or body._message is not flow.response:
+            body = cls(flow.response)
+            flow.metadata[cls.METADATA_KEY] = body
+        return body
+
+    @classmethod
+    def commit_flow(cls, flow) -> bool:
+        """Skriv endret body til flowen og slipp objektet (no-op hvis uendret)"""
+        body = flow.metadata.pop(cls.METADATA_KEY, None)
+        if body is None:
+            return False
+        return body.commit()
+
+    # === LESING ===
+
+    @property
+    def content(self) -> bytes | None:
+        """Dekodede bytes (content-encoding fjernet)"""
+        if self._content is _UNSET:
+            if self._text is not _UNSET:
+                self._content = self._text.encode('utf-8', errors='surrogateescape')
+                self.stats['encodes'] += 1
+            elif self._json is not _UNSET:
+                self._content = json.dumps(self._json, ensure_ascii=False).encode('utf-8')
+                self.stats['encodes'] += 1
+            else:
+                self._content = self._message.get_content(strict=False)
+                self.stats['decodes'] += 1
+        return self._content
+
+    @property
+    def text(self) -> str:
+        """Body som str (tapsfri rundtur for ugyldig UTF-8)"""
+        if self._text is _UNSET:
+            self._text = (self.content or b'').decode('utf-8', errors='surrogateescape')
+            self.stats['text_decodes'] += 1
+        return self._text
+
+    def json(self) -> Any:
+        """Parset JSON, None hvis body ikke er gyldig JSON (parses maks én gang)"""
+        if self._json is _UNSET:
+            self.stats['json_parses'] += 1
+            try:
+                self._json = json.loads(self.content or b'')
+            except ValueError:
+                self._json = None
+        return self._json
+
+    # === COPY-ON-WRITE ===
+
+    def set_content(self, content: bytes):
+        self._replace(content=content)
+
+    def set_text(self, text: str):
+        self._replace(text=text)
+
+    def set_json(self, data: Any):
+        self._replace(json_data=data)
+
+    def _replace(self, content: Any = _UNSET, text: Any = _UNSET, json_data: Any = _UNSET):
+        self._content = content
+        self._text = text
+        self._json = json_data
+        self.dirty = True
+        self.stats['mutations'] += 1
+
+    def commit(self) -> bool:
+        """Skriv body til meldingen én gang (mitmproxy re-encoder)"""
+        if not self.dirty:
+            return False
+        self._message.set_content(self.content)
+        self.dirty = False
+        return True
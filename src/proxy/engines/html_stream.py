@@ -0,0 +1,291 @@
+"""
+AIKI HTML Stream
+================
+
+Streaming-injeksjon av markup (CSS/JS/overlays) i HTML-responser.
+
+Før: hele siden ble bufret av mitmproxy, dekodet til str og string-
+replacet før første byte gikk videre - store sider lå i minnet og
+klienten ventet til hele bodyen var mottatt.
+Nå:
+
+1. HtmlStreamInjector.attach(response) kalles i responseheaders-hooken
+   og setter response.stream til en HtmlInjectionStream
+2. mitmproxy sender headers med en gang og gir oss bodyen chunk for chunk
+3. Chunks dekodes inkrementelt (gzip/deflate/br/zstd) og skannes etter
+   første </head> (settes inn foran) eller <body ...> (settes inn etter)
+   - kun en påbegynt tag på slutten av en chunk holdes igjen
+4. Etter injeksjon går resten av bodyen rett gjennom
+5. Ingen treff innen max_scan_bytes → siden sendes uendret
+
+Komprimerte bodyer re-komprimeres inkrementelt som gzip (sync flush per
+chunk, så klienten ikke venter på hele siden). Ukjent encoding gjør at
+attach() returnerer False - kalleren faller da tilbake til bufret
+injeksjon via DecodedBody.
+"""
+
+import logging
+import re
+import zlib
+from typing import Callable
+
+logger = logging.getLogger('aiki.html_stream')
+
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
+
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
+
+# Innsettingspunkt: foran </head>, ellers rett etter <body ...>
+_INSERTION_RE = re.compile(rb'</head\s*>|<body(?:\s[^>]*)?>', re.IGNORECASE)
+_CHARSET_RE = re.compile(r'charset\s*=\s*"?([\w.:-]+)', re.IGNORECASE)
+
+# Lengste påbegynte tag vi holder igjen mellom chunks
+MAX_TAG_BYTES = 1024
+
+
+def _decoder_factory(encoding: str) -> Callable[[], Callable[[bytes], bytes]] | None:
+    """Inkrementell dekoder for content-encoding, None hvis ikke støttet"""
+    if encoding in ('', 'identity'):
+        return None
+    if encoding in ('gzip', 'x-gzip', 'deflate'):
+        return _ZlibDecoder
+    if encoding == 'br' and BROTLI_AVAILABLE:
+        return lambda: brotli.Decompressor().process
+    if encoding == 'zstd' and ZSTD_AVAILABLE:
+        return lambda: zstandard.ZstdDecompressor().decompressobj().decompress
+    raise LookupError(encoding)
+
+
+class _ZlibDecoder:
+    """gzip/zlib, rå deflate og gzip med flere members"""
+
+    def __init__(self):
+        self._obj = None
+        self._head = b''
+
+    def __call__(self, data: bytes) -> bytes:
+        if self._obj is None:
+            # Trenger to bytes for å skille gzip/zlib fra rå deflate
+            self._head += data
+            if len(self._head) < 2:
+                return b''
+            data, self._head = self._head, b''
+            self._obj = zlib.decompressobj(self._wbits(data))
+
+        out = self._obj.decompress(data)
+        while self._obj.eof and self._obj.unused_data:
+            rest = self._obj.unused_data
+            self._obj = zlib.decompressobj(32 + zlib.MAX_WBITS)
+            out += self._obj.decompress(rest)
+        return out
+
+    @staticmethod
+    def _wbits(head: bytes) -> int:
+        if head[:2] == b'\x1f\x8b':
+            return 16 + zlib.MAX_WBITS
+        if head[0] & 0x0f == 8 and (head[0] << 8 | head[1]) % 31 == 0:
+            return zlib.MAX_WBITS
+        # "deflate" uten zlib-header (IIS m.fl.)
+        return -zlib.MAX_WBITS
+
+
+class HtmlInjectionStream:
+    """
+    response.stream-callable for én respons
+
+    mitmproxy kaller stream(chunk) for hver chunk og stream(b"") ved slutt.
+    Returnerer alltid en liste - en tom bytes-chunk ville avsluttet en
+    chunked HTTP/1-respons for tidlig.
+    """
+
+    def __init__(self, injector: 'HtmlStreamInjector', markup: bytes,
+                 decoder: Callable[[bytes], bytes] | None = None):
+        self._injector = injector
+        self._markup = markup
+        self._decode = decoder
+        self._encoder = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS) if decoder else None
+
+        self._pending = b''
+        self._tail = b''  # slutten av allerede sendt tekst, for marker-sjekk
+        self._marker_seen = False
+        self._scanned = 0
+        self.scanning = True
+        self.injected = False
+        self.failed = False
+
+    def __call__(self, data: bytes) -> list[bytes]:
+        if self.failed:
+            return []
+
+        # Ferdig skannet og ukomprimert: rett gjennom, ingen kopi
+        if not self.scanning and self._decode is None:
+            self._injector.stats['bytes_streamed'] += len(data)
+            return [data] if data else []
+
+        try:
+            if self._decode is None:
+                decoded = data
+            elif data:
+                decoded = self._decode(data)
+            else:
+                decoded = b''
+        except Exception as e:
+            # Korrupt body: headers er sendt, så vi kan bare stoppe
+            self.failed = True
+            self._injector.stats['decode_errors'] += 1
+            logger.warning(f"HTML stream decode error: {e}")
+            return []
+
+        out = self._scan(decoded) if self.scanning else decoded
+
+        if not data:
+            # Slutt på body: send det som er holdt igjen uendret
+            if self.scanning:
+                out += self._pending
+                self._pending = b''
+                self.scanning = False
+                self._injector.stats['not_found'] += 1
+
+        return self._emit(out, final=not data)
+
+    def _scan(self, decoded: bytes) -> bytes:
+        """Let etter innsettingspunkt; returner bytes som kan sendes nå"""
+        buf = self._pending + decoded if self._pending else decoded
+        self._pending = b''
+
+        match = _INSERTION_RE.search(buf)
+        if match:
+            self.scanning = False
+            marker = self._injector.marker
+            if self._marker_seen or (marker and marker in self._tail + buf[:match.start()]):
+                # Allerede injisert (f.eks. cachet side fra oss selv)
+                self._injector.stats['already_present'] += 1
+                return buf
+            self.injected = True
+            self._injector.stats['injected'] += 1
+            if match.group(0)[1:2] == b'/':
+                pos = match.start()  # foran </head>
+            else:
+                pos = match.end()  # etter <body ...>
+            return buf[:pos] + self._markup + buf[pos:]
+
+        # Hold igjen en eventuell påbegynt tag til neste chunk
+        cut = buf.rfind(b'<')
+        if cut != -1 and b'>' not in buf[cut:] and len(buf) - cut <= MAX_TAG_BYTES:
+            self._pending = buf[cut:]
+            buf = buf[:cut]
+            held = len(self._pending)
+            if held > self._injector.stats['max_held_bytes']:
+                self._injector.stats['max_held_bytes'] = held
+
+        self._scanned += len(buf)
+        marker = self._injector.marker
+        if marker and not self._marker_seen:
+            window = self._tail + buf
+            self._marker_seen = marker in window
+            self._tail = window[-len(marker):]
+        if self._scanned > self._injector.max_scan_bytes:
+            # Gi opp - resten går uendret gjennom
+            self.scanning = False
+            self._injector.stats['gave_up'] += 1
+            buf += self._pending
+            self._pending = b''
+        return buf
+
+    def _emit(self, out: bytes, final: bool) -> list[bytes]:
+        if self._encoder is not None:
+            out = self._encoder.compress(out)
+            out += self._encoder.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+        if out:
+            self._injector.stats['bytes_streamed'] += len(out)
+            return [out]
+        return []
+
+
+class HtmlStreamInjector:
+    """
+    Setter inn markup i HTML-responser mens de strømmes
+
+    Bruk (i responseheaders-hooken):
+        injector = HtmlStreamInjector(css_markup, marker='aiki-tiktok-cleanup')
+        if injector.attach(flow.response):
+            flow.metadata['aiki_streamed'] = True
+    """
+
+    DEFAULT_MAX_SCAN_BYTES = 512 * 1024
+
+    def __init__(self, markup: str | bytes, marker: str | bytes | None = None,
+                 max_scan_bytes: int = DEFAULT_MAX_SCAN_BYTES):
+        self.markup = markup
+        self.marker = marker.encode() if isinstance(marker, str) else marker
+        self.max_scan_bytes = max_scan_bytes
+
+        self.stats = {
+            'attached': 0,
+            'injected': 0,
+            'already_present': 0,
+            'not_found': 0,
+            'gave_up': 0,
+            'unsupported_encoding': 0,
+            'decode_errors': 0,
+            'bytes_streamed': 0,
+            'max_held_bytes': 0
+        }
+
+    def attach(self, response) -> bool:
+        """
+        Slå på streaming-injeksjon for en respons (kun headers mottatt)
+
+        Returnerer False hvis responsen ikke er HTML, allerede strømmes
+        eller har en encoding vi ikke kan dekode inkrementelt.
+        """
+        headers = response.headers
+        content_type = headers.get('content-type', '')
+        if 'text/html' not in content_type.lower() or response.stream:
+            return False
+
+        encoding = headers.get('content-encoding', '').strip().lower()
+        try:
+            factory = _decoder_factory(encoding)
+        except LookupError:
+            self.stats['unsupported_encoding'] += 1
+            return False
+
+        response.stream = HtmlInjectionStream(
+            self, self._encode_markup(content_type), factory() if factory else None
+        )
+
+        # Lengden endres - HTTP/1.1 trenger chunked når content-length fjernes
+        headers.pop('content-length', None)
+        if response.http_version == 'HTTP/1.1' and \
+                'chunked' not in headers.get('transfer-encoding', '').lower():
+            headers['transfer-encoding'] = 'chunked'
+        if factory:
+            headers['content-encoding'] = 'gzip'
+
+        self.stats['attached'] += 1
+        return True
+
+    def _encode_markup(self, content_type: str) -> bytes:
+        """Markup i sidens charset (utf-8 hvis ukjent)"""
+        if isinstance(self.markup, bytes):
+            return self.markup
+        match = _CHARSET_RE.search(content_type)
+        if match:
+            try:
+                return self.markup.encode(match.group(1), errors='xmlcharrefreplace')
+            except LookupError:
+                pass
+        return self.markup.encode('utf-8')
+
+    def get_stats(self) -> dict:
+        return dict(self.stats)
@@ -0,0 +1,384 @@
+"""
+AIKI Rollup Log
+===============
+
+Tidspartisjonerte logg-tabeller med materialiserte time- og døgn-rollups.
+
+Før: traffic_log, throttle_events, sessions og alerts vokste uten
+grense, og rapporter aggregerte med full scan. Nå:
+
+1. Rå rader skrives til månedspartisjoner ({navn}_pYYYYMM) via EventSink
+2. Hver rad akkumuleres i minnet til (time, dimensjoner) og
+   (dag, dimensjoner); deltaene UPSERTes periodisk til
+   {navn}_hourly og {navn}_daily
+3. Downsampling: partisjoner eldre enn raw_retention_days droppes
+   (DROP TABLE - ingen DELETE-scan), time-rollups eldre enn
+   hourly_retention_days slettes. Døgn-rollups beholdes.
+4. Rapporter leser rollups - kostnad følger antall dager, ikke rader
+
+En eksisterende upartisjonert tabell med samme navn behandles som
+legacy-partisjon: den backfilles til rollups én gang og ryddes med
+samme retention.
+"""
+
+import atexit
+import logging
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Callable
+
+from .event_sink import get_event_sink
+
+logger = logging.getLogger('aiki.rollup_log')
+
+GRANULARITIES = ('hourly', 'daily')
+
+
+class RollupLog:
+    """
+    Partisjonert rå-logg + time/døgn-rollups for én logg-tabell
+
+    Bruk:
+        log = RollupLog(db_path, 'throttle_events', schema,
+                        time_column='timestamp',
+                        dimensions=('user_id', 'app_name'),
+                        measures={'events': lambda r: 1,
+                                  'delay_ms': lambda r: r['delay_ms']})
+        log.record({'timestamp': now_iso, 'user_id': 'kid', ...})
+        log.query('daily', since='2025-11-01', user_id='kid')
+    """
+
+    def __init__(
+        self,
+        db_path: str | Path,
+        name: str,
+        schema: str,
+        time_column: str,
+        dimensions: tuple[str, ...],
+        measures: dict[str, Callable[[dict], float]],
+        epoch_time: bool = False,
+        raw_retention_days: int = 30,
+        hourly_retention_days: int = 180,
+        flush_interval: float = 30.0,
+        maintenance_interval: float = 3600.0
+    ):
+        self.db_path = Path(db_path)
+        self.name = name
+        self.schema = schema
+        self.time_column = time_column
+        self.dimensions = dimensions
+        self.measures = measures
+        self.epoch_time = epoch_time
+        self.raw_retention_days = raw_retention_days
+        self.hourly_retention_days = hourly_retention_days
+        self.flush_interval = flush_interval
+        self.maintenance_interval = maintenance_interval
+
+        # (granularitet, bucket, dims) -> [deltas per measure]
+        self._pending: dict[tuple[str, str, tuple], list[float]] = {}
+        self._partitions: set[str] = set()
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+        self._last_maintenance = 0.0
+
+        self._upsert_sql = {g: self._build_upsert(g) for g in GRANULARITIES}
+
+        self.stats = {
+            'recorded': 0,
+            'flushes': 0,
+            'rollup_rows_flushed': 0,
+            'partitions_dropped': 0,
+            'raw_dropped': 0,
+            'backfilled_rows': 0
+        }
+
+        # Skjema og backfill før sinken - writer-tråden skal ikke møte låst DB
+        self._init_tables()
+        self._backfill_legacy()
+        self._sink = get_event_sink(self.db_path)
+        _register(self)
+
+    # === SKJEMA ===
+
+    def _build_upsert(self, granularity: str) -> str:
+        keys = ('bucket',) + self.dimensions
+        columns = keys + tuple(self.measures)
+        return (
+            f"INSERT INTO {self.name}_{granularity} ({', '.join(columns)}) "
+            f"VALUES ({', '.join('?' for _ in columns)}) "
+            f"ON CONFLICT({', '.join(keys)}) DO UPDATE SET "
+            + ', '.join(f"{m} = {m} + excluded.{m}" for m in self.measures)
+        )
+
+    def _init_tables(self):
+        dims = ', '.join(f"{d} TEXT NOT NULL DEFAULT ''" for d in self.dimensions)
+        measures = ', '.join(f"{m} REAL DEFAULT 0" for m in self.measures)
+        keys = ', '.join(('bucket',) + self.dimensions)
+
+        with sqlite3.connect(self.db_path, timeout=30) as conn:
+            for granularity in GRANULARITIES:
+                conn.execute(f"""
+                    CREATE TABLE IF NOT EXISTS {self.name}_{granularity} (
+                        bucket TEXT NOT NULL, {dims}, {measures},
+                        PRIMARY KEY ({keys})
+                    )
+                """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS rollup_meta (
+                    name TEXT PRIMARY KEY,
+                    backfilled_at TEXT
+                )
+            """)
+            rows = conn.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table'"
+            ).fetchall()
+            # Upartisjonert tabell fra før RollupLog - slås opp én gang her,
+            # så maintain() ikke åpner connections fra request-pathen
+            self._legacy = any(r[0] == self.name for r in rows)
+            prefix = f"{self.name}_p"
+            self._partitions = {
+                r[0] for r in rows
+                if r[0].startswith(prefix) and r[0][len(prefix):].isdigit()
+            }
+
+    def _partition_for(self, dt: datetime) -> str | None:
+        """
+        Hent (og opprett ved behov) månedspartisjon for tidspunkt
+
+        Returnerer None hvis CREATE ikke kom i køen (full sink) - da
+        prøves det igjen ved neste rad i stedet for å sende INSERTs
+        mot en tabell som ikke finnes.
+        """
+        partition = f"{self.name}_p{dt:%Y%m}"
+        if partition not in self._partitions:
+            with self._lock:
+                if partition not in self._partitions:
+                    # Via sinken så CREATE kommer før første INSERT
+                    created = self._sink.submit(
+                        f"CREATE TABLE IF NOT EXISTS {partition} ({self.schema})"
+                    ) and self._sink.submit(
+                        f"CREATE INDEX IF NOT EXISTS idx_{partition}_time "
+                        f"ON {partition}({self.time_column})"
+                    )
+                    if not created:
+                        return None
+                    self._partitions.add(partition)
+        return partition
+
+    # === SKRIVING ===
+
+    def _to_datetime(self, value: Any) -> datetime:
+        if self.epoch_time:
+            return datetime.fromtimestamp(value)
+        return datetime.fromisoformat(value)
+
+    def _accumulate(self, row: dict, dt: datetime):
+        dims = tuple('' if row.get(d) is None else str(row[d]) for d in self.dimensions)
+        values = [float(fn(row) or 0) for fn in self.measures.values()]
+
+        for granularity, bucket in (('hourly', f"{dt:%Y-%m-%d %H}"),
+                                    ('daily', f"{dt:%Y-%m-%d}")):
+            key = (granularity, bucket, dims)
+            pending = self._pending.get(key)
+            if pending is None:
+                self._pending[key] = list(values)
+            else:
+                for i, value in enumerate(values):
+                    pending[i] += value
+
+    def record(self, row: dict):
+        """Skriv rå rad (write-behind) og oppdater rollups i minnet - O(1)"""
+        dt = self._to_datetime(row[self.time_column])
+        partition = self._partition_for(dt)
+
+        if partition is None:
+            self.stats['raw_dropped'] += 1
+        else:
+            columns = list(row)
+            self._sink.submit(
+                f"INSERT INTO {partition} ({', '.join(columns)}) "
+                f"VALUES ({', '.join('?' for _ in columns)})",
+                tuple(row.values())
+            )
+
+        with self._lock:
+            self._accumulate(row, dt)
+            self.stats['recorded'] += 1
+
+        self._maybe_flush()
+
+    def _maybe_flush(self):
+        now = time.monotonic()
+        if now - self._last_flush >= self.flush_interval:
+            self.flush()
+        if now - self._last_maintenance >= self.maintenance_interval:
+            self._last_maintenance = now
+            self.maintain()
+
+    def flush(self):
+        """UPSERT akkumulerte deltaer til rollup-tabellene"""
+        with self._lock:
+            self._last_flush = time.monotonic()
+            pending, self._pending = self._pending, {}
+
+        for (granularity, bucket, dims), values in pending.items():
+            self._sink.submit(self._upsert_sql[granularity], (bucket,) + dims + tuple(values))
+
+        if pending:
+            self.stats['flushes'] += 1
+            self.stats['rollup_rows_flushed'] += len(pending)
+
+    # === BACKFILL / RETENTION ===
+
+    def _backfill_legacy(self):
+        """Aggreger eksisterende upartisjonert tabell til rollups (én gang)"""
+        try:
+            with sqlite3.connect(self.db_path, timeout=30) as conn:
+                conn.row_factory = sqlite3.Row
+                exists = conn.execute(
+                    "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+                    (self.name,)
+                ).fetchone()
+                done = conn.execute(
+                    "SELECT 1 FROM rollup_meta WHERE name = ?", (self.name,)
+                ).fetchone()
+                if not exists or done:
+                    return
+
+                # Samme transaksjon som markøren - avbrutt backfill gir ingen dobbelttelling
+                conn.execute(
+                    f"CREATE INDEX IF NOT EXISTS idx_{self.name}_time ON {self.name}({self.time_column})"
+                )
+                cursor = conn.execute(f"SELECT * FROM {self.name}")
+                rows = 0
+                while True:
+                    chunk = cursor.fetchmany(10_000)
+                    if not chunk:
+                        break
+                    pending_before, self._pending = self._pending, {}
+                    for row in chunk:
+                        row = dict(row)
+                        try:
+                            self._accumulate(row, self._to_datetime(row[self.time_column]))
+                        except (TypeError, ValueError):
+                            continue
+                    for (granularity, bucket, dims), values in self._pending.items():
+                        conn.execute(self._upsert_sql[granularity], (bucket,) + dims + tuple(values))
+                    self._pending = pending_before
+                    rows += len(chunk)
+
+                conn.execute(
+                    "INSERT OR REPLACE INTO rollup_meta (name, backfilled_at) VALUES (?, ?)",
+                    (self.name, datetime.now().isoformat())
+                )
+                self.stats['backfilled_rows'] = rows
+                if rows:
+                    logger.info(f"Rollup backfill {self.name}: {rows} legacy rows")
+        except sqlite3.Error as e:
+            logger.error(f"Rollup backfill error ({self.name}): {e}")
+
+    def maintain(self):
+        """Downsampling: dropp gamle partisjoner, slett gamle time-rollups"""
+        raw_cutoff = datetime.now() - timedelta(days=self.raw_retention_days)
+        hourly_cutoff = datetime.now() - timedelta(days=self.hourly_retention_days)
+
+        # Partisjon for måned M kan droppes når hele måneden er eldre enn cutoff
+        oldest_kept = f"{self.name}_p{raw_cutoff:%Y%m}"
+        with self._lock:
+            expired = sorted(p for p in self._partitions if p < oldest_kept)
+            self._partitions.difference_update(expired)
+        for partition in expired:
+            if self._sink.submit(f"DROP TABLE IF EXISTS {partition}"):
+                self.stats['partitions_dropped'] += 1
+            else:
+                # Full kø - prøv igjen ved neste vedlikehold
+                with self._lock:
+                    self._partitions.add(partition)
+
+        cutoff_value = raw_cutoff.timestamp() if self.epoch_time else raw_cutoff.isoformat()
+        if self._legacy:
+            self._sink.submit(
+                f"DELETE FROM {self.name} WHERE {self.time_column} < ?", (cutoff_value,)
+            )
+        self._sink.submit(
+            f"DELETE FROM {self.name}_hourly WHERE bucket < ?", (f"{hourly_cutoff:%Y-%m-%d %H}",)
+        )
+
+    # === LESING ===
+
+    def query(
+        self,
+        granularity: str = 'daily',
+        since: str | None = None,
+        until: str | None = None,
+        **filters
+    ) -> list[dict]:
+        """
+        Les rollups (flusher ventende deltaer først)
+
+        since/until er bucket-strenger: 'YYYY-MM-DD' for daily,
+        'YYYY-MM-DD HH' for hourly. until er eksklusiv.
+        """
+        if granularity not in GRANULARITIES:
+            raise ValueError(f"Unknown granularity: {granularity}")
+
+        self.flush()
+        self._sink.flush()
+
+        clauses, params = [], []
+        if since:
+            clauses.append("bucket >= ?")
+            params.append(since)
+        if until:
+            clauses.append("bucket < ?")
+            params.append(until)
+        for column, value in filters.items():
+            if column not in self.dimensions:
+                raise ValueError(f"Unknown dimension: {column}")
+            clauses.append(f"{column} = ?")
+            params.append(value)
+
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        with sqlite3.connect(self.db_path, timeout=30) as conn:
+            conn.row_factory = sqlite3.Row
+            rows = conn.execute(
+                f"SELECT * FROM {self.name}_{granularity} {where} ORDER BY bucket",
+                params
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def get_stats(self) -> dict:
+        """Hent statistikk"""
+        return {
+            **self.stats,
+            'pending': len(self._pending),
+            'partitions': sorted(self._partitions)
+        }
+
+
+# Alle rollup-logger i prosessen - for flush ved shutdown
+_logs: list[RollupLog] = []
+_logs_lock = threading.Lock()
+
+
+def _register(log: RollupLog):
+    with _logs_lock:
+        _logs.append(log)
+
+
+def flush_all_rollups():
+    """Flush alle rollup-logger (kall før close_all_sinks ved shutdown)"""
+    with _logs_lock:
+        logs = list(_logs)
+    for log in logs:
+        try:
+            log.flush()
+        except Exception as e:
+            logger.error(f"Rollup flush error ({log.name}): {e}")
+
+
+# Registreres etter event_sink sin atexit-hook, og kjører dermed før den
+atexit.register(flush_all_rollups)
@@ -20,13 +20,18 @@ import hashlib
 import struct
 import sqlite3
 import json
-from dataclasses import dataclass, field, asdict
-from datetime import datetime
+import threading
+import time
+from dataclasses import dataclass, field, asdict, replace
+from datetime import datetime, timedelta
 from pathlib import Path
 from typing import Optional, List, Dict, Set, Tuple
-from collections import defaultdict
+from collections import OrderedDict, defaultdict, deque
 import logging
 
+from .event_sink import get_event_sink
+from .ttl_cache import TTLCache
+
 logger = logging.getLogger("aiki.tls_fingerprint")
 
 # Database path
@@ -89,66 +94,70 @@ class JA3Calculator:
         0xcaca, 0xdada, 0xeaea, 0xfafa
     }
 
+    # Forhåndskompilerte struct-formater - unpack_from leser direkte fra
+    # bufferen uten å lage slice-kopier
+    _U16 = struct.Struct(">H")
+    _EXT_HEADER = struct.Struct(">HH")
+
     @classmethod
     def calculate(cls, client_hello: bytes) -> Optional[TLSFingerprint]:
         """
         Parse TLS ClientHello og generer JA3 fingerprint.
 
         JA3 format: SSLVersion,Ciphers,Extensions,EllipticCurves,EllipticCurvePointFormats
+
+        Parseren jobber på en memoryview med offsets: ingen bytes-slicing
+        per felt eller per extension, kun SNI-navnet kopieres ut.
         """
         try:
-            # Skip record layer header (5 bytes)
-            # Record type (1) + Version (2) + Length (2)
-            if len(client_hello) < 5:
-                return None
+            buf = memoryview(client_hello)
+            end = len(buf)
+            u16 = cls._U16.unpack_from
+            grease = cls.GREASE_VALUES
 
-            record_type = client_hello[0]
-            if record_type != 0x16:  # Handshake
+            # Record layer header (5 bytes): type (1) + version (2) + length (2)
+            if end < 6 or buf[0] != 0x16:  # Handshake
                 return None
 
             # Handshake header
-            handshake_type = client_hello[5]
-            if handshake_type != 0x01:  # ClientHello
+            if buf[5] != 0x01:  # ClientHello
                 return None
 
             # Parse ClientHello
             pos = 9  # Skip to version in ClientHello
 
             # Client version (2 bytes)
-            if pos + 2 > len(client_hello):
+            if pos + 2 > end:
                 return None
-            ssl_version = struct.unpack(">H", client_hello[pos:pos+2])[0]
+            ssl_version = u16(buf, pos)[0]
             pos += 2
 
             # Random (32 bytes)
             pos += 32
 
             # Session ID
-            if pos >= len(client_hello):
+            if pos >= end:
                 return None
-            session_id_len = client_hello[pos]
-            pos += 1 + session_id_len
+            pos += 1 + buf[pos]
 
             # Cipher suites
-            if pos + 2 > len(client_hello):
+            if pos + 2 > end:
                 return None
-            cipher_len = struct.unpack(">H", client_hello[pos:pos+2])[0]
+            cipher_len = u16(buf, pos)[0]
             pos += 2
+            cipher_end = min(pos + cipher_len, end)
+            cipher_end -= (cipher_end - pos) % 2
 
-            cipher_suites = []
-            for i in range(0, cipher_len, 2):
-                if pos + 2 > len(client_hello):
-                    break
-                cipher = struct.unpack(">H", client_hello[pos:pos+2])[0]
-                if cipher not in cls.GREASE_VALUES:
-                    cipher_suites.append(cipher)
-                pos += 2
+            cipher_suites = [
+                c for (c,) in cls._U16.iter_unpack(buf[pos:cipher_end])
+                if c not in grease
+            ]
+            pos += cipher_len
 
             # Compression methods
-            if pos >= len(client_hello):
+            if pos >= end:
                 return None
-            comp_len = client_hello[pos]
-            pos += 1 + comp_len
+            pos += 1 + buf[pos]
 
             # Extensions
             extensions = []
@@ -156,53 +165,48 @@ class JA3Calculator:
             ec_point_formats = []
             sni = None
 
-            if pos + 2 <= len(client_hello):
-                ext_len = struct.unpack(">H", client_hello[pos:pos+2])[0]
+            if pos + 2 <= end:
+                ext_end = min(pos + 2 + u16(buf, pos)[0], end)
                 pos += 2
-                ext_end = pos + ext_len
 
-                while pos + 4 <= ext_end and pos + 4 <= len(client_hello):
-                    ext_type = struct.unpack(">H", client_hello[pos:pos+2])[0]
-                    ext_data_len = struct.unpack(">H", client_hello[pos+2:pos+4])[0]
+                while pos + 4 <= ext_end:
+                    ext_type, ext_data_len = cls._EXT_HEADER.unpack_from(buf, pos)
                     pos += 4
+                    data_end = min(pos + ext_data_len, end)
 
-                    if ext_type not in cls.GREASE_VALUES:
+                    if ext_type not in grease:
                         extensions.append(ext_type)
 
-                    ext_data = client_hello[pos:pos+ext_data_len]
-
                     # Parse SNI (extension 0)
-                    if ext_type == 0 and len(ext_data) > 5:
-                        name_len = struct.unpack(">H", ext_data[3:5])[0]
-                        if 5 + name_len <= len(ext_data):
-                            sni = ext_data[5:5+name_len].decode('utf-8', errors='ignore')
+                    if ext_type == 0 and data_end - pos > 5:
+                        name_len = u16(buf, pos + 3)[0]
+                        if pos + 5 + name_len <= data_end:
+                            sni = bytes(buf[pos + 5:pos + 5 + name_len]).decode('utf-8', errors='ignore')
 
                     # Supported groups (extension 10)
-                    elif ext_type == 10 and len(ext_data) >= 2:
-                        groups_len = struct.unpack(">H", ext_data[0:2])[0]
-                        for i in range(2, min(2 + groups_len, len(ext_data)), 2):
-                            if i + 2 <= len(ext_data):
-                                group = struct.unpack(">H", ext_data[i:i+2])[0]
-                                if group not in cls.GREASE_VALUES:
-                                    supported_groups.append(group)
+                    elif ext_type == 10 and data_end - pos >= 2:
+                        groups_end = min(pos + 2 + u16(buf, pos)[0], data_end)
+                        groups_end -= (groups_end - pos - 2) % 2
+                        supported_groups.extend(
+                            g for (g,) in cls._U16.iter_unpack(buf[pos + 2:groups_end])
+                            if g not in grease
+                        )
 
                     # EC point formats (extension 11)
-                    elif ext_type == 11 and len(ext_data) >= 1:
-                        formats_len = ext_data[0]
-                        for i in range(1, min(1 + formats_len, len(ext_data))):
-                            ec_point_formats.append(ext_data[i])
+                    elif ext_type == 11 and data_end - pos >= 1:
+                        formats_end = min(pos + 1 + buf[pos], data_end)
+                        ec_point_formats.extend(buf[pos + 1:formats_end])
 
                     pos += ext_data_len
 
             # Build JA3 string
-            ja3_parts = [
+            ja3_full = ",".join((
                 str(ssl_version),
-                "-".join(str(c) for c in cipher_suites),
-                "-".join(str(e) for e in extensions),
-                "-".join(str(g) for g in supported_groups),
-                "-".join(str(f) for f in ec_point_formats)
-            ]
-            ja3_full = ",".join(ja3_parts)
+                "-".join(map(str, cipher_suites)),
+                "-".join(map(str, extensions)),
+                "-".join(map(str, supported_groups)),
+                "-".join(map(str, ec_point_formats))
+            ))
             ja3_hash = hashlib.md5(ja3_full.encode()).hexdigest()
 
             return TLSFingerprint(
@@ -219,6 +223,51 @@ class JA3Calculator:
             logger.error(f"JA3 calculation error: {e}")
             return None
 
+    # Extensions med data som er unik per handshake (pre_shared_key,
+    # padding, session_ticket, key_share, ECH) - kun type/lengde hashes
+    _VOLATILE_EXTENSIONS = {41, 21, 35, 51, 0xfe0d}
+
+    @classmethod
+    def hello_key(cls, client_hello: bytes) -> Optional[bytes]:
+        """
+        Memo-nøkkel for en ClientHello
+
+        Hash av rå bytes, men uten random, session ID og data i
+        per-handshake extensions (key_share osv.) - ellers ville hver
+        TLS 1.3-handshake fått ny nøkkel. Klienter som randomiserer
+        GREASE eller extension-rekkefølge får fortsatt lav hit rate.
+        """
+        buf = memoryview(client_hello)
+        end = len(buf)
+        if end < 44:
+            return None
+
+        h = hashlib.blake2b(digest_size=16)
+        h.update(buf[:11])
+
+        # Hopp over random + session ID
+        pos = 44 + buf[43]
+        if pos + 2 > end:
+            return None
+        pos += 2 + cls._U16.unpack_from(buf, pos)[0]   # cipher suites
+        if pos >= end:
+            return None
+        pos += 1 + buf[pos]                            # compression
+        h.update(buf[44 + buf[43]:min(pos, end)])
+        if pos + 2 > end:
+            return h.digest()
+
+        pos += 2
+        while pos + 4 <= end:
+            ext_type, ext_len = cls._EXT_HEADER.unpack_from(buf, pos)
+            if ext_type in cls._VOLATILE_EXTENSIONS:
+                h.update(buf[pos:pos + 4])
+            else:
+                h.update(buf[pos:min(pos + 4 + ext_len, end)])
+            pos += 4 + ext_len
+
+        return h.digest()
+
     @classmethod
     def calculate_ja4(cls, fingerprint: TLSFingerprint) -> str:
         """
@@ -267,6 +316,61 @@ class JA3Calculator:
         return f"t{ver_str}{sni_ind}{cipher_count:02d}{ext_count:02d}_{cipher_hash}_{ext_hash}"
 
 
+class SlidingWindowCounter:
+    """
+    Suksess/feil-tellere over et glidende vindu, i faste bøtter
+
+    add() og totals() er amortisert O(1): utløpte bøtter fjernes fra
+    venstre, og løpende summer holdes oppdatert.
+    """
+
+    def __init__(self, window_seconds: int = 3600, bucket_seconds: int = 60):
+        self.window = window_seconds
+        self.bucket_seconds = bucket_seconds
+        # [bucket_start, successes, failures], eldste først
+        self.buckets: deque[list[int]] = deque()
+        self.successes = 0
+        self.failures = 0
+
+    def _expire(self, now: float):
+        cutoff = now - self.window
+        while self.buckets and self.buckets[0][0] + self.bucket_seconds <= cutoff:
+            _, successes, failures = self.buckets.popleft()
+            self.successes -= successes
+            self.failures -= failures
+
+    def add(self, success: bool, now: float | None = None, count: int = 1) -> list[int]:
+        """Tell en observasjon; returnerer bøtta den havnet i"""
+        now = time.time() if now is None else now
+        start = int(now // self.bucket_seconds * self.bucket_seconds)
+        self._expire(now)
+
+        if self.buckets and self.buckets[-1][0] == start:
+            bucket = self.buckets[-1]
+        elif self.buckets and self.buckets[-1][0] > start:
+            # Klokka gikk bakover - tell i nyeste bøtte
+            bucket = self.buckets[-1]
+        else:
+            bucket = [start, 0, 0]
+            self.buckets.append(bucket)
+
+        if success:
+            bucket[1] += count
+            self.successes += count
+        else:
+            bucket[2] += count
+            self.failures += count
+        return bucket
+
+    def totals(self, now: float | None = None) -> tuple[int, int]:
+        """(totalt, feil) innenfor vinduet"""
+        self._expire(time.time() if now is None else now)
+        return self.successes + self.failures, self.failures
+
+    def __bool__(self) -> bool:
+        return bool(self.buckets)
+
+
 class FingerprintDatabase:
     """Database for fingerprints med ML-clustering"""
 
@@ -289,11 +393,34 @@ class FingerprintDatabase:
         ),
     }
 
+    # Pinning-deteksjon: glidende vindu per JA3
+    PINNING_WINDOW = 3600          # sekunder
+    PINNING_MIN_CONNECTIONS = 5
+    PINNING_FAILURE_RATE = 0.8
+    WINDOW_PERSIST_INTERVAL = 30   # sekunder mellom checkpoint av vinduer
+
+    # Retention: connection_log eldre enn dette rulles opp per dag og slettes
+    CONNECTION_LOG_RETENTION_DAYS = 7
+    RETENTION_INTERVAL = 3600      # sekunder mellom retention-kjøringer
+
     def __init__(self):
         self._init_db()
-        self.fingerprint_cache: Dict[str, AppProfile] = dict(self.KNOWN_FINGERPRINTS)
+        self.event_sink = get_event_sink(DB_PATH)
+        # Baseline-profiler utløper aldri; DB-oppslag caches med TTL.
+        # Ukjente JA3 caches som False en kort stund så nye klienter
+        # ikke gir ett SQLite-oppslag per connection.
+        self.fingerprint_cache = TTLCache(maxsize=10_000, ttl=3600)
+        self.negative_ttl = 60
         self.unknown_fingerprints: Dict[str, List[TLSFingerprint]] = defaultdict(list)
 
+        # ja3 -> vindu; dirty bøtter checkpointes som absolutte verdier
+        self.pinning_windows: Dict[str, SlidingWindowCounter] = {}
+        self._dirty_buckets: Dict[Tuple[str, int], list] = {}
+        self._windows_lock = threading.Lock()
+        self._last_persist = time.monotonic()
+        self._last_retention = 0.0
+        self._load_windows()
+
     def _init_db(self):
         """Initialize SQLite database"""
         conn = sqlite3.connect(str(DB_PATH))
@@ -339,17 +466,64 @@ class FingerprintDatabase:
                 metadata TEXT
             );
 
+            -- Per-minutt bøtter for pinning-vinduet (overlever restart)
+            CREATE TABLE IF NOT EXISTS pinning_window (
+                ja3 TEXT,
+                bucket INTEGER,
+                successes INTEGER DEFAULT 0,
+                failures INTEGER DEFAULT 0,
+                PRIMARY KEY (ja3, bucket)
+            );
+
+            -- Dagsoppsummering av connection_log etter retention
+            CREATE TABLE IF NOT EXISTS connection_daily (
+                day TEXT,
+                ja3 TEXT,
+                sni TEXT,
+                successes INTEGER DEFAULT 0,
+                failures INTEGER DEFAULT 0,
+                PRIMARY KEY (day, ja3, sni)
+            );
+
             CREATE INDEX IF NOT EXISTS idx_conn_ja3 ON connection_log(ja3);
             CREATE INDEX IF NOT EXISTS idx_conn_sni ON connection_log(sni);
+            CREATE INDEX IF NOT EXISTS idx_conn_ja3_ts ON connection_log(ja3, timestamp);
+            CREATE INDEX IF NOT EXISTS idx_conn_ts ON connection_log(timestamp);
         """)
         conn.commit()
         conn.close()
 
+    def _load_windows(self):
+        """Last bøtter innenfor pinning-vinduet fra forrige kjøring"""
+        cutoff = int(time.time()) - self.PINNING_WINDOW
+        try:
+            with sqlite3.connect(str(DB_PATH)) as conn:
+                rows = conn.execute(
+                    "SELECT ja3, bucket, successes, failures FROM pinning_window "
+                    "WHERE bucket >= ? ORDER BY bucket",
+                    (cutoff,)
+                ).fetchall()
+        except sqlite3.Error as e:
+            logger.error(f"Could not load pinning windows: {e}")
+            return
+
+        for ja3, bucket, successes, failures in rows:
+            window = self.pinning_windows.setdefault(ja3, SlidingWindowCounter(self.PINNING_WINDOW))
+            if successes:
+                window.add(True, now=bucket, count=successes)
+            if failures:
+                window.add(False, now=bucket, count=failures)
+
     def lookup(self, fingerprint: TLSFingerprint) -> Optional[AppProfile]:
         """Look up app profile by fingerprint"""
-        # Check cache first
-        if fingerprint.ja3 in self.fingerprint_cache:
-            return self.fingerprint_cache[fingerprint.ja3]
+        # Check baseline and cache first
+        known = self.KNOWN_FINGERPRINTS.get(fingerprint.ja3)
+        if known:
+            return known
+
+        cached = self.fingerprint_cache.get(fingerprint.ja3)
+        if cached is not None:
+            return cached or None
 
         # Check database
         conn = sqlite3.connect(str(DB_PATH))
@@ -368,18 +542,18 @@ class FingerprintDatabase:
                 pinning_confidence=row[3] or 0.0
             )
             profile.known_fingerprints.add(fingerprint.ja3)
-            self.fingerprint_cache[fingerprint.ja3] = profile
+            self.fingerprint_cache.set(fingerprint.ja3, profile)
             return profile
 
+        self.fingerprint_cache.set(fingerprint.ja3, False, ttl=self.negative_ttl)
         return None
 
     def record(self, fingerprint: TLSFingerprint, success: bool, failure_reason: str = None):
-        """Record a fingerprint observation"""
-        conn = sqlite3.connect(str(DB_PATH))
+        """Record a fingerprint observation (write-behind via event sink)"""
         now = datetime.now().isoformat()
 
         # Update fingerprint record
-        conn.execute("""
+        self.event_sink.submit("""
             INSERT INTO fingerprints (ja3, ja3_full, ja4, first_seen, last_seen, hit_count)
             VALUES (?, ?, ?, ?, ?, 1)
             ON CONFLICT(ja3) DO UPDATE SET
@@ -389,7 +563,7 @@ class FingerprintDatabase:
 
         # Update domain association
         if fingerprint.sni:
-            conn.execute("""
+            self.event_sink.submit("""
                 INSERT INTO fingerprint_domains (ja3, domain, hit_count)
                 VALUES (?, ?, 1)
                 ON CONFLICT(ja3, domain) DO UPDATE SET
@@ -397,52 +571,127 @@ class FingerprintDatabase:
             """, (fingerprint.ja3, fingerprint.sni))
 
         # Log connection
-        conn.execute("""
+        self.event_sink.submit("""
             INSERT INTO connection_log (timestamp, client_ip, ja3, sni, success, failure_reason)
             VALUES (?, ?, ?, ?, ?, ?)
         """, (now, fingerprint.client_ip, fingerprint.ja3, fingerprint.sni,
               1 if success else 0, failure_reason))
 
-        conn.commit()
-        conn.close()
+        # Glidende vindu i minnet - ingen SQL i feil-pathen
+        with self._windows_lock:
+            window = self.pinning_windows.get(fingerprint.ja3)
+            if window is None:
+                window = SlidingWindowCounter(self.PINNING_WINDOW)
+                self.pinning_windows[fingerprint.ja3] = window
+            bucket = window.add(success)
+            self._dirty_buckets[(fingerprint.ja3, bucket[0])] = bucket
 
         # Update pinning detection
         if not success and "certificate" in (failure_reason or "").lower():
             self._update_pinning_detection(fingerprint.ja3)
 
-    def _update_pinning_detection(self, ja3: str):
-        """Update pinning detection based on failure patterns"""
-        conn = sqlite3.connect(str(DB_PATH))
-
-        # Get recent stats
-        cursor = conn.execute("""
-            SELECT
-                COUNT(*) as total,
-                SUM(CASE WHEN success = 0 THEN 1 ELSE 0 END) as failures
-            FROM connection_log
-            WHERE ja3 = ?
-            AND timestamp > datetime('now', '-1 hour')
-        """, (ja3,))
+        self._maybe_maintain()
 
-        row = cursor.fetchone()
-        if row and row[0] >= 5:  # Min 5 connections
-            failure_rate = row[1] / row[0]
-            if failure_rate > 0.8:  # 80%+ failure = likely pinned
-                conn.execute("""
+    def _update_pinning_detection(self, ja3: str):
+        """Update pinning detection based on failure patterns (O(1), fra vinduet)"""
+        with self._windows_lock:
+            window = self.pinning_windows.get(ja3)
+            total, failures = window.totals() if window else (0, 0)
+
+        if total >= self.PINNING_MIN_CONNECTIONS:
+            failure_rate = failures / total
+            if failure_rate > self.PINNING_FAILURE_RATE:  # 80%+ failure = likely pinned
+                # Samme sink som fingerprints-upserten - rekkefølgen bevares
+                self.event_sink.submit("""
                     UPDATE fingerprints
                     SET is_pinned = 1, confidence = ?
                     WHERE ja3 = ?
                 """, (failure_rate, ja3))
 
-                # Update cache
-                if ja3 in self.fingerprint_cache:
-                    self.fingerprint_cache[ja3].is_pinned = True
-                    self.fingerprint_cache[ja3].pinning_confidence = failure_rate
+                # Update cache (neste lookup henter fra DB hvis ikke cachet).
+                # Kjente profiler ligger ikke i TTL-cachen, men lookup()
+                # returnerer dem først - de må oppdateres direkte
+                profile = self.KNOWN_FINGERPRINTS.get(ja3) or self.fingerprint_cache.get(ja3)
+                if profile:
+                    profile.is_pinned = True
+                    profile.pinning_confidence = failure_rate
+                else:
+                    self.fingerprint_cache.pop(ja3)
 
                 logger.info(f"Auto-detected pinning for JA3 {ja3[:16]}... ({failure_rate:.1%} failure rate)")
 
-        conn.commit()
-        conn.close()
+    def _maybe_maintain(self):
+        now = time.monotonic()
+        if now - self._last_persist >= self.WINDOW_PERSIST_INTERVAL:
+            self.persist_windows()
+        if now - self._last_retention >= self.RETENTION_INTERVAL:
+            self._last_retention = now
+            self.apply_retention()
+
+    def persist_windows(self):
+        """Checkpoint dirty bøtter og glem JA3-er uten aktivitet i vinduet"""
+        with self._windows_lock:
+            self._last_persist = time.monotonic()
+            dirty = [(ja3, b[0], b[1], b[2]) for (ja3, _), b in self._dirty_buckets.items()]
+            self._dirty_buckets.clear()
+
+            now = time.time()
+            for ja3 in [k for k, w in self.pinning_windows.items() if not w.totals(now)[0]]:
+                del self.pinning_windows[ja3]
+
+        for params in dirty:
+            self.event_sink.submit("""
+                INSERT INTO pinning_window (ja3, bucket, successes, failures)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT(ja3, bucket) DO UPDATE SET
+                    successes = excluded.successes,
+                    failures = excluded.failures
+            """, params)
+
+    def apply_retention(self):
+        """
+        Rull opp og slett gammel historikk (via sinken, utenfor request-pathen)
+
+        connection_log eldre enn CONNECTION_LOG_RETENTION_DAYS summeres til
+        connection_daily og slettes, én dag per transaksjon-steg så selv en
+        måneder gammel logg ryddes i begrensede biter. Utløpte
+        pinning-bøtter slettes.
+        """
+        cutoff = datetime.now() - timedelta(days=self.CONNECTION_LOG_RETENTION_DAYS)
+        try:
+            # Indeksert på timestamp - O(log n)
+            with sqlite3.connect(str(DB_PATH)) as conn:
+                oldest = conn.execute("SELECT MIN(timestamp) FROM connection_log").fetchone()[0]
+        except sqlite3.Error as e:
+            logger.error(f"Connection log retention error: {e}")
+            return
+
+        if oldest and oldest < cutoff.isoformat():
+            day = datetime.fromisoformat(oldest[:10])
+            while day < cutoff:
+                start = day.isoformat()
+                end = min(day + timedelta(days=1), cutoff).isoformat()
+                self.event_sink.submit("""
+                    INSERT INTO connection_daily (day, ja3, sni, successes, failures)
+                    SELECT substr(timestamp, 1, 10), ja3, COALESCE(sni, ''),
+                           SUM(success), SUM(1 - success)
+                    FROM connection_log
+                    WHERE timestamp >= ? AND timestamp < ?
+                    GROUP BY 1, 2, 3
+                    ON CONFLICT(day, ja3, sni) DO UPDATE SET
+                        successes = successes + excluded.successes,
+                        failures = failures + excluded.failures
+                """, (start, end))
+                self.event_sink.submit(
+                    "DELETE FROM connection_log WHERE timestamp >= ? AND timestamp < ?",
+                    (start, end)
+                )
+                day += timedelta(days=1)
+
+        self.event_sink.submit(
+            "DELETE FROM pinning_window WHERE bucket < ?",
+            (int(time.time()) - self.PINNING_WINDOW,)
+        )
 
     def get_routing_decision(self, fingerprint: TLSFingerprint) -> Tuple[str, float]:
         """
@@ -474,15 +723,14 @@ class FingerprintDatabase:
         cursor = conn.execute("SELECT COUNT(*) FROM fingerprints WHERE is_pinned = 1")
         stats['pinned_apps'] = cursor.fetchone()[0]
 
-        # Recent connections
-        cursor = conn.execute("""
-            SELECT COUNT(*), SUM(success)
-            FROM connection_log
-            WHERE timestamp > datetime('now', '-1 hour')
-        """)
-        row = cursor.fetchone()
-        stats['recent_connections'] = row[0] or 0
-        stats['recent_success_rate'] = (row[1] or 0) / max(row[0] or 1, 1)
+        # Recent connections (fra pinning-vinduene, siste time)
+        with self._windows_lock:
+            windows = [w.totals() for w in self.pinning_windows.values()]
+        total = sum(t for t, _ in windows)
+        failures = sum(f for _, f in windows)
+        stats['recent_connections'] = total
+        stats['recent_success_rate'] = (total - failures) / max(total, 1)
+        stats['tracked_ja3'] = len(windows)
 
         # Top fingerprints
         cursor = conn.execute("""
@@ -497,6 +745,7 @@ class FingerprintDatabase:
         ]
 
         conn.close()
+        stats['cache'] = self.fingerprint_cache.get_stats()
         return stats
 
 
@@ -507,22 +756,50 @@ class TLSFingerprintEngine:
     Integrates with mitmproxy to provide intelligent routing.
     """
 
+    # Maks antall memoiserte ClientHello-parsinger
+    HELLO_MEMO_SIZE = 4096
+    # Maks antall handshakes som venter på utfall (avbrutte blir aldri poppet)
+    MAX_ACTIVE_CONNECTIONS = 4096
+
     def __init__(self):
         self.calculator = JA3Calculator()
         self.database = FingerprintDatabase()
-        self.active_connections: Dict[str, TLSFingerprint] = {}
+        self.active_connections: "OrderedDict[str, TLSFingerprint]" = OrderedDict()
+
+        # hello_key -> ferdig fingerprint (ja3 + ja4), LRU
+        self._hello_memo: "OrderedDict[bytes, TLSFingerprint]" = OrderedDict()
+        self.memo_stats = {'hits': 0, 'misses': 0}
 
     def process_client_hello(self, client_hello: bytes, client_ip: str) -> Optional[TLSFingerprint]:
-        """Process a ClientHello and return fingerprint"""
-        fingerprint = self.calculator.calculate(client_hello)
+        """Process a ClientHello and return fingerprint (memoized per hello layout)"""
+        key = self.calculator.hello_key(client_hello)
+        cached = self._hello_memo.get(key) if key else None
+
+        if cached:
+            self._hello_memo.move_to_end(key)
+            self.memo_stats['hits'] += 1
+            # Ny instans per connection; feltlistene deles (read-only)
+            fingerprint = replace(cached, client_ip=client_ip, timestamp=datetime.now())
+        else:
+            self.memo_stats['misses'] += 1
+            fingerprint = self.calculator.calculate(client_hello)
+            if fingerprint:
+                fingerprint.ja4 = self.calculator.calculate_ja4(fingerprint)
+                if key:
+                    self._hello_memo[key] = fingerprint
+                    if len(self._hello_memo) > self.HELLO_MEMO_SIZE:
+                        self._hello_memo.popitem(last=False)
+                    fingerprint = replace(fingerprint)
 
         if fingerprint:
             fingerprint.client_ip = client_ip
-            fingerprint.ja4 = self.calculator.calculate_ja4(fingerprint)
 
             # Store for later correlation
             conn_key = f"{client_ip}:{fingerprint.sni}"
+            self.active_connections.pop(conn_key, None)
             self.active_connections[conn_key] = fingerprint
+            if len(self.active_connections) > self.MAX_ACTIVE_CONNECTIONS:
+                self.active_connections.popitem(last=False)
 
             logger.debug(f"Fingerprint: JA3={fingerprint.ja3[:16]}... SNI={fingerprint.sni}")
 
@@ -554,6 +831,7 @@ class TLSFingerprintEngine:
         """Get engine statistics"""
         return {
             'active_connections': len(self.active_connections),
+            'hello_memo': {**self.memo_stats, 'size': len(self._hello_memo)},
             'database': self.database.get_statistics()
         }
 
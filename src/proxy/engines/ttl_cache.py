@@ -0,0 +1,100 @@
+"""
+AIKI TTL Cache
+==============
+
+Trådsikker cache med størrelsesgrense (LRU) og TTL.
+
+Proxyen kjører i dagevis; ubegrensede dict-cacher vokser med hvert
+nye domene, innholds-ID og fingerprint. TTLCache holder minnet flatt
+og teller treff, bom og utkastelser slik at effekten kan måles.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable
+
+_MISSING = object()
+
+
+class TTLCache:
+    """
+    LRU-cache med TTL per entry
+
+    Bruk:
+        cache = TTLCache(maxsize=10_000, ttl=300)
+        cache.set(key, value)
+        value = cache.get(key)  # None hvis mangler/utløpt
+    """
+
+    def __init__(self, maxsize: int = 10_000, ttl: float | None = 300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {
+            'hits': 0,
+            'misses': 0,
+            'evictions': 0,
+            'expirations': 0
+        }
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Hent verdi; utløpte entries regnes som bom og fjernes"""
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING:
+                self.stats['misses'] += 1
+                return default
+
+            expires_at, value = entry
+            if expires_at and expires_at <= time.monotonic():
+                del self._data[key]
+                self.stats['expirations'] += 1
+                self.stats['misses'] += 1
+                return default
+
+            self._data.move_to_end(key)
+            self.stats['hits'] += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: float | None = None):
+        """Lagre verdi; eldste entry kastes ut ved full cache"""
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl else 0.0
+
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.stats['evictions'] += 1
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.pop(key, _MISSING)
+        return default if entry is _MISSING else entry[1]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __contains__(self, key: Hashable) -> bool:
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING:
+                return False
+            return not entry[0] or entry[0] > time.monotonic()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get_stats(self) -> dict:
+        """Hent statistikk inkl. hit rate"""
+        lookups = self.stats['hits'] + self.stats['misses']
+        return {
+            **self.stats,
+            'size': len(self._data),
+            'maxsize': self.maxsize,
+            'hit_rate': (self.stats['hits'] / lookups * 100) if lookups else 0
+        }
@@ -0,0 +1,251 @@
+"""
+AIKI Usage Ledger
+=================
+
+In-memory bruks- og kvote-tellere for throttling-beslutninger.
+
+Før: hver request kjørte en SELECT (og noen ganger INSERT) mot SQLite
+for å finne dagens forbruk - latency vokste med tabellstørrelsen.
+Nå:
+
+1. Ved oppstart lastes dagens rader inn i en dict
+   (user_id, app, dato) -> {kolonne: verdi}
+2. Beslutninger leser dict-en direkte. Nøkler for andre datoer enn
+   den som ble lastet hentes fra SQLite ved første oppslag - en rad som
+   bare er opprettet for å svare på en lesing blir aldri dirty, så
+   lagret historikk overskrives ikke med nuller
+3. Endringer markeres dirty og checkpointes periodisk som absolutte
+   verdier (UPSERT) via EventSink - ingen I/O i request-pathen
+4. Rader for tidligere datoer ryddes ut av minnet ved checkpoint - først
+   når sluttverdien ble lagt i køen ved et tidligere checkpoint
+5. Full sink-kø: raden forblir dirty og prøves igjen ved neste checkpoint
+
+Ledgeren eier kun kolonnene den får oppgitt; andre kolonner i samme
+tabell (f.eks. requests_total) røres ikke.
+"""
+
+import atexit
+import logging
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+from .event_sink import get_event_sink
+
+logger = logging.getLogger('aiki.usage_ledger')
+
+
+class UsageLedger:
+    """
+    Per-bruker, per-app, per-dag tellere med periodisk checkpoint
+
+    Bruk:
+        ledger = UsageLedger(db_path, 'app_usage',
+                             key_columns=('user_id', 'app_name', 'date'),
+                             value_columns=('minutes_used',))
+        ledger.add(('kid', 'tiktok', '2025-11-24'), minutes_used=1.5)
+        ledger.get(('kid', 'tiktok', '2025-11-24'))['minutes_used']
+    """
+
+    def __init__(
+        self,
+        db_path: str | Path,
+        table: str,
+        key_columns: tuple[str, ...],
+        value_columns: tuple[str, ...],
+        date_column: str = 'date',
+        checkpoint_interval: float = 30.0
+    ):
+        self.db_path = Path(db_path)
+        self.table = table
+        self.key_columns = key_columns
+        self.value_columns = value_columns
+        self.checkpoint_interval = checkpoint_interval
+        self._date_index = key_columns.index(date_column)
+
+        self._rows: dict[tuple, dict[str, float]] = {}
+        self._dirty: set[tuple] = set()
+        self._loaded_date = self.today()
+        self._lock = threading.Lock()
+        self._last_checkpoint = time.monotonic()
+
+        self._sink = get_event_sink(self.db_path)
+        columns = key_columns + value_columns
+        self._upsert_sql = (
+            f"INSERT INTO {table} ({', '.join(columns)}) "
+            f"VALUES ({', '.join('?' for _ in columns)}) "
+            f"ON CONFLICT({', '.join(key_columns)}) DO UPDATE SET "
+            + ', '.join(f"{c} = excluded.{c}" for c in value_columns)
+        )
+
+        self.stats = {
+            'loaded_rows': 0,
+            'rows_fetched': 0,
+            'checkpoints': 0,
+            'rows_checkpointed': 0,
+            'checkpoint_failures': 0
+        }
+
+        self._load()
+        _register(self)
+
+    @staticmethod
+    def today() -> str:
+        return datetime.now().strftime('%Y-%m-%d')
+
+    def _load(self):
+        """Last dagens rader fra SQLite"""
+        columns = self.key_columns + self.value_columns
+        date_column = self.key_columns[self._date_index]
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.execute(
+                    f"SELECT {', '.join(columns)} FROM {self.table} WHERE {date_column} = ?",
+                    (self._loaded_date,)
+                )
+                n_keys = len(self.key_columns)
+                for row in cursor.fetchall():
+                    key = tuple(row[:n_keys])
+                    self._rows[key] = {
+                        col: (value or 0)
+                        for col, value in zip(self.value_columns, row[n_keys:])
+                    }
+            self.stats['loaded_rows'] = len(self._rows)
+            logger.debug(f"Usage ledger {self.table}: loaded {len(self._rows)} rows")
+        except Exception as e:
+            logger.error(f"Error loading usage ledger {self.table}: {e}")
+
+    def get(self, key: tuple) -> dict[str, float] | None:
+        """Hent tellere for nøkkel (dict-oppslag, ingen I/O)"""
+        row = self._rows.get(key)
+        return dict(row) if row is not None else None
+
+    def _fetch(self, key: tuple) -> dict[str, float] | None:
+        """Les én lagret rad fra SQLite (kun for datoer som ikke ble lastet)"""
+        where = ' AND '.join(f"{c} = ?" for c in self.key_columns)
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                row = conn.execute(
+                    f"SELECT {', '.join(self.value_columns)} FROM {self.table} WHERE {where}",
+                    key
+                ).fetchone()
+        except Exception as e:
+            logger.error(f"Error fetching usage ledger row {key}: {e}")
+            return None
+        self.stats['rows_fetched'] += 1
+        if row is None:
+            return None
+        return {col: (value or 0) for col, value in zip(self.value_columns, row)}
+
+    def _resolve(self, key: tuple, defaults: dict) -> dict[str, float]:
+        """
+        Finn raden for en nøkkel som mangler i minnet (kalles uten lås)
+
+        Alle rader for den lastede datoen er allerede i minnet; andre
+        datoer kan ha en lagret rad som ikke må overskrives.
+        """
+        stored = None
+        if key[self._date_index] != self._loaded_date:
+            stored = self._fetch(key)
+        if stored is not None:
+            return stored
+        return {col: defaults.get(col, 0) for col in self.value_columns}
+
+    def ensure(self, key: tuple, **defaults) -> dict[str, float]:
+        """Hent tellere, med defaults hvis nøkkelen ikke finnes (markeres ikke dirty)"""
+        row = self._rows.get(key)
+        if row is None:
+            resolved = self._resolve(key, defaults)
+            with self._lock:
+                row = self._rows.setdefault(key, resolved)
+        with self._lock:
+            result = dict(row)
+        self._maybe_checkpoint()
+        return result
+
+    def add(self, key: tuple, **deltas):
+        """Øk tellere (oppretter rad med 0 hvis den mangler)"""
+        resolved = self._resolve(key, {}) if key not in self._rows else None
+        with self._lock:
+            row = self._rows.get(key)
+            if row is None:
+                # Evt. ryddet av checkpoint siden sjekken over
+                row = self._rows[key] = resolved if resolved is not None else self._resolve(key, {})
+            for col, delta in deltas.items():
+                row[col] = row.get(col, 0) + delta
+            self._dirty.add(key)
+        self._maybe_checkpoint()
+
+    def _maybe_checkpoint(self):
+        if time.monotonic() - self._last_checkpoint >= self.checkpoint_interval:
+            self.checkpoint()
+
+    def checkpoint(self):
+        """Skriv dirty rader som absolutte verdier og rydd gamle datoer"""
+        with self._lock:
+            self._last_checkpoint = time.monotonic()
+            dirty = [(key, dict(self._rows[key])) for key in self._dirty if key in self._rows]
+            self._dirty.clear()
+
+            # Gamle datoer som skrives nå beholdes til neste checkpoint,
+            # så writeren rekker å committe sluttverdien før den forsvinner
+            today = self.today()
+            written = {key for key, _ in dirty}
+            stale = [k for k in self._rows if k[self._date_index] != today and k not in written]
+
+        failed = [
+            key for key, row in dirty
+            if not self._sink.submit(
+                self._upsert_sql,
+                key + tuple(row[col] for col in self.value_columns)
+            )
+        ]
+
+        with self._lock:
+            # Absolutt verdi gikk ikke i køen - prøv igjen neste gang
+            self._dirty.update(failed)
+            for key in stale:
+                if key not in self._dirty:
+                    self._rows.pop(key, None)
+
+        if failed:
+            self.stats['checkpoint_failures'] += len(failed)
+            logger.warning(f"Usage ledger {self.table}: {len(failed)} rows not queued, retrying")
+        if dirty:
+            self.stats['checkpoints'] += 1
+            self.stats['rows_checkpointed'] += len(dirty) - len(failed)
+
+    def get_stats(self) -> dict:
+        """Hent statistikk"""
+        return {
+            **self.stats,
+            'rows': len(self._rows),
+            'dirty': len(self._dirty)
+        }
+
+
+# Alle ledgere i prosessen - for checkpoint ved shutdown
+_ledgers: list[UsageLedger] = []
+_ledgers_lock = threading.Lock()
+
+
+def _register(ledger: UsageLedger):
+    with _ledgers_lock:
+        _ledgers.append(ledger)
+
+
+def checkpoint_all_ledgers():
+    """Checkpoint alle ledgere (kall før close_all_sinks ved shutdown)"""
+    with _ledgers_lock:
+        ledgers = list(_ledgers)
+    for ledger in ledgers:
+        try:
+            ledger.checkpoint()
+        except Exception as e:
+            logger.error(f"Ledger checkpoint error ({ledger.table}): {e}")
+
+
+# Registreres etter event_sink sin atexit-hook, og kjører dermed før den
+atexit.register(checkpoint_all_ledgers)
@@ -282,6 +282,38 @@ class TestOrchestrator:
         assert 'mini_aikis' in status
 
 
+class TestQuotaManager:
+    """Test kvoter fra in-memory usage ledger"""
+
+    def test_past_day_quota_read_keeps_history(self, tmp_path):
+        """Test at oppslag på en tidligere dag ikke overskriver lagret rad"""
+        import sqlite3
+        from src.proxy.engines.active_intervention import QuotaManager
+        from src.proxy.engines.event_sink import get_event_sink
+
+        db_path = tmp_path / 'quotas.db'
+        quotas = QuotaManager(db_path)
+        with sqlite3.connect(db_path) as conn:
+            conn.execute("""
+                INSERT INTO user_quotas (user_id, date, app, seconds_used, seconds_limit, bonus_time)
+                VALUES ('kid', '2025-01-01', 'tiktok', 1200, 1800, 300)
+            """)
+
+        quota = quotas.get_quota('kid', 'tiktok', date='2025-01-01')
+        assert quota['used'] == 1200
+        assert quota['bonus'] == 300
+
+        quotas.ledger.checkpoint()
+        assert get_event_sink(db_path).flush()
+
+        with sqlite3.connect(db_path) as conn:
+            row = conn.execute("""
+                SELECT seconds_used, seconds_limit, bonus_time FROM user_quotas
+                WHERE user_id = 'kid' AND date = '2025-01-01' AND app = 'tiktok'
+            """).fetchone()
+        assert row == (1200, 1800, 300)
+
+
 class TestEndToEnd:
     """End-to-end integrasjonstester"""
 